@@ -56,6 +56,9 @@ else:
 rcsenv_loaded = False
 mujoco_loaded = False
 
+# Set the availability of numba to False. This is set to True when importing the pysim dynamics kernels, if successful
+numba_loaded = False
+
 # Set default data type for PyTorch to float32. Sadly this is not possible for numpy.
 to.set_default_dtype(to.float32)
 
@@ -79,6 +82,10 @@ from pyrado.utils.exceptions import BaseErr, KeyErr, PathErr, ShapeErr, TypeErr,
 from pyrado.utils.saving_loading import save, load
 
 
+# Additionally log the algorithms' progress to a binary columnar log, which is faster to load than the csv file
+log_progress_bin = False
+
+
 # Set style for printing and plotting
 use_pgf = False
 from pyrado import plotting
@@ -113,7 +120,9 @@ __all__ = [
     "RENDER_PIPELINE_DIR",
     "rcsenv_loaded",
     "mujoco_loaded",
+    "numba_loaded",
     "use_pgf",
+    "log_progress_bin",
     "inf",
     "nan",
     "sym_success",
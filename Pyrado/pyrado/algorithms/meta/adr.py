@@ -26,7 +26,7 @@
 # ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
 # POSSIBILITY OF SUCH DAMAGE.
 
-from typing import Optional, Sequence
+from typing import Optional, Sequence, Tuple
 
 import numpy as np
 import pyrado
@@ -81,6 +81,7 @@ class ADR(Algorithm):
         num_trajs_per_config: int = 8,
         max_step_length: float = 0.05,
         randomized_params: Sequence[str] = None,
+        batch_particles: bool = False,
         logger: Optional[StepLogger] = None,
     ):
         """
@@ -105,6 +106,10 @@ class ADR(Algorithm):
         :param num_trajs_per_config: number of trajectories to sample from each config
         :param max_step_length: maximum change of physics parameters per step
         :param randomized_params: which parameters to randomize
+        :param batch_particles: if `True`, the states proposed by all SVPG particles are evaluated in one batch, and the
+                                subroutine is updated once with all resulting trajectories. By default, the states of
+                                every particle are evaluated with the policy updated using the previous particle's
+                                trajectories.
         :param logger: logger for every step of the algorithm, if `None` the default logger will be created
         """
         if not isinstance(env, Env):
@@ -133,6 +138,7 @@ class ADR(Algorithm):
         self.svpg_max_step_length = max_step_length
         self.svpg_horizon = svpg_horizon
         self.svpg_kl_factor = svpg_kl_factor
+        self.batch_particles = batch_particles
 
         self.pool = SamplerPool(num_workers)
         self.curr_time_step = 0
@@ -203,38 +209,98 @@ class ADR(Algorithm):
 
         return params
 
-    def step(self, snapshot_mode: str, meta_info: dict = None, parallel: bool = True):
-        rand_trajs = []
-        ref_trajs = []
+    def _propose_states(self, idx_particle: int) -> Tuple[list, list]:
+        """
+        Let an SVPG particle propose a sequence of domain parameter states, without evaluating them.
+
+        :param idx_particle: index of the particle
+        :return: proposed states and the particle's actions leading to them
+        """
+        svpg_env = self.svpg_wrapper
+        states, actions = [], []
+        with to.no_grad():
+            state = svpg_env.reset()
+            for _ in range(self.svpg_evaluation_steps):
+                action = (
+                    self.svpg.expl_strats[idx_particle](to.as_tensor(state, dtype=to.get_default_dtype()))
+                    .detach()
+                    .cpu()
+                    .numpy()
+                )
+                state = svpg_env.lite_step(action)
+                states.append(state)
+                actions.append(action)
+        return states, actions
+
+    @staticmethod
+    def _detach_double(trajs: Sequence[StepSequence]):
+        """ Convert the trajectories' data to double tensors without gradient, as expected by the subroutine. """
+        for rt in trajs:
+            rt.torch(data_type=to.double)
+            rt.observations = rt.observations.double().detach()
+            rt.actions = rt.actions.double().detach()
+
+    def _step_particles_batched(self) -> tuple:
+        """
+        Let every SVPG particle propose a sequence of domain parameter states, and evaluate the states of all particles
+        in one batch on the sampler pool.
+
+        :return: rollouts of the particles in the SVPG environment, randomized and reference trajectories
+        """
+        # Collect the proposed states of all particles
+        states_all, actions_all = [], []
+        for i in range(self.svpg.num_particles):
+            states, actions = self._propose_states(i)
+            states_all += states
+            actions_all += actions
+
+        # Evaluate all states at once, and split the results by particle
+        rewards_all, rand_trajs, ref_trajs = self.svpg_wrapper.eval_states(states_all)
         ros = []
-        visited = []
         for i in range(self.svpg.num_particles):
-            done = False
-            svpg_env = self.svpg_wrapper
-            state = svpg_env.reset()
-            states = []
-            actions = []
-            rewards = []
-            infos = []
-            rand_trajs_now = []
-            if parallel:
-                with to.no_grad():
-                    for t in range(10):
-                        action = (
-                            self.svpg.expl_strats[i](to.as_tensor(state, dtype=to.get_default_dtype()))
-                            .detach()
-                            .cpu()
-                            .numpy()
-                        )
-                        state = svpg_env.lite_step(action)
-                        states.append(state)
-                        actions.append(action)
-                    visited.append(states)
-                    rewards, rand_trajs_now, ref_trajs_now = svpg_env.eval_states(states)
-                    rand_trajs += rand_trajs_now
-                    ref_trajs += ref_trajs_now
-                    ros.append(StepSequence(observations=states, actions=actions, rewards=rewards))
-            else:
+            idcs = slice(i * self.svpg_evaluation_steps, (i + 1) * self.svpg_evaluation_steps)
+            ros.append(
+                StepSequence(observations=states_all[idcs], actions=actions_all[idcs], rewards=rewards_all[idcs])
+            )
+            self.logger.add_value(f"SVPG_agent_{i}_mean_reward", np.mean(rewards_all[idcs]))
+            ros[i].torch(data_type=to.DoubleTensor)
+        return ros, rand_trajs, ref_trajs
+
+    def step(self, snapshot_mode: str, meta_info: dict = None, parallel: bool = True):
+        if parallel and self.batch_particles:
+            ros, rand_trajs, ref_trajs = self._step_particles_batched()
+            self._detach_double(rand_trajs)
+            # All particles' trajectories were sampled with the same policy, thus update once using all of them
+            self._subrtn.update(rand_trajs)
+
+        elif parallel:
+            rand_trajs = []
+            ref_trajs = []
+            ros = []
+            for i in range(self.svpg.num_particles):
+                # Evaluate the states of this particle with the policy updated using the previous particles' states
+                states, actions = self._propose_states(i)
+                rewards, rand_trajs_now, ref_trajs_now = self.svpg_wrapper.eval_states(states)
+                rand_trajs += rand_trajs_now
+                ref_trajs += ref_trajs_now
+                ros.append(StepSequence(observations=states, actions=actions, rewards=rewards))
+                self.logger.add_value(f"SVPG_agent_{i}_mean_reward", np.mean(rewards))
+                ros[i].torch(data_type=to.DoubleTensor)
+                self._detach_double(rand_trajs_now)
+                self._subrtn.update(rand_trajs_now)
+
+        else:
+            rand_trajs = []
+            ref_trajs = []
+            ros = []
+            for i in range(self.svpg.num_particles):
+                done = False
+                svpg_env = self.svpg_wrapper
+                state = svpg_env.reset()
+                states = []
+                actions = []
+                rewards = []
+                infos = []
                 with to.no_grad():
                     while not done:
                         action = (
@@ -252,13 +318,8 @@ class ADR(Algorithm):
                         rand_trajs += info["rand"]
                         ref_trajs += info["ref"]
                     ros.append(StepSequence(observations=states, actions=actions, rewards=rewards))
-            self.logger.add_value(f"SVPG_agent_{i}_mean_reward", np.mean(rewards))
-            ros[i].torch(data_type=to.DoubleTensor)
-            for rt in rand_trajs_now:
-                rt.torch(data_type=to.double)
-                rt.observations = rt.observations.double().detach()
-                rt.actions = rt.actions.double().detach()
-            self._subrtn.update(rand_trajs_now)
+                self.logger.add_value(f"SVPG_agent_{i}_mean_reward", np.mean(rewards))
+                ros[i].torch(data_type=to.DoubleTensor)
 
         # Logging
         rets = [ro.undiscounted_return() for ro in rand_trajs]
@@ -372,10 +433,9 @@ class SVPGAdapter(EnvWrapper, Serializable):
         param_norm = self.svpg_state + 0.5
         rand_eval_params = [self.array_to_dict(param_norm * self.nominal())] * self.num_trajs
         norm_eval_params = [self.nominal_dict()] * self.num_trajs
-        rand = eval_domain_params(self.pool, self.wrapped_env, self.inner_policy, rand_eval_params)
-        ref = eval_domain_params(self.pool, self.wrapped_env, self.inner_policy, norm_eval_params)
-        rewards = [self.discriminator.get_reward(traj) for traj in rand]
-        reward = np.mean(rewards)
+        ros = eval_domain_params(self.pool, self.wrapped_env, self.inner_policy, rand_eval_params + norm_eval_params)
+        rand, ref = ros[: self.num_trajs], ros[self.num_trajs :]
+        reward = np.mean(self.discriminator.get_rewards(rand).numpy())
         info = dict(rand=rand, ref=ref)
         if self.count >= self.max_steps - 1:
             done = True
@@ -408,13 +468,16 @@ class SVPGAdapter(EnvWrapper, Serializable):
         :param states: the states to evaluate
         :return: respective rewards and according trajectories
         """
-        flatten = lambda l: [item for sublist in l for item in sublist]
-        sstates = flatten([[self.array_to_dict((state + 0.5) * self.nominal())] * self.num_trajs for state in states])
-        rand = eval_domain_params(self.pool, self.wrapped_env, self.inner_policy, sstates)
-        ref = eval_domain_params(
-            self.pool, self.wrapped_env, self.inner_policy, [self.nominal_dict()] * (self.num_trajs * len(states))
-        )
-        rewards = [self.discriminator.get_reward(traj) for traj in rand]
+        rand_params = [
+            self.array_to_dict((state + 0.5) * self.nominal()) for state in states for _ in range(self.num_trajs)
+        ]
+        ref_params = [self.nominal_dict()] * len(rand_params)
+
+        # Evaluate the randomized and the reference domains in one batch to keep all workers busy
+        ros = eval_domain_params(self.pool, self.wrapped_env, self.inner_policy, rand_params + ref_params)
+        rand, ref = ros[: len(rand_params)], ros[len(rand_params) :]
+
+        rewards = self.discriminator.get_rewards(rand).numpy()
         rewards = [np.mean(rewards[i * self.num_trajs : (i + 1) * self.num_trajs]) for i in range(len(states))]
         return rewards, rand, ref
 
@@ -469,10 +532,21 @@ class RewardGenerator:
         self.logger = logger
 
     def get_reward(self, traj: StepSequence):
-        traj = convert_step_sequence(traj)
+        return self.get_rewards([traj])[0]
+
+    def get_rewards(self, trajs: Sequence[StepSequence]) -> to.Tensor:
+        """
+        Compute the rewards for multiple trajectories with one forward pass of the discriminator.
+
+        :param trajs: trajectories to score
+        :return: reward for every trajectory
+        """
+        trajs = [convert_step_sequence(traj) for traj in trajs]
+        lengths = [traj.shape[0] for traj in trajs]
         with to.no_grad():
-            reward = self.discriminator.forward(traj).cpu()
-            return to.log(reward.mean()) * self.reward_multiplier
+            probs = self.discriminator.forward(to.cat(trajs, dim=0)).cpu()
+            probs_mean = to.stack([p.mean() for p in to.split(probs, lengths)])
+            return to.log(probs_mean) * self.reward_multiplier
 
     def train(
         self, reference_trajectory: StepSequence, randomized_trajectory: StepSequence, num_epoch: int
@@ -168,6 +168,7 @@ class BayesSim(Algorithm):
             self._embedding,
             self.num_segments,
             self.len_segments,
+            num_workers=self.num_workers,
         )
 
         # Create the posterior
@@ -28,12 +28,22 @@
 
 import os
 import os.path as osp
-from typing import Optional, Union
+from queue import Empty
+from typing import List, Optional, Union
 
 import numpy as np
 import pyrado
 import torch as to
-from botorch.acquisition import ExpectedImprovement, PosteriorMean, ProbabilityOfImprovement, UpperConfidenceBound
+import torch.multiprocessing as mp
+from botorch.acquisition import (
+    ExpectedImprovement,
+    PosteriorMean,
+    ProbabilityOfImprovement,
+    UpperConfidenceBound,
+    qExpectedImprovement,
+    qProbabilityOfImprovement,
+    qUpperConfidenceBound,
+)
 from botorch.fit import fit_gpytorch_model
 from botorch.models import SingleTaskGP
 from botorch.optim import optimize_acqf
@@ -46,11 +56,12 @@ from pyrado.environment_wrappers.domain_randomization import MetaDomainRandWrapp
 from pyrado.environment_wrappers.utils import inner_env, typed_env
 from pyrado.environments.real_base import RealEnv
 from pyrado.environments.sim_base import SimEnv
-from pyrado.logger.step import StepLogger
+from pyrado.logger.step import CSVPrinter, StepLogger, TensorBoardPrinter
 from pyrado.policies.base import Policy
 from pyrado.sampling.bootstrapping import bootstrap_ci
 from pyrado.sampling.parallel_rollout_sampler import ParallelRolloutSampler
 from pyrado.sampling.rollout import rollout
+from pyrado.sampling.sampler_pool import SamplerPool
 from pyrado.spaces import BoxSpace
 from pyrado.utils.data_processing import standardize
 from pyrado.utils.input_output import print_cbt
@@ -59,6 +70,65 @@ from pyrado.utils.order import natural_sort
 from tabulate import tabulate
 
 
+def _renew_sampler_pools(algo: Algorithm, seed: int) -> list:
+    """
+    Give every multi-process sampler of the algorithm new workers. The pools inherited from the parent process can not
+    be used in a forked process, since their workers are not its children and their queues are shared with the parent
+    and the sibling processes.
+
+    :param algo: algorithm holding the samplers, e.g. BayRn's subroutine
+    :param seed: seed for the random number generators of the new workers
+    :return: list of the new sampler pools
+    """
+    pools = []
+    for sampler in vars(algo).values():
+        # Also consider the samplers wrapped by others, e.g. by the CVaRSampler
+        for smplr in (sampler, getattr(sampler, "_wrapped_sampler", None)):
+            pool = getattr(smplr, "pool", None)
+            if isinstance(pool, SamplerPool) and pool.num_threads > 1:
+                smplr.pool = SamplerPool(pool.num_threads, pool.shared_memory)
+                smplr.pool.set_seed(seed)
+                smplr.reinit()  # distribute the environment and the policy to the new workers
+                pools.append(smplr.pool)
+    return pools
+
+
+def _bayrn_train_policy_sim(algo, cand: to.Tensor, prefix: str, seed: int, queue: mp.Queue):
+    """
+    Train a policy in simulation for one candidate in a separate process, and report back the number of samples.
+    The subroutine logs its progress to the sub-directory `<prefix>_subrtn` of the experiment's directory, since its
+    logger is shared with the parent process and the other concurrently trained candidates.
+
+    :param algo: (copy of the) BayRn instance
+    :param cand: hyper-parameters for the domain parameter distribution
+    :param prefix: prefix for the saved file names
+    :param seed: seed for the random number generators of this process
+    :param queue: queue to put the tuple of the prefix and the number of samples into
+    """
+    pyrado.set_seed(seed)
+
+    # Give the subroutine its own logger, the console output is omitted since the processes would interleave it
+    log_dir = osp.join(algo.save_dir, f"{prefix}_subrtn")
+    os.makedirs(log_dir, exist_ok=True)
+    logger = StepLogger()
+    logger.printers.append(CSVPrinter(osp.join(log_dir, "progress.csv")))
+    logger.printers.append(TensorBoardPrinter(osp.join(log_dir, "tb")))
+    algo.subroutine._logger = logger
+
+    # The subroutine's samplers need workers of their own
+    pools = _renew_sampler_pools(algo.subroutine, seed)
+    try:
+        cnt_samples_before = algo.sample_count
+        wrapped_trn_fcn = until_thold_exceeded(algo.thold_succ_subrtn.item(), algo.max_subrtn_rep)(
+            algo.train_policy_sim
+        )
+        wrapped_trn_fcn(cand, prefix=prefix)
+        queue.put((prefix, algo.sample_count - cnt_samples_before))
+    finally:
+        for pool in pools:
+            pool.stop()
+
+
 class BayRn(InterruptableAlgorithm):
     """
     Bayesian Domain Randomization (BayRn)
@@ -97,6 +167,8 @@ class BayRn(InterruptableAlgorithm):
         policy_param_init: Optional[to.Tensor] = None,
         valuefcn_param_init: Optional[to.Tensor] = None,
         subrtn_snapshot_mode: str = "best",
+        batch_size: int = 1,
+        num_workers_trn: int = 1,
         logger: Optional[StepLogger] = None,
     ):
         """
@@ -106,6 +178,10 @@ class BayRn(InterruptableAlgorithm):
             If you want to continue an experiment, use the `load_dir` argument for the `train` call. If you want to
             initialize every of the policies with a pre-trained policy parameters use `policy_param_init`.
 
+        .. note::
+            When training policies concurrently, every process works on its own copy of the subroutine. Thus, all
+            candidates of one batch are warm-started from the same policy parameters.
+
         :param save_dir: directory to save the snapshots i.e. the results in
         :param env_sim: randomized simulation environment a.k.a. source domain
         :param env_real: real-world environment a.k.a. target domain
@@ -132,6 +208,9 @@ class BayRn(InterruptableAlgorithm):
         :param policy_param_init: initial policy parameter values for the subroutine, set `None` to be random
         :param valuefcn_param_init: initial value function parameter values for the subroutine, set `None` to be random
         :param subrtn_snapshot_mode: snapshot mode for saving during training of the subroutine
+        :param batch_size: number of candidates proposed by the acquisition function per iteration, for values larger
+                           than 1 the Monte-Carlo versions of the acquisition functions (e.g. qEI) are used
+        :param num_workers_trn: number of processes training policies for different candidates concurrently
         :param logger: logger for every step of the algorithm, if `None` the default logger will be created
         """
         if typed_env(env_sim, MetaDomainRandWrapper) is None:
@@ -142,6 +221,10 @@ class BayRn(InterruptableAlgorithm):
             raise pyrado.TypeErr(given=ddp_space, expected_type=BoxSpace)
         if num_init_cand < 1:
             raise pyrado.ValueErr(given=num_init_cand, ge_constraint="1")
+        if batch_size < 1:
+            raise pyrado.ValueErr(given=batch_size, ge_constraint="1")
+        if num_workers_trn < 1:
+            raise pyrado.ValueErr(given=num_workers_trn, ge_constraint="1")
 
         # Call InterruptableAlgorithm's constructor without specifying the policy
         super().__init__(
@@ -181,6 +264,9 @@ class BayRn(InterruptableAlgorithm):
         self.thold_succ_subrtn = to.tensor([thold_succ_subrtn])
         self.max_subrtn_rep = 3  # number of tries to exceed thold_succ_subrtn during training in simulation
         self.curr_cand_value = -pyrado.inf  # for the stopping criterion
+        self.batch_size = batch_size
+        self.num_workers_trn = num_workers_trn
+        self._gp_state = None  # hyper-parameters of the last GP fit, used for warm-starting
 
         if self.policy_param_init is not None:
             if to.is_tensor(self.policy_param_init):
@@ -239,6 +325,58 @@ class BayRn(InterruptableAlgorithm):
         )
         return float(avg_ret_sim)
 
+    def train_policies_sim(self, cands: to.Tensor, prefixes: List[str]):
+        """
+        Train a policy in simulation for every candidate, repeating the training of a candidate if the resulting policy
+        did not exceed the success threshold. If `num_workers_trn > 1`, the candidates are trained concurrently in
+        separate processes.
+
+        :param cands: hyper-parameters for the domain parameter distribution, one candidate per row
+        :param prefixes: prefixes for the saved file names, one per candidate
+        """
+        if cands.shape[0] != len(prefixes):
+            raise pyrado.ShapeErr(given=cands, expected_match=(len(prefixes), cands.shape[1]))
+
+        if self.num_workers_trn == 1 or len(prefixes) == 1:
+            wrapped_trn_fcn = until_thold_exceeded(self.thold_succ_subrtn.item(), self.max_subrtn_rep)(
+                self.train_policy_sim
+            )
+            for cand, prefix in zip(cands, prefixes):
+                print_cbt(f"Training the policy for candidate {prefix} ...", "g", bright=True)
+                wrapped_trn_fcn(cand, prefix=prefix)
+            return
+
+        # Draw the seeds in the main process to make the concurrent training repeatable
+        seeds = np.random.randint(np.iinfo(np.int32).max, size=len(prefixes)).tolist()
+        queue = mp.Queue()
+        for idx_start in range(0, len(prefixes), self.num_workers_trn):
+            idcs = range(idx_start, min(idx_start + self.num_workers_trn, len(prefixes)))
+            print_cbt(f"Training the policies for candidates {[prefixes[i] for i in idcs]} concurrently ...", "g")
+            procs = [
+                mp.Process(target=_bayrn_train_policy_sim, args=(self, cands[i], prefixes[i], seeds[i], queue))
+                for i in idcs
+            ]
+            for p in procs:
+                p.start()
+
+            # Collect the sample counts before joining, and bail out if a process died without reporting
+            results = []
+            while len(results) < len(procs):
+                try:
+                    results.append(queue.get(timeout=1.0))
+                except Empty:
+                    if any(p.exitcode not in (None, 0) for p in procs):
+                        for p in procs:
+                            p.terminate()
+                        raise RuntimeError("A process training a policy for BayRn terminated with an error!")
+            for p in procs:
+                p.join()
+            self._cnt_samples += sum(cnt for _, cnt in results)
+
+        # Continue from the last trained policy, e.g. for warm-starting in the next iteration
+        policy = pyrado.load(self._subrtn.policy, "policy", "pt", self.save_dir, meta_info=dict(prefix=prefixes[-1]))
+        self._subrtn.policy.load_state_dict(policy.state_dict())
+
     def train_init_policies(self):
         """
         Initialize the algorithm with a number of random distribution parameter sets a.k.a. candidates specified by
@@ -246,18 +384,12 @@ class BayRn(InterruptableAlgorithm):
         """
         cands = to.empty(self.num_init_cand, self.ddp_space.shape[0])
         for i in range(self.num_init_cand):
-            print_cbt(
-                f"Generating initial domain instance and policy {i + 1} of {self.num_init_cand} ...", "g", bright=True
-            )
             # Sample random domain distribution parameters
             cands[i, :] = to.from_numpy(self.ddp_space.sample_uniform())
+            print_cbt(f"Randomly sampled the initial candidate {i + 1}: {cands[i].numpy()}", "g")
 
-            # Train a policy for each candidate, repeat if the resulting policy did not exceed the success threshold
-            print_cbt(f"Randomly sampled the next candidate: {cands[i].numpy()}", "g")
-            wrapped_trn_fcn = until_thold_exceeded(self.thold_succ_subrtn.item(), self.max_subrtn_rep)(
-                self.train_policy_sim
-            )
-            wrapped_trn_fcn(cands[i], prefix=f"init_{i}")
+        # Train a policy for each candidate, repeat if the resulting policy did not exceed the success threshold
+        self.train_policies_sim(cands, [f"init_{i}" for i in range(self.num_init_cand)])
 
         # Save candidates into a single tensor (policy is saved during training or exists already)
         pyrado.save(cands, "candidates", "pt", self.save_dir, meta_info=None)
@@ -391,72 +523,87 @@ class BayRn(InterruptableAlgorithm):
             cands_norm = self.ddp_projector.project_to(self.cands)
             cands_values_stdized = standardize(self.cands_values).unsqueeze(1)
 
-            # Create and fit the GP model
-            gp = SingleTaskGP(cands_norm, cands_values_stdized)
-            gp.likelihood.noise_covar.register_constraint("raw_noise", GreaterThan(1e-5))
-            mll = ExactMarginalLogLikelihood(gp.likelihood, gp)
-            fit_gpytorch_model(mll)
+            # Create the GP model. The argmax computation of the last iteration already fitted it to the same data.
+            gp = BayRn.fit_gp(cands_norm, cands_values_stdized, self._gp_state, fit=self._gp_state is None)
+            self._gp_state = gp.state_dict()
             print_cbt("Fitted the GP.", "g")
 
             # Acquisition functions
+            best_f = cands_values_stdized.max().item()
+            beta = self.acq_param.get("beta", 0.1) if self.acq_param is not None else 0.1
             if self.acq_fcn_type == "UCB":
-                acq_fcn = UpperConfidenceBound(gp, beta=self.acq_param.get("beta", 0.1), maximize=True)
+                if self.batch_size == 1:
+                    acq_fcn = UpperConfidenceBound(gp, beta=beta, maximize=True)
+                else:
+                    acq_fcn = qUpperConfidenceBound(gp, beta=beta)
             elif self.acq_fcn_type == "EI":
-                acq_fcn = ExpectedImprovement(gp, best_f=cands_values_stdized.max().item(), maximize=True)
+                if self.batch_size == 1:
+                    acq_fcn = ExpectedImprovement(gp, best_f=best_f, maximize=True)
+                else:
+                    acq_fcn = qExpectedImprovement(gp, best_f=best_f)
             elif self.acq_fcn_type == "PI":
-                acq_fcn = ProbabilityOfImprovement(gp, best_f=cands_values_stdized.max().item(), maximize=True)
+                if self.batch_size == 1:
+                    acq_fcn = ProbabilityOfImprovement(gp, best_f=best_f, maximize=True)
+                else:
+                    acq_fcn = qProbabilityOfImprovement(gp, best_f=best_f)
             else:
                 raise pyrado.ValueErr(given=self.acq_fcn_type, eq_constraint="'UCB', 'EI', 'PI'")
 
-            # Optimize acquisition function and get new candidate point
-            cand_norm, _ = optimize_acqf(
+            # Optimize acquisition function and get new candidate points
+            cands_norm, _ = optimize_acqf(
                 acq_function=acq_fcn,
                 bounds=to.stack([to.zeros(self.ddp_space.flat_dim), to.ones(self.ddp_space.flat_dim)]).to(
                     dtype=to.float32
                 ),
-                q=1,
+                q=self.batch_size,
                 num_restarts=self.acq_restarts,
                 raw_samples=self.acq_samples,
             )
-            cand_norm = cand_norm.to(dtype=to.get_default_dtype())
-            next_cand = self.ddp_projector.project_back(cand_norm)
-            print_cbt(f"Found the next candidate: {next_cand.numpy()}", "g")
-            self.cands = to.cat([self.cands, next_cand], dim=0)
+            cands_norm = cands_norm.to(dtype=to.get_default_dtype())
+            next_cands = self.ddp_projector.project_back(cands_norm)
+            print_cbt(f"Found the next candidate(s): {next_cands.numpy()}", "g")
+            self.cands = to.cat([self.cands, next_cands], dim=0)
             pyrado.save(self.cands, "candidates", "pt", self.save_dir, meta_info)
             self.reached_checkpoint()  # setting counter to 1
 
         if self.curr_checkpoint == 1:
-            # Train and evaluate a new policy, repeat if the resulting policy did not exceed the success threshold
-            wrapped_trn_fcn = until_thold_exceeded(self.thold_succ_subrtn.item(), self.max_subrtn_rep)(
-                self.train_policy_sim
-            )
-            wrapped_trn_fcn(self.cands[-1, :], prefix=f"iter_{self._curr_iter}")
+            # Train and evaluate new policies, repeat if the resulting policy did not exceed the success threshold
+            self.train_policies_sim(self.cands[-self.batch_size :, :], self._iter_prefixes())
             self.reached_checkpoint()  # setting counter to 2
 
         if self.curr_checkpoint == 2:
-            # Evaluate the current policy in the target domain
-            policy = pyrado.load(
-                self.policy, "policy", "pt", self.save_dir, meta_info=dict(prefix=f"iter_{self._curr_iter}")
-            )
-            self.curr_cand_value = self.eval_policy(
-                self.save_dir,
-                self._env_real,
-                policy,
-                self.mc_estimator,
-                f"iter_{self._curr_iter}",
-                self.num_eval_rollouts_real,
-            )
-            self.cands_values = to.cat([self.cands_values, self.curr_cand_value.view(1)], dim=0)
+            # Evaluate the current policies in the target domain
+            cands_values = to.empty(self.batch_size)
+            for i, prefix in enumerate(self._iter_prefixes()):
+                policy = pyrado.load(self.policy, "policy", "pt", self.save_dir, meta_info=dict(prefix=prefix))
+                cands_values[i] = self.eval_policy(
+                    self.save_dir, self._env_real, policy, self.mc_estimator, prefix, self.num_eval_rollouts_real
+                )
+            self.curr_cand_value = cands_values.max()
+            self.cands_values = to.cat([self.cands_values, cands_values], dim=0)
             pyrado.save(self.cands_values, "candidates_values", "pt", self.save_dir, meta_info)
 
-            # Store the argmax after training and evaluating
-            curr_argmax_cand = BayRn.argmax_posterior_mean(
-                self.cands, self.cands_values.unsqueeze(1), self.ddp_space, self.acq_restarts, self.acq_samples
+            # Store the argmax after training and evaluating. The GP's hyper-parameters from the acquisition are used as
+            # initial values, and the result is reused for the acquisition in the next iteration.
+            gp = BayRn.fit_gp(
+                self.ddp_projector.project_to(self.cands),
+                standardize(self.cands_values).unsqueeze(1),
+                self._gp_state,
+            )
+            self._gp_state = gp.state_dict()
+            curr_argmax_cand = BayRn.argmax_posterior_mean_gp(
+                gp, self.ddp_projector, self.acq_restarts, self.acq_samples
             )
             self.argmax_cand = to.cat([self.argmax_cand, curr_argmax_cand], dim=0)
             pyrado.save(self.argmax_cand, "candidates_argmax", "pt", self.save_dir, meta_info)
             self.reached_checkpoint()  # setting counter to 0
 
+    def _iter_prefixes(self) -> List[str]:
+        """ Get the prefixes for the saved file names of the current iteration's candidates. """
+        if self.batch_size == 1:
+            return [f"iter_{self._curr_iter}"]
+        return [f"iter_{self._curr_iter}_{i}" for i in range(self.batch_size)]
+
     def save_snapshot(self, meta_info: dict = None):
         super().save_snapshot(meta_info)
 
@@ -506,16 +653,51 @@ class BayRn(InterruptableAlgorithm):
             )
             cands_norm = cands_norm[: cands_values.shape[0], :]
 
-        # Create and fit the GP model
+        # Create and fit the GP model, and find the position with maximal posterior mean
+        gp = BayRn.fit_gp(cands_norm, cands_values_stdized)
+        return BayRn.argmax_posterior_mean_gp(gp, uc_projector, num_restarts, num_samples)
+
+    @staticmethod
+    def fit_gp(
+        cands_norm: to.Tensor, cands_values_stdized: to.Tensor, gp_state: Optional[dict] = None, fit: bool = True
+    ) -> SingleTaskGP:
+        """
+        Create a GP model and fit its hyper-parameters.
+
+        :param cands_norm: normalized candidates a.k.a. x
+        :param cands_values_stdized: standardized observed values a.k.a. y
+        :param gp_state: state dict of a previously fitted GP to initialize the hyper-parameters with, pass `None` to
+                         start from the default values
+        :param fit: if `False`, the hyper-parameters are not optimized, which is useful if `gp_state` is given and the
+                    data did not change
+        :return: GP model
+        """
         gp = SingleTaskGP(cands_norm, cands_values_stdized)
         gp.likelihood.noise_covar.register_constraint("raw_noise", GreaterThan(1e-5))
-        mll = ExactMarginalLogLikelihood(gp.likelihood, gp)
-        fit_gpytorch_model(mll)
+        if gp_state is not None:
+            gp.load_state_dict(gp_state)
+        if fit:
+            mll = ExactMarginalLogLikelihood(gp.likelihood, gp)
+            fit_gpytorch_model(mll)
+        return gp
+
+    @staticmethod
+    def argmax_posterior_mean_gp(
+        gp: SingleTaskGP, uc_projector: UnitCubeProjector, num_restarts: int, num_samples: int
+    ) -> to.Tensor:
+        """
+        Compute the GP input with the maximal posterior mean given an already fitted GP.
 
-        # Find position with maximal posterior mean
+        :param gp: fitted GP model on the normalized candidates
+        :param uc_projector: projector from the domain distribution parameter space to the unit cube
+        :param num_restarts: number of restarts for the optimization of the acquisition function
+        :param num_samples: number of samples for the optimization of the acquisition function
+        :return: un-normalized candidate with maximum posterior value a.k.a. x
+        """
+        flat_dim = gp.train_inputs[0].shape[-1]
         cand_norm, _ = optimize_acqf(
             acq_function=PosteriorMean(gp),
-            bounds=to.stack([to.zeros(ddp_space.flat_dim), to.ones(ddp_space.flat_dim)]).to(dtype=to.float32),
+            bounds=to.stack([to.zeros(flat_dim), to.ones(flat_dim)]).to(dtype=to.float32),
             q=1,
             num_restarts=num_restarts,
             raw_samples=num_samples,
@@ -201,6 +201,7 @@ class SBIBase(InterruptableAlgorithm, ABC):
         # Initialize sbi simulator and prior
         self._sbi_simulator = None  # to be set in step()
         self._sbi_prior = None  # to be set in step()
+        self._sbi_rollout_sampler = None  # to be set in step()
         self._setup_sbi(prior=prior)
 
         # Create the algorithm instance used in sbi, e.g. SNPE-A/B/C or SNLE
@@ -257,7 +258,11 @@ class SBIBase(InterruptableAlgorithm, ABC):
         :param rollouts_real: list of rollouts recorded from the target domain, which are used to sync the simulations'
                               initial states
         """
-        rollout_sampler = SimRolloutSamplerForSBI(
+        # Terminate the workers of the previous simulator before replacing it
+        if getattr(self, "_sbi_rollout_sampler", None) is not None:
+            self._sbi_rollout_sampler.stop()
+
+        self._sbi_rollout_sampler = SimRolloutSamplerForSBI(
             self._env_sim_sbi,
             self._policy,
             self.dp_mapping,
@@ -270,7 +275,7 @@ class SBIBase(InterruptableAlgorithm, ABC):
             prior = pyrado.load(None, "prior", "pt", self._save_dir)
 
         # Call sbi's preparation function
-        self._sbi_simulator, self._sbi_prior = prepare_for_sbi(rollout_sampler, prior)
+        self._sbi_simulator, self._sbi_prior = prepare_for_sbi(self._sbi_rollout_sampler, prior)
 
     @abstractmethod
     def step(self, snapshot_mode: str, meta_info: dict = None):
@@ -641,6 +646,7 @@ class SBIBase(InterruptableAlgorithm, ABC):
     def __getstate__(self):
         # Remove the unpickleable sbi-related members from this algorithm instance
         tmp_sbi_simulator = self.__dict__.pop("_sbi_simulator")
+        tmp_sbi_rollout_sampler = self.__dict__.pop("_sbi_rollout_sampler", None)
         tmp_subrtn_sbi_summary_writer = self.__dict__["_subrtn_sbi"].__dict__.pop("_summary_writer")
         tmp_subrtn_sbi_build_neural_net = self.__dict__["_subrtn_sbi"].__dict__.pop("_build_neural_net")
 
@@ -656,6 +662,7 @@ class SBIBase(InterruptableAlgorithm, ABC):
 
         # Inset them back
         self.__dict__["_sbi_simulator"] = tmp_sbi_simulator
+        self.__dict__["_sbi_rollout_sampler"] = tmp_sbi_rollout_sampler
         self.__dict__["_subrtn_sbi"]._summary_writer = tmp_subrtn_sbi_summary_writer
         self.__dict__["_subrtn_sbi"]._build_neural_net = tmp_subrtn_sbi_build_neural_net
         self.__dict__["_subrtn_policy"] = tmp_subrtn_policy
@@ -29,8 +29,11 @@
 import csv
 import joblib
 import os.path as osp
+import pickle
 import sys
 import torch as to
+from copy import deepcopy
+from itertools import product
 from tqdm import tqdm
 from typing import Optional
 from warnings import warn
@@ -44,11 +47,40 @@ from pyrado.environment_wrappers.utils import typed_env
 from pyrado.domain_randomization.utils import print_domain_params
 from pyrado.logger.step import StepLogger
 from pyrado.sampling.rollout import rollout
+from pyrado.sampling.sampler_pool import SamplerPool
 from pyrado.sampling.sequences import *
 from pyrado.sampling.bootstrapping import bootstrap_ci
 from pyrado.utils.input_output import print_cbt
 
 
+def _spota_eval_init(G, env_dr: bytes, cand_policy: bytes, ref_policies: bytes, buffers: list):
+    """ Store pickled (and thus copied) randomized environment and policies, and the references' domain buffers. """
+    G.env_dr = pickle.loads(env_dr)
+    G.cand_policy = pickle.loads(cand_policy)
+    G.ref_policies = pickle.loads(ref_policies)
+    G.buffers = buffers
+
+
+def _spota_eval_one(G, arg: tuple) -> tuple:
+    """
+    Evaluate the candidate and the k-th reference solution in the i-th domain of the k-th reference's buffer with the
+    same seed.
+
+    :param G: worker-local namespace, see `_spota_eval_init()`
+    :param arg: tuple of the reference's index k, the domain's index i, and the seed
+    :return: returns of the candidate and the reference
+    """
+    k, i, seed = arg
+    G.env_dr.buffer = G.buffers[k]
+
+    # Set the circular index for the particular realization, and do the rollouts with the synchronized seed
+    G.env_dr.ring_idx = i
+    ret_cand = rollout(G.env_dr, G.cand_policy, eval=True, seed=seed).undiscounted_return()
+    G.env_dr.ring_idx = i
+    ret_ref = rollout(G.env_dr, G.ref_policies[k], eval=True, seed=seed).undiscounted_return()
+    return ret_cand, ret_ref
+
+
 class SPOTA(InterruptableAlgorithm):
     r"""
     Simulation-based Policy Optimization with Probability Assessment (SPOTA)
@@ -90,6 +122,7 @@ class SPOTA(InterruptableAlgorithm):
         num_bs_reps: int = 1000,
         studentized_ci: bool = False,
         base_seed: int = None,
+        num_workers: int = 1,
         logger: Optional[StepLogger] = None,
     ):
         """
@@ -117,6 +150,7 @@ class SPOTA(InterruptableAlgorithm):
         :param num_bs_reps: number of replications for the statistical bootstrap
         :param studentized_ci: flag if a student T distribution should be applied for the confidence interval
         :param base_seed: seed added to all other seeds in order to make the experiments distinct but repeatable
+        :param num_workers: number of parallel processes evaluating the candidate and the reference solutions
         :param logger: logger for every step of the algorithm, if `None` the default logger will be created
         """
         if not typed_env(env, DomainRandWrapperBuffer):  # there is a domain randomization wrapper
@@ -159,6 +193,8 @@ class SPOTA(InterruptableAlgorithm):
         self.num_bs_reps = num_bs_reps
         self.studentized_ci = studentized_ci
         self.base_seed = np.random.randint(low=10000) if base_seed is None else base_seed
+        self.num_workers = num_workers
+        self._pool = None  # created on the first evaluation, and kept for the subsequent ones
 
         # Save initial environment and randomizer
         self.save_snapshot(meta_info=None)
@@ -325,31 +361,39 @@ class SPOTA(InterruptableAlgorithm):
 
             print_cbt("Learned an approx solution for SP_n\n", "y")
 
-    def _eval_cand_and_ref_one_domain(self, i: int) -> tuple:
+    def _eval_cands_and_refs(self, nr: int, ref_policies: list, buffers: list) -> tuple:
         """
-        Evaluate the candidate and the k-th reference solution (see outer loop) in the i-th domain using nJ rollouts.
+        Evaluate the candidate and every reference solution in the domains of the respective reference using nJ
+        rollouts with synchronized seeds. All rollouts are distributed among parallel workers.
 
-        :param i: index of the domain to evaluate in
-        :return: average return values for the candidate and the k-th reference in the i-th domain
+        :param nr: number of domains used for training the reference solutions
+        :param ref_policies: policies of the reference solutions
+        :param buffers: domain parameter buffers, i.e. lists of domain parameter sets, of the reference solutions
+        :return: average return values for the candidate and the references, both of shape nG x nr
         """
-        cand_ret_avg = 0.0
-        refs_ret_avg = 0.0
-
-        # Do nJ rollouts for each set of physics params
-        for r in range(self.nJ):
-            # Set the circular index for the particular realization
-            self.env_dr.ring_idx = i
-            # Do the rollout and collect the return
-            ro_cand = rollout(self.env_dr, self._subrtn_cand.policy, eval=True, seed=self.base_seed + i * self.nJ + r)
-            cand_ret_avg += ro_cand.undiscounted_return()
-
-            # Set the circular index for the particular realization
-            self.env_dr.ring_idx = i
-            # Do the rollout and collect the return
-            ro_ref = rollout(self.env_dr, self._subrtn_refs.policy, eval=True, seed=self.base_seed + i * self.nJ + r)
-            refs_ret_avg += ro_ref.undiscounted_return()
+        # The seed is synchronized between the candidate and the reference for every domain and repetition
+        arglist = [
+            (k, i, self.base_seed + i * self.nJ + r) for k, i, r in product(range(self.nG), range(nr), range(self.nJ))
+        ]
+
+        # The workers are started once, and only receive the current environment and policies in every evaluation
+        if self._pool is None:
+            self._pool = SamplerPool(self.num_workers)
+
+        # Distribute the environment and the policies. We use pickle to make sure a copy is created for 1 worker.
+        self._pool.invoke_all(
+            _spota_eval_init,
+            pickle.dumps(self.env_dr),
+            pickle.dumps(self._subrtn_cand.policy),
+            pickle.dumps(ref_policies),
+            buffers,
+        )
+        with tqdm(leave=False, file=sys.stdout, unit="rollout pairs", desc="Estimating the UCBOG") as pb:
+            rets = np.array(self._pool.run_map(_spota_eval_one, arglist, pb))
 
-        return cand_ret_avg / self.nJ, refs_ret_avg / self.nJ  # average over nJ seeds
+        # Average over the nJ seeds
+        rets = rets.reshape(self.nG, nr, self.nJ, 2).mean(axis=2)
+        return rets[..., 0], rets[..., 1]
 
     def _estimate_ucbog(self, nr: int):
         """
@@ -358,25 +402,16 @@ class SPOTA(InterruptableAlgorithm):
         :param nr: number of domains used for training the reference solutions
         :return: upper confidence bound on the optimality gap (UCBOG)
         """
-        # Init containers
-        cand_rets = np.zeros((self.nG, nr))
-        refs_rets = np.zeros((self.nG, nr))
-
-        # Loop over all reference solutions
+        # Load the policies (makes a difference for snapshot_mode = best)
+        self._subrtn_cand._policy = pyrado.load(
+            self._subrtn_cand._policy,
+            "policy",
+            "pt",
+            self.save_dir,
+            dict(prefix=f"iter_{self._curr_iter}", suffix="cand"),
+        )
+        ref_policies = []
         for k in range(self.nG):
-            print_cbt(f"Estimating the UCBOG | Reference {k + 1} of {self.nG} ...", "c")
-            # Load the domain parameters corresponding to the k-th reference solution
-            env_params_ref = joblib.load(osp.join(self.save_dir, f"iter_{self._curr_iter}_env_params_ref_{k}.pkl"))
-            self.env_dr.buffer = env_params_ref
-
-            # Load the policies (makes a difference for snapshot_mode = best)
-            self._subrtn_cand._policy = pyrado.load(
-                self._subrtn_cand._policy,
-                "policy",
-                "pt",
-                self.save_dir,
-                dict(prefix=f"iter_{self._curr_iter}", suffix="cand"),
-            )
             self._subrtn_refs._policy = pyrado.load(
                 self._subrtn_refs._policy,
                 "policy",
@@ -384,13 +419,21 @@ class SPOTA(InterruptableAlgorithm):
                 self.save_dir,
                 dict(prefix=f"iter_{self._curr_iter}", suffix=f"ref_{k}"),
             )
+            ref_policies.append(deepcopy(self._subrtn_refs._policy))
+
+        # Load the domain parameters corresponding to the reference solutions
+        buffers = [
+            joblib.load(osp.join(self.save_dir, f"iter_{self._curr_iter}_env_params_ref_{k}.pkl"))
+            for k in range(self.nG)
+        ]
 
-            # Loop over all domain realizations of the reference solutions
-            for i in tqdm(range(nr), total=nr, desc=f"Reference {k + 1}", unit="domains", file=sys.stdout, leave=False):
-                # Evaluate solutions
-                cand_rets[k, i], refs_rets[k, i] = self._eval_cand_and_ref_one_domain(i)
+        # Evaluate solutions
+        cand_rets, refs_rets = self._eval_cands_and_refs(nr, ref_policies, buffers)
 
-                # Process negative optimality samples
+        # Process negative optimality samples
+        for k in range(self.nG):
+            self.env_dr.buffer = buffers[k]
+            for i in range(nr):
                 refs_rets = self._handle_neg_samples(cand_rets, refs_rets, k, i)
 
         # --------------
@@ -502,3 +545,14 @@ class SPOTA(InterruptableAlgorithm):
             pyrado.save(self.env_dr.randomizer, "randomizer", "pkl", self.save_dir, meta_info)
         else:
             raise pyrado.ValueErr(msg=f"{self.name} is not supposed be run as a subroutine!")
+
+    def __getstate__(self):
+        # The workers can not be pickled, a loaded algorithm starts new ones on its first evaluation
+        state = dict(super().__getstate__())
+        state["_pool"] = None
+        return state
+
+    def __del__(self):
+        # Terminate the evaluation workers together with the algorithm
+        if getattr(self, "_pool", None) is not None:
+            self._pool.stop()
@@ -177,8 +177,6 @@ class DQL(ValueBased):
 
             # Sample steps and the associated next step from the replay memory
             steps, next_steps = self._memory.sample(self.batch_size)
-            steps.torch(data_type=to.get_default_dtype())
-            next_steps.torch(data_type=to.get_default_dtype())
 
             # Create masks for the non-final observations
             not_done = to.from_numpy(1.0 - steps.done).to(device=self.policy.device, dtype=to.get_default_dtype())
@@ -39,13 +39,36 @@ from pyrado.algorithms.base import Algorithm
 from pyrado.logger.step import LoggerAware
 from pyrado.policies.base import Policy
 from pyrado.policies.recurrent.base import RecurrentPolicy
-from pyrado.sampling.step_sequence import StepSequence, discounted_values
+from pyrado.sampling.step_sequence import StepSequence, discounted_values, discounted_reverse_cumsum_segments
 from pyrado.spaces import ValueFunctionSpace
 from pyrado.algorithms.utils import num_iter_from_rollouts
 from pyrado.utils.math import explained_var
 from pyrado.utils.data_processing import RunningStandardizer, standardize
 
 
+def _discounted_reverse_cumsum_segments_torch(data: to.Tensor, gamma: float, done: to.Tensor) -> to.Tensor:
+    """
+    Differentiable counterpart of `discounted_reverse_cumsum_segments()` for tensors. Instead of looping over the
+    steps, the scan is computed by recursive doubling, i.e. with log2(len(data)) vectorized operations. All factors
+    are at most 1, hence there are no numerical issues for long rollouts.
+
+    :param data: input data with samples along the 0 axis (e.g. time series of concatenated rollouts)
+    :param gamma: discount factor
+    :param done: boolean tensor broadcastable to `data`, specifying for each sample whether it ends a segment
+    :return: cumulative sums for every step
+    """
+    # Factor linking every step to its successor, zero at the segments' ends
+    coef = gamma * (~done).to(dtype=data.dtype)
+    out = data
+    shift = 1
+    while shift < data.shape[0]:
+        # Every entry holds the discounted sum over the next `shift` steps, extend it by the `shift` steps thereafter
+        out = to.cat([out[:-shift] + coef[:-shift] * out[shift:], out[-shift:]])
+        coef = to.cat([coef[:-shift] * coef[shift:], to.zeros_like(coef[-shift:])])
+        shift *= 2
+    return out
+
+
 class GAE(LoggerAware, nn.Module):
     """
     General Advantage Estimation (GAE)
@@ -151,18 +174,18 @@ class GAE(LoggerAware, nn.Module):
                 # Get the predictions from the value function
                 v_pred = self.values(concat_ros)
 
-            # Compute the advantages
-            adv = to.empty_like(v_pred)
-            for k in reversed(range(concat_ros.length)):
-                if concat_ros[k].done:
-                    adv[k] = concat_ros[k].reward - v_pred[k]
-                else:
-                    adv[k] = (
-                        concat_ros[k].reward
-                        + self.gamma * v_pred[k + 1]
-                        - v_pred[k]
-                        + self.gamma * self.lamda * adv[k + 1]
-                    )
+            # Compute the temporal differences, the next value is 0 for the last step of every rollout
+            rewards = to.as_tensor(concat_ros.rewards, dtype=v_pred.dtype, device=v_pred.device).view_as(v_pred)
+            done = to.from_numpy(concat_ros.done).to(device=v_pred.device).view(-1, *[1] * (v_pred.dim() - 1))
+            v_next = to.cat([v_pred[1:], to.zeros_like(v_pred[:1])])
+            deltas = rewards + self.gamma * v_next.masked_fill(done, 0.0) - v_pred
+
+            # Compute the advantages as reverse discounted cumulative sum of the temporal differences per rollout
+            if requires_grad:
+                adv = _discounted_reverse_cumsum_segments_torch(deltas, self.gamma * self.lamda, done)
+            else:
+                adv = discounted_reverse_cumsum_segments(deltas.cpu().numpy(), self.gamma * self.lamda, concat_ros.done)
+                adv = to.from_numpy(adv).to(dtype=v_pred.dtype, device=v_pred.device)
 
             if self.standardize_adv:
                 if isinstance(self.standardizer, RunningStandardizer):
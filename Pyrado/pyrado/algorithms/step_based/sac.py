@@ -241,8 +241,6 @@ class SAC(ValueBased):
         ):
             # Sample steps and the associated next step from the replay memory
             steps, next_steps = self._memory.sample(self.batch_size)
-            steps.torch(data_type=to.get_default_dtype())
-            next_steps.torch(data_type=to.get_default_dtype())
 
             # Standardize and optionally scale the rewards
             if self.standardize_rew:
@@ -28,17 +28,16 @@
 
 import numpy as np
 import torch as to
+import torch.nn.utils.convert_parameters as cp
 from copy import deepcopy
-from scipy.spatial.distance import squareform, pdist
 from torch.distributions.kl import kl_divergence
 from typing import Sequence
 
 import pyrado
 from pyrado.algorithms.step_based.gae import GAE
 from pyrado.algorithms.base import Algorithm
-from pyrado.algorithms.utils import compute_action_statistics
 from pyrado.environments.base import Env
-from pyrado.policies.feed_forward.fnn import FNNPolicy
+from pyrado.policies.feed_forward.fnn import FNNPolicy, batched_fnn_forward
 from pyrado.algorithms.step_based.gae import ValueFunctionSpace
 from pyrado.utils.data_types import EnvSpec
 from pyrado.exploration.stochastic_action import NormalActNoiseExplStrat
@@ -166,7 +165,6 @@ class SVPG(Algorithm):
         self.particles = [None] * num_particles
         self.particleSteps = [None] * num_particles
         self.expl_strats = [None] * num_particles
-        self.optimizers = [None] * num_particles
         self.fixed_particles = [None] * num_particles
         self.fixed_expl_strats = [None] * num_particles
         self.samplers = [None] * num_particles
@@ -184,7 +182,6 @@ class SVPG(Algorithm):
             self.particles[i] = deepcopy(particle)
             self.particles[i].init_param()
             self.expl_strats[i] = NormalActNoiseExplStrat(self.particles[i].actor, std_init)
-            self.optimizers[i] = to.optim.Adam(self.expl_strats[i].parameters(), lr=self.lr)
             self.fixed_particles[i] = deepcopy(self.particles[i])
             self.fixed_expl_strats[i] = deepcopy(self.expl_strats[i])
             self.particleSteps[i] = 0
@@ -194,6 +191,31 @@ class SVPG(Algorithm):
                     env, self.expl_strats[i], num_workers, min_rollouts=min_rollouts, min_steps=min_steps
                 )
 
+        # One optimizer for the stacked parameters of all particles. Since Adam works element-wise, this is equivalent
+        # to one optimizer per particle, but needs only one step for all of them.
+        self.optimizer = to.optim.Adam(self._stacked_params(), lr=self.lr)
+
+    def _stacked_params(self) -> list:
+        """ Get the parameters of all particles' exploration strategies, ordered by particle. """
+        return [p for e in self.expl_strats for p in e.parameters()]
+
+    @staticmethod
+    def _evaluate_actors(expl_strats: Sequence[NormalActNoiseExplStrat], rollouts: Sequence[StepSequence]) -> list:
+        """
+        Re-evaluate the rollouts of every particle with its actor. If all actors are feed-forward networks with the same
+        architecture, this is done in one batched forward pass, otherwise one particle at a time.
+
+        :param expl_strats: exploration strategies of the particles, wrapping the actors
+        :param rollouts: concatenated rollouts, one per particle
+        :return: noise-free actions with gradient data, one tensor per particle
+        """
+        if all(isinstance(e.policy, FNNPolicy) for e in expl_strats):
+            obs = [ro.get_data_values("observations", truncate_last=True) for ro in rollouts]
+            acts = batched_fnn_forward([e.policy.net for e in expl_strats], obs)
+            if acts is not None:
+                return acts
+        return [e.policy.evaluate(ro) for e, ro in zip(expl_strats, rollouts)]
+
     def step(self, snapshot_mode: str, meta_info: dict = None):
         # Serial flag must not be set when interacting through step and reset
         if not self.serial:
@@ -249,22 +271,18 @@ class SVPG(Algorithm):
         :param X: the tensor to compute the kernel from
         :return: the kernel and its derivatives
         """
-        X_np = X.cpu().data.numpy()  # use numpy because torch median is flawed
-        pairwise_dists = squareform(pdist(X_np)) ** 2
+        X = X.detach()
+        pairwise_dists = to.cdist(X, X) ** 2
 
-        # Median trick
-        h = np.median(pairwise_dists)
-        h = np.sqrt(0.5 * h / np.log(self.num_particles + 1))
+        # Median trick (the quantile interpolates like the median in numpy, unlike torch's median)
+        h = to.quantile(pairwise_dists, 0.5)
+        h = to.sqrt(0.5 * h / np.log(self.num_particles + 1))
 
         # Compute RBF Kernel
-        Kxx = to.exp(-to.from_numpy(pairwise_dists).to(to.get_default_dtype()) / h ** 2 / 2)
+        Kxx = to.exp(-pairwise_dists / h ** 2 / 2)
 
-        # Compute kernel gradient
-        dx_Kxx = -(Kxx).matmul(X)
-        sum_Kxx = Kxx.sum(1)
-        for i in range(X.shape[1]):
-            dx_Kxx[:, i] = dx_Kxx[:, i] + X[:, i].matmul(sum_Kxx)
-        dx_Kxx /= h ** 2
+        # Compute kernel gradient, i.e. sum_j d/dx_j k(x_j, x_i)
+        dx_Kxx = (-Kxx.matmul(X) + X * Kxx.sum(1, keepdim=True)) / h ** 2
 
         return Kxx, dx_Kxx
 
@@ -274,43 +292,55 @@ class SVPG(Algorithm):
 
         :param rollouts: rewards collected from the rollout
         """
-        policy_grads = []
-        parameters = []
+        policy_losses = []
 
-        for i in range(self.num_particles):
-            # Get the rollouts associated to the i-th particle
-            concat_ros = StepSequence.concat(rollouts[i])
-            concat_ros.torch()
+        # Get the rollouts associated to each particle
+        concat_ros = [StepSequence.concat(ros) for ros in rollouts]
+        for ro in concat_ros:
+            ro.torch()
+
+        # Evaluate the actors of all particles at once
+        act_means = self._evaluate_actors(self.expl_strats, concat_ros)
+        with to.no_grad():
+            act_means_fixed = self._evaluate_actors(self.fixed_expl_strats, concat_ros)
 
-            act_stats = compute_action_statistics(concat_ros, self.expl_strats[i])
-            act_stats_fixed = compute_action_statistics(concat_ros, self.fixed_expl_strats[i])
+        for i in range(self.num_particles):
+            act_distr = self.expl_strats[i].action_dist_at(act_means[i])
+            act_distr_fixed = self.fixed_expl_strats[i].action_dist_at(act_means_fixed[i])
 
-            klds = to.distributions.kl_divergence(act_stats.act_distr, act_stats_fixed.act_distr)
-            entropy = act_stats.act_distr.entropy()
-            log_prob = act_stats.log_probs
+            klds = to.distributions.kl_divergence(act_distr, act_distr_fixed)
+            entropy = act_distr.entropy()
+            log_prob = act_distr.log_prob(concat_ros[i].actions.to(self.expl_strats[i].device))
 
-            concat_ros.rewards = concat_ros.rewards - (0.1 * klds.mean(1)).view(-1) - 0.1 * entropy.mean(1).view(-1)
+            concat_ros[i].rewards = (
+                concat_ros[i].rewards - (0.1 * klds.mean(1)).view(-1) - 0.1 * entropy.mean(1).view(-1)
+            )
 
             # Update the advantage estimator's parameters and return advantage estimates
             adv = self.particles[i].critic.update(rollouts[i], use_empirical_returns=True)
 
-            # Estimate policy gradients
-            self.optimizers[i].zero_grad()
-            policy_grad = -to.mean(log_prob * adv.detach())
-            policy_grad.backward()  # step comes later than usual
+            # Policy gradient loss, the backward pass is done for all particles at once
+            policy_losses.append(-to.mean(log_prob * adv.detach()))
 
-            # Collect flattened parameter and gradient vectors
-            policy_grads.append(self.expl_strats[i].param_grad)
-            parameters.append(self.expl_strats[i].param_values)
+        # Estimate the policy gradients of all particles with one backward pass. Every particle's loss only depends on
+        # its own parameters, also in the batched forward pass, thus the gradient of the sum w.r.t. a particle's
+        # parameters is the gradient of this particle's loss.
+        self.optimizer.zero_grad()
+        to.stack(policy_losses).sum().backward()  # step comes later than usual
+
+        # Stacked flattened parameter and gradient vectors of shape num_particles x num_params
+        params = self._stacked_params()
+        for p in params:
+            if p.grad is None:
+                p.grad = to.zeros_like(p)  # parameters which did not contribute to the loss
+        parameters = cp.parameters_to_vector(params).detach().view(self.num_particles, -1)
+        policy_grads = cp.parameters_to_vector(p.grad for p in params).view(self.num_particles, -1)
 
-        parameters = to.stack(parameters)
-        policy_grads = to.stack(policy_grads)
         Kxx, dx_Kxx = self.kernel(parameters)
         grad_theta = (to.mm(Kxx, policy_grads / self.temperature) + dx_Kxx) / self.num_particles
 
-        for i in range(self.num_particles):
-            self.expl_strats[i].param_grad = grad_theta[i]
-            self.optimizers[i].step()
+        cp.vector_to_parameters(grad_theta.view(-1), (p.grad for p in params))
+        self.optimizer.step()
         self.update_count += 1
 
     def save_snapshot(self, meta_info: dict = None):
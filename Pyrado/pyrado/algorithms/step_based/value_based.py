@@ -37,7 +37,14 @@ from pyrado.algorithms.base import Algorithm
 from pyrado.algorithms.utils import ReplayMemory
 from pyrado.environments.base import Env
 from pyrado.exploration.stochastic_action import SACExplStrat, EpsGreedyExplStrat
-from pyrado.logger.step import StepLogger, ConsolePrinter, CSVPrinter, TensorBoardPrinter
+from pyrado.logger.step import (
+    AsyncPrinter,
+    BinaryColumnPrinter,
+    StepLogger,
+    ConsolePrinter,
+    CSVPrinter,
+    TensorBoardPrinter,
+)
 from pyrado.policies.base import Policy, TwoHeadedPolicy
 from pyrado.policies.special.dummy import RecurrentDummyPolicy, DummyPolicy
 from pyrado.sampling.parallel_rollout_sampler import ParallelRolloutSampler
@@ -96,11 +103,14 @@ class ValueBased(Algorithm, ABC):
             raise pyrado.TypeErr(given=num_init_memory_steps, expected_type=int)
 
         if logger is None:
-            # Create logger that only logs every logger_print_intvl steps of the algorithm
+            # Create logger that only logs every logger_print_intvl steps of the algorithm. The files are written in
+            # the background, since the printers are called from the inner loop over the steps.
             logger = StepLogger(print_intvl=eval_intvl)
             logger.printers.append(ConsolePrinter())
-            logger.printers.append(CSVPrinter(osp.join(save_dir, "progress.csv")))
-            logger.printers.append(TensorBoardPrinter(osp.join(save_dir, "tb")))
+            logger.printers.append(AsyncPrinter(CSVPrinter(osp.join(save_dir, "progress.csv"), flush_intvl=10)))
+            logger.printers.append(AsyncPrinter(TensorBoardPrinter(osp.join(save_dir, "tb"), flush_intvl=10)))
+            if pyrado.log_progress_bin:
+                logger.printers.append(AsyncPrinter(BinaryColumnPrinter(osp.join(save_dir, "progress_bin"))))
 
         # Call Algorithm's constructor
         super().__init__(save_dir, max_iter, policy, logger)
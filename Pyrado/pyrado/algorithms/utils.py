@@ -29,11 +29,12 @@
 import functools
 import numpy as np
 import torch as to
-from copy import deepcopy
 from torch.distributions import Distribution
 from typing import NamedTuple, Union, Sequence, Callable, Optional
 
 import pyrado
+from pyrado.sampling.data_format import to_format
+from pyrado.sampling.rollout_storage import _flatten_data, _unflatten_data
 from pyrado.sampling.step_sequence import StepSequence
 from pyrado.exploration.stochastic_action import StochasticActionExplStrat
 from pyrado.utils.input_output import print_cbt
@@ -70,7 +71,13 @@ def compute_action_statistics(steps: StepSequence, expl_strat: StochasticActionE
 
 
 class ReplayMemory:
-    """ Base class for storing step transitions """
+    """
+    Base class for storing step transitions.
+    The transitions are stored field-wise in preallocated circular buffers, i.e. one array per data field of the
+    pushed rollouts, which are allocated at the first push. Nested data fields, e.g. dicts of environment infos or
+    (named) tuples of hidden states, are flattened into one buffer per array. Pushing overwrites the oldest
+    transitions in-place.
+    """
 
     def __init__(self, capacity: int):
         """
@@ -79,21 +86,49 @@ class ReplayMemory:
         :param capacity: number of steps a.k.a. transitions in the memory
         """
         self.capacity = int(capacity)
-        self._memory = None
+        self._buffers = None  # dict of arrays with the capacity as first dimension
+        self._structures = None  # dict mapping the data names to their structure of buffer names
+        self._done = None
+        self._pos = 0  # index where the next transition is written to
+        self._size = 0  # number of stored transitions
 
     @property
-    def memory(self) -> StepSequence:
-        """ Get the replay buffer. """
-        return self._memory
+    def memory(self) -> Optional[StepSequence]:
+        """ Get a copy of the replay buffer's content as one step sequence, ordered from the oldest to the newest. """
+        if self.isempty:
+            return None
+        return self._gather(self._chrono_to_buffer_idcs(np.arange(self._size)), "numpy", None)
 
     @property
     def isempty(self) -> bool:
         """ Check if the replay buffer is empty. """
-        return self._memory is None
+        return self._size == 0
 
     def __len__(self) -> int:
         """ Get the number of transitions stored in the buffer. """
-        return self._memory.length
+        return self._size
+
+    def _chrono_to_buffer_idcs(self, idcs: np.ndarray) -> np.ndarray:
+        """
+        Convert chronological indices, i.e. 0 is the oldest stored transition, to indices of the circular buffers.
+
+        :param idcs: chronological indices
+        :return: buffer indices
+        """
+        return (self._pos - self._size + idcs) % self.capacity
+
+    def _gather(self, idcs: np.ndarray, data_format: str, data_type) -> StepSequence:
+        """
+        Copy the transitions at the given buffer indices into a new step sequence.
+
+        :param idcs: buffer indices
+        :param data_format: 'torch' to use Tensors, 'numpy' to use ndarrays
+        :param data_type: type to return the data in, pass `None` to leave the data type unchanged
+        :return: non-continuous step sequence
+        """
+        columns = {name: to_format(buf[idcs], data_format, data_type) for name, buf in self._buffers.items()}
+        data = {name: _unflatten_data(structure, columns) for name, structure in self._structures.items()}
+        return StepSequence(data_format=data_format, done=self._done[idcs], continuous=False, **data)
 
     def push(self, ros: Union[list, StepSequence], truncate_last: bool = True):
         """
@@ -104,34 +139,68 @@ class ReplayMemory:
         """
         if isinstance(ros, list):
             # Concatenate given rollouts if necessary
-            ros = StepSequence.concat(ros)
+            ros = StepSequence.concat(ros, truncate_last=truncate_last)
         elif isinstance(ros, StepSequence):
             pass
         else:
-            pyrado.TypeErr(given=ros, expected_type=[list, StepSequence])
-
-        # Add new steps
-        if self.isempty:
-            self._memory = deepcopy(ros)  # on the very first call
-        else:
-            self._memory = StepSequence.concat([self._memory, ros], truncate_last=truncate_last)
-
-        num_surplus = self._memory.length - self.capacity
-        if num_surplus > 0:
-            # Drop surplus of old steps
-            self._memory = self._memory[num_surplus:]
-
-    def sample(self, batch_size: int) -> tuple:
+            raise pyrado.TypeErr(given=ros, expected_type=[list, StepSequence])
+
+        # Flatten all data fields into arrays, and cut off the entries after the last step
+        columns = dict()
+        structures = {name: _flatten_data(ros.get_data_values(name), name, columns) for name in ros.data_names}
+        data = {name: value[: ros.length] for name, value in columns.items()}
+
+        if self._buffers is None:
+            # Allocate the buffers on the very first call
+            self._buffers = {
+                name: np.empty((self.capacity,) + value.shape[1:], dtype=value.dtype) for name, value in data.items()
+            }
+            self._structures = structures
+            self._done = np.empty(self.capacity, dtype=np.bool_)
+        elif not self._buffers.keys() <= data.keys():
+            # Additional data fields are ignored, missing ones are not allowed
+            raise pyrado.KeyErr(
+                msg=f"The pushed data fields {list(data.keys())} do not contain all stored ones "
+                f"{list(self._buffers.keys())}!"
+            )
+
+        # Only keep the newest steps if there are more new steps than the capacity
+        num_new = min(ros.length, self.capacity)
+        idcs = (self._pos + np.arange(num_new)) % self.capacity
+        for name, buf in self._buffers.items():
+            buf[idcs] = data[name][-num_new:]
+        self._done[idcs] = ros.done[-num_new:]
+
+        # Move the write pointer, drop surplus of old steps implicitly by overwriting them
+        self._pos = (self._pos + num_new) % self.capacity
+        self._size = min(self._size + num_new, self.capacity)
+
+    def sample(self, batch_size: int, data_type: Optional[to.dtype] = None) -> tuple:
         """
         Sample randomly from the replay memory.
 
         :param batch_size: number of samples
-        :return: tuple of transition steps and associated next steps
+        :param data_type: type of the returned tensors, by default PyTorch's default data type is used
+        :return: tuple of transition steps and associated next steps, both as step sequences holding PyTorch tensors
         """
-        return self._memory.sample_w_next(batch_size)
+        if not self._size >= 2:
+            raise pyrado.ValueErr(given=self._size, ge_constraint="2")
+        if data_type is None:
+            data_type = to.get_default_dtype()
+
+        # The newest step is excluded to always have a next step
+        chrono_idcs = np.random.choice(self._size - 1, batch_size, replace=False)
+        idcs = self._chrono_to_buffer_idcs(chrono_idcs)
+        next_idcs = self._chrono_to_buffer_idcs(chrono_idcs + 1)
+
+        return self._gather(idcs, "torch", data_type), self._gather(next_idcs, "torch", data_type)
 
     def reset(self):
-        self._memory = None
+        self._buffers = None
+        self._structures = None
+        self._done = None
+        self._pos = 0
+        self._size = 0
 
     def avg_reward(self) -> float:
         """
@@ -139,10 +208,10 @@ class ReplayMemory:
 
         :return: average reward
         """
-        if self._memory is None:
+        if self.isempty:
             raise pyrado.TypeErr(msg="The replay memory is empty!")
         else:
-            return sum(self._memory.rewards) / self._memory.length
+            return float(np.mean(self._buffers["rewards"][: self._size]))
 
 
 def until_thold_exceeded(thold: float, max_rep: Optional[int] = None):
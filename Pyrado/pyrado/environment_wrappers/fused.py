@@ -0,0 +1,213 @@
+# Copyright (c) 2020, Fabio Muratore, Honda Research Institute Europe GmbH, and
+# Technical University of Darmstadt.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. Neither the name of Fabio Muratore, Honda Research Institute Europe GmbH,
+#    or Technical University of Darmstadt, nor the names of its contributors may
+#    be used to endorse or promote products derived from this software without
+#    specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL FABIO MURATORE, HONDA RESEARCH INSTITUTE EUROPE GMBH,
+# OR TECHNICAL UNIVERSITY OF DARMSTADT BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+# IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import numpy as np
+from init_args_serializer import Serializable
+from typing import List, Optional
+
+from pyrado.environment_wrappers.action_delay import ActDelayWrapper
+from pyrado.environment_wrappers.action_normalization import ActNormWrapper
+from pyrado.environment_wrappers.base import EnvWrapper
+from pyrado.environment_wrappers.observation_noise import GaussianObsNoiseWrapper
+from pyrado.environment_wrappers.observation_normalization import ObsNormWrapper
+from pyrado.environments.base import Env
+
+
+# Operation codes of the fused step function
+_ACT_NORM = 0
+_ACT_DELAY = 1
+_OBS_NORM = 2
+_OBS_NOISE = 3
+
+
+class _ActRing:
+    """ Preallocated ring buffer replacing the action queue of an `ActDelayWrapper` """
+
+    def __init__(self, wrapper: ActDelayWrapper):
+        """
+        Constructor
+
+        :param wrapper: action delay wrapper whose current queue is copied into the ring buffer
+        """
+        self.wrapper = wrapper
+        self.buffer = np.array(wrapper._act_queue, dtype=np.float64).reshape(-1, *wrapper.act_space.shape)
+        self.idx = 0
+
+    def push(self, act: np.ndarray) -> np.ndarray:
+        """
+        Store the given action and return the one that was commanded `len(buffer)` steps before.
+
+        :param act: commanded action
+        :return: delayed action
+        """
+        if self.buffer.shape[0] == 0:
+            return act
+        act_delayed = self.buffer[self.idx].copy()
+        self.buffer[self.idx] = act
+        self.idx = (self.idx + 1) % self.buffer.shape[0]
+        return act_delayed
+
+    def flush(self):
+        """ Write the buffer's content back into the wrapper's queue, oldest action first. """
+        num = self.buffer.shape[0]
+        self.wrapper._act_queue = [self.buffer[(self.idx + i) % num].copy() for i in range(num)]
+
+
+class FusedWrapperStack(EnvWrapper, Serializable):
+    """
+    Environment wrapper which executes the steps of the wrapper chain below it in one flat function instead of passing
+    through every wrapper's `step()` method. All constants, i.e. the normalization bounds, the noise parameters, and
+    the delay buffers, are extracted from the wrappers after every reset, and the Gaussian observation noise of all
+    wrappers is drawn with one call to the random number generator. The resulting observations, rewards, and actions
+    are identical to the ones of the nested chain.
+
+    Supported are `ActNormWrapper`, `ActDelayWrapper`, `ObsNormWrapper`, `GaussianObsNoiseWrapper`, as well as all
+    wrappers which do not change the step, e.g. `DomainRandWrapperLive`. The chain is fused from the outside in until
+    the first other wrapper, which is then stepped regularly.
+
+    .. note::
+        The fused wrapper owns the step path of the chain. Stepping the wrapped environment directly while the fused
+        wrapper is used, leads to inconsistent action delays.
+    """
+
+    def __init__(self, wrapped_env: Env):
+        """
+        Constructor
+
+        :param wrapped_env: outermost environment of the chain to fuse
+        """
+        Serializable._init(self, locals())
+
+        super().__init__(wrapped_env)
+
+        # Build the plan lazily, since the wrappers' constants are only valid after a reset
+        self._act_ops = []
+        self._obs_ops = []
+        self._rings = []
+        self._noise_size = 0
+        self._core = None
+
+    @property
+    def fused_envs(self) -> List[Env]:
+        """ Get the environments of the chain which are executed by the fused step function, outermost first. """
+        fused = []
+        env = self._wrapped_env
+        while env is not self._core:
+            fused.append(env)
+            env = env.wrapped_env
+        return fused
+
+    @staticmethod
+    def is_fusable(env: Env) -> bool:
+        """
+        Check if the step of the given environment can be replaced by the fused step function.
+
+        :param env: environment of the chain
+        :return: `True` if the environment is a supported wrapper or a wrapper which does not change the step
+        """
+        if not isinstance(env, EnvWrapper):
+            return False
+        return type(env) in (ActNormWrapper, ActDelayWrapper, ObsNormWrapper, GaussianObsNoiseWrapper) or (
+            type(env).step is EnvWrapper.step
+        )
+
+    def _invalidate(self, flush: bool):
+        """
+        Discard the current plan.
+
+        :param flush: if `True`, write the state of the delay buffers back into the wrappers before discarding them
+        """
+        if flush:
+            for ring in self._rings:
+                ring.flush()
+        self._act_ops, self._obs_ops, self._rings = [], [], []
+        self._noise_size = 0
+        self._core = None
+
+    def _build(self):
+        """ Extract the constants from the wrappers and assemble the lists of operations of the fused step. """
+        env = self._wrapped_env
+        while self.is_fusable(env):
+            if isinstance(env, ActNormWrapper):
+                lb, ub = env.wrapped_env.act_space.bounds
+                self._act_ops.append((_ACT_NORM, (lb, ub - lb)))
+            elif isinstance(env, ActDelayWrapper):
+                if env.delay != 0:
+                    ring = _ActRing(env)
+                    self._rings.append(ring)
+                    self._act_ops.append((_ACT_DELAY, (ring,)))
+            elif isinstance(env, ObsNormWrapper):
+                self._obs_ops.append((_OBS_NORM, (env.ov_lb, env.ov_ub - env.ov_lb)))
+            elif isinstance(env, GaussianObsNoiseWrapper):
+                self._obs_ops.append((_OBS_NOISE, [env.obs_space.shape, env._std, env._mean]))
+            env = env.wrapped_env
+        self._core = env
+
+        # The observations are processed from the inside out, thus the noise is drawn from the innermost wrapper on
+        self._obs_ops.reverse()
+        for code, args in self._obs_ops:
+            if code == _OBS_NOISE:
+                size = int(np.prod(args[0]))
+                args.insert(0, slice(self._noise_size, self._noise_size + size))
+                self._noise_size += size
+
+    def _load_domain_param(self, domain_param: dict):
+        # The wrappers below load their parameters immediately, thus rebuild the plan before the next step
+        self._invalidate(flush=True)
+
+    def reset(self, init_state: np.ndarray = None, domain_param: dict = None) -> np.ndarray:
+        # Reset the nested chain, which also resets the wrappers' action queues
+        self._invalidate(flush=False)
+        init_obs = self._wrapped_env.reset(init_state, domain_param)
+
+        self._build()
+        return init_obs
+
+    def step(self, act: np.ndarray) -> tuple:
+        if self._core is None:
+            self._build()
+
+        # Process the action from the outside in
+        for code, args in self._act_ops:
+            if code == _ACT_NORM:
+                act = args[0] + (act + 1) * args[1] / 2
+            else:
+                act = args[0].push(act)
+
+        obs, rew, done, info = self._core.step(act)
+
+        # Process the observation from the inside out, drawing the noise of all wrappers at once
+        if self._noise_size > 0:
+            noise = np.random.randn(self._noise_size)
+        for code, args in self._obs_ops:
+            if code == _OBS_NORM:
+                obs = (obs - args[0]) / args[1] * 2 - 1
+            else:
+                obs = obs + (noise[args[0]].reshape(args[1]) * args[2] + args[3])
+
+        return obs, rew, done, info
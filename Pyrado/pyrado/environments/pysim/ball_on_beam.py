@@ -30,6 +30,7 @@ import numpy as np
 from init_args_serializer.serializable import Serializable
 
 from pyrado.environments.pysim.base import SimPyEnv
+from pyrado.environments.pysim.kernels import bob_step
 from pyrado.spaces.box import BoxSpace
 from pyrado.spaces.discrete import DiscreteSpace
 from pyrado.spaces.compound import CompoundSpace
@@ -47,8 +48,8 @@ class BallOnBeamSim(SimPyEnv, Serializable):
     name: str = "bob"
 
     def _create_spaces(self):
-        l_beam = self.domain_param["l_beam"]
-        g = self.domain_param["g"]
+        l_beam = self._domain_param["l_beam"]
+        g = self._domain_param["g"]
 
         # Set the bounds for the system's states and actions
         max_state = np.array([l_beam / 2.0, np.pi / 4.0, 10.0, np.pi])
@@ -87,11 +88,11 @@ class BallOnBeamSim(SimPyEnv, Serializable):
         )  # constant beam angle offset [rad]
 
     def _calc_constants(self):
-        m_ball = self.domain_param["m_ball"]
-        r_ball = self.domain_param["r_ball"]
-        m_beam = self.domain_param["m_beam"]
-        l_beam = self.domain_param["l_beam"]
-        d_beam = self.domain_param["d_beam"]
+        m_ball = self._domain_param["m_ball"]
+        r_ball = self._domain_param["r_ball"]
+        m_beam = self._domain_param["m_beam"]
+        l_beam = self._domain_param["l_beam"]
+        d_beam = self._domain_param["d_beam"]
 
         self.J_ball = 2.0 / 5 * m_ball * r_ball ** 2
         self.J_beam = 1.0 / 12 * m_beam * (l_beam ** 2 + d_beam ** 2)
@@ -108,10 +109,10 @@ class BallOnBeamSim(SimPyEnv, Serializable):
         )
 
     def _step_dynamics(self, act: np.ndarray):
-        g = self.domain_param["g"]
-        m_ball = self.domain_param["m_ball"]
-        c_frict = self.domain_param["c_frict"]
-        ang_offset = self.domain_param["ang_offset"]
+        g = self._domain_param["g"]
+        m_ball = self._domain_param["m_ball"]
+        c_frict = self._domain_param["c_frict"]
+        ang_offset = self._domain_param["ang_offset"]
 
         # Nonlinear dynamics
         x = self.state[0]  # ball position
@@ -128,6 +129,54 @@ class BallOnBeamSim(SimPyEnv, Serializable):
         self.state[2:] += np.array([x_ddot, a_ddot]) * self._dt  # next velocity
         self.state[:2] += self.state[2:] * self._dt  # next position
 
+    def _step_dynamics_batch(
+        self, states: np.ndarray, acts: np.ndarray, domain_param: dict, memory: dict
+    ) -> np.ndarray:
+        g = domain_param["g"]
+        m_ball = domain_param["m_ball"]
+        r_ball = domain_param["r_ball"]
+        m_beam = domain_param["m_beam"]
+        l_beam = domain_param["l_beam"]
+        d_beam = domain_param["d_beam"]
+        c_frict = domain_param["c_frict"]
+        ang_offset = domain_param["ang_offset"]
+        J_ball = 2.0 / 5 * m_ball * r_ball ** 2
+        J_beam = 1.0 / 12 * m_beam * (l_beam ** 2 + d_beam ** 2)
+        zeta_ball = m_ball + J_ball / r_ball ** 2
+
+        # Nonlinear dynamics
+        states = states.copy()
+        x = states[:, 0]  # ball position
+        a = states[:, 1] + ang_offset  # beam angular position
+        x_dot = states[:, 2]  # ball velocity
+        a_dot = states[:, 3]  # beam angular velocity
+        zeta_beam = m_ball * x ** 2 + J_beam  # depends on the bal position
+
+        # EoM solved for the accelerations
+        x_ddot = (-c_frict * x_dot + m_ball * x * a_dot ** 2 - m_ball * g * np.sin(a)) / zeta_ball
+        a_ddot = (acts[:, 0] - 2.0 * m_ball * x * x_dot * a_dot - m_ball * g * np.cos(a) * x) / zeta_beam
+
+        # Integration step (symplectic Euler)
+        states[:, 2:] += np.stack([x_ddot, a_ddot], axis=1) * self._dt  # next velocity
+        states[:, :2] += states[:, 2:] * self._dt  # next position
+        return states
+
+    def _calc_kernel_param(self) -> np.ndarray:
+        return np.array(
+            [
+                self._domain_param["g"],
+                self._domain_param["m_ball"],
+                self._domain_param["c_frict"],
+                self._domain_param["ang_offset"],
+                self.J_beam,
+                self.zeta_ball,
+            ],
+            dtype=np.float64,
+        )
+
+    def _step_kernel(self, act: np.ndarray):
+        bob_step(self.state, np.atleast_1d(np.asarray(act, dtype=np.float64)), self._kernel_param, self._dt)
+
     def _init_anim(self):
         # Import PandaVis Class
         from pyrado.environments.pysim.pandavis import BallOnBeamVis
@@ -28,13 +28,12 @@
 
 import numpy as np
 from abc import abstractmethod
-from copy import deepcopy
 from init_args_serializer import Serializable
 from typing import Optional
 
 import pyrado
 from pyrado.environments.sim_base import SimEnv
-from pyrado.utils.data_types import RenderMode
+from pyrado.utils.data_types import DomainParamArray, RenderMode
 from pyrado.spaces.base import Space
 from pyrado.tasks.base import Task
 from pyrado.utils.input_output import print_cbt
@@ -54,18 +53,21 @@ class SimPyEnv(SimEnv, Serializable):
         Serializable._init(self, locals())
         super().__init__(dt, max_steps)
         self._rendering = False
+        self._use_kernel = False
 
         # Initialize the domain parameters and the derived constants
-        self._domain_param = self.get_nominal_domain_param()
+        self._domain_param = DomainParamArray(self.get_nominal_domain_param())
         self._set_domain_param_attrs(self.get_nominal_domain_param())
         self._calc_constants()
+        self._kernel_param = self._calc_kernel_param()
 
         # Initialize spaces
         self._state_space = None
         self._obs_space = None
         self._act_space = None
         self._init_space = None
-        self._create_spaces()
+        self._space_domain_param = None
+        self._update_spaces()
 
         # Create task
         if not (isinstance(task_args, dict) or task_args is None):
@@ -103,21 +105,62 @@ class SimPyEnv(SimEnv, Serializable):
 
     @property
     def domain_param(self) -> dict:
-        return deepcopy(self._domain_param)
+        """
+        Get a copy of the domain parameters, which can be modified freely. Use `domain_param_view` for read-only access
+        without copying.
+        """
+        return self._domain_param.to_dict()
 
     @domain_param.setter
     def domain_param(self, domain_param: dict):
         if not isinstance(domain_param, dict):
             raise pyrado.TypeErr(given=domain_param, expected_type=dict)
-        # Update the parameters
-        self._domain_param.update(domain_param)
+        # Update the parameters, nothing needs to be recomputed if no value has changed
+        changed = self._domain_param.update(domain_param)
+        if not changed:
+            return
         self._calc_constants()
+        self._kernel_param = self._calc_kernel_param()
 
-        # Update spaces
-        self._create_spaces()
+        # Update spaces only if they depend on a changed parameter
+        if changed & self._space_domain_param:
+            self._update_spaces()
 
-        # Reset task to adapt for the potentially changed spaces
-        self._task.reset(env_spec=self.spec)
+            # Reset task to adapt for the changed spaces
+            self._task.reset(env_spec=self.spec)
+
+    @property
+    def domain_param_view(self) -> DomainParamArray:
+        """ Get read-only access to the domain parameters without copying. """
+        return self._domain_param
+
+    def _update_spaces(self):
+        """ Create the spaces, and record on which domain parameters they depend. """
+        self._domain_param.record_access()
+        try:
+            self._create_spaces()
+        finally:
+            self._space_domain_param = self._domain_param.accessed()
+
+    @property
+    def use_kernel(self) -> bool:
+        """ Get the flag if the dynamics are simulated with the environment's compiled kernel. """
+        return self._use_kernel
+
+    @use_kernel.setter
+    def use_kernel(self, use_kernel: bool):
+        """
+        Set the flag if the dynamics are simulated with the environment's compiled kernel, see `kernels.py`. The kernels
+        are compiled with numba if it is installed, and yield the same results as `_step_dynamics()` up to the
+        floating-point precision.
+
+        :param use_kernel: `True` to use the kernel, `False` to use `_step_dynamics()`
+        """
+        if not isinstance(use_kernel, bool):
+            raise pyrado.TypeErr(given=use_kernel, expected_type=bool)
+        if use_kernel and type(self)._step_kernel is SimPyEnv._step_kernel:
+            raise pyrado.ValueErr(msg=f"There is no compiled dynamics kernel for {type(self).__name__}!")
+        self._use_kernel = use_kernel
 
     @abstractmethod
     def _create_spaces(self):
@@ -139,6 +182,50 @@ class SimPyEnv(SimEnv, Serializable):
         """
         raise NotImplementedError
 
+    def _step_dynamics_batch(
+        self, states: np.ndarray, acts: np.ndarray, domain_param: dict, memory: dict
+    ) -> np.ndarray:
+        """
+        Implement this to simulate the dynamics of multiple instances of this environment in one vectorized call.
+        This is optional and used by `VecSimEnv`. If not implemented, the instances are stepped one after another.
+
+        .. note::
+            The results must be equal to calling `_step_dynamics()` for every instance.
+
+        :param states: current states of all instances, shape [num_envs, state_dim]
+        :param acts: (limited) actions for all instances, shape [num_envs, act_dim]
+        :param domain_param: domain parameters of all instances, every value is an array of shape [num_envs]
+        :param memory: dict of per-instance integration variables (e.g. previous accelerations) which persist between
+                       the steps, and which is cleared when the instances are reset
+        :return: next states of all instances, shape [num_envs, state_dim]
+        """
+        raise NotImplementedError
+
+    def _step_kernel(self, act: np.ndarray):
+        """
+        Implement this to apply the given action to the environment's current state using a compiled kernel from
+        `kernels.py`, which gets the domain parameters from `_kernel_param`. This is optional and used if `use_kernel`
+        is set.
+
+        .. note::
+            The results must be equal to calling `_step_dynamics()` up to the floating-point precision.
+
+        :param act: action
+        """
+        raise NotImplementedError
+
+    def _calc_kernel_param(self) -> Optional[np.ndarray]:
+        """
+        Pack the domain parameters and the derived constants needed by `_step_kernel()` into a float array.
+        Override in subclasses which implement `_step_kernel()`.
+
+        .. note::
+            This function is called from the constructor and from the domain parameter setter.
+
+        :return: packed domain parameters, or `None` if the environment has no kernel
+        """
+        return None
+
     def _calc_constants(self, *args, **kwargs):
         """
         Called to calculate the physics constants that depend on the domain parameters. Override in subclasses.
@@ -159,6 +246,14 @@ class SimPyEnv(SimEnv, Serializable):
             if dp is not None:
                 setattr(self, name, dp)
 
+    def _get_state(self, state_dict: dict):
+        super()._get_state(state_dict)
+        state_dict["use_kernel"] = self._use_kernel
+
+    def _set_state(self, state_dict: dict, copying: bool = False):
+        super()._set_state(state_dict, copying=copying)
+        self._use_kernel = state_dict.get("use_kernel", False)
+
     def reset(self, init_state: np.ndarray = None, domain_param: dict = None) -> np.ndarray:
         # Reset time
         self._curr_step = 0
@@ -220,7 +315,10 @@ class SimPyEnv(SimEnv, Serializable):
         self._curr_act = act  # just for the render function
 
         # Apply the action and simulate the resulting dynamics
-        self._step_dynamics(act)
+        if self._use_kernel:
+            self._step_kernel(act)
+        else:
+            self._step_dynamics(act)
         self._curr_step += 1
 
         # Check if the task or the environment is done
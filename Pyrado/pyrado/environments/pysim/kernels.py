@@ -0,0 +1,308 @@
+# Copyright (c) 2020, Fabio Muratore, Honda Research Institute Europe GmbH, and
+# Technical University of Darmstadt.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. Neither the name of Fabio Muratore, Honda Research Institute Europe GmbH,
+#    or Technical University of Darmstadt, nor the names of its contributors may
+#    be used to endorse or promote products derived from this software without
+#    specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL FABIO MURATORE, HONDA RESEARCH INSTITUTE EUROPE GMBH,
+# OR TECHNICAL UNIVERSITY OF DARMSTADT BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+# IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Compiled dynamics kernels for the pure-Python simulations. Every kernel advances the state of one environment instance
+by one time step in place, given the action, the domain parameters (and derived constants) packed into a float array,
+and the step size. The kernels are compiled with numba if it is installed, otherwise they are executed as plain Python
+functions yielding the same results.
+"""
+import numpy as np
+
+import pyrado
+
+
+try:
+    from numba import njit as _njit
+except ImportError:
+    pyrado.numba_loaded = False
+else:
+    pyrado.numba_loaded = True
+
+
+def njit(fcn):
+    """
+    Compile the given function with numba if it is installed, otherwise return the function unchanged.
+
+    :param fcn: function to compile, must only use the subset of Python and NumPy supported by numba
+    :return: compiled or unchanged function
+    """
+    if pyrado.numba_loaded:
+        return _njit(cache=True)(fcn)
+    return fcn
+
+
+@njit
+def symplectic_euler(state: np.ndarray, acc: np.ndarray, dt: float):
+    """
+    Integrate one time step with the symplectic Euler method, i.e. first the velocities then the positions.
+
+    :param state: positions followed by the velocities, modified in place
+    :param acc: accelerations
+    :param dt: step size [s]
+    """
+    n = acc.shape[0]
+    for i in range(n):
+        state[n + i] += acc[i] * dt  # next velocity
+    for i in range(n):
+        state[i] += state[n + i] * dt  # next position
+
+
+@njit
+def rk4(dyn, state: np.ndarray, act: np.ndarray, param: np.ndarray, dt: float):
+    r"""
+    Integrate one time step with the classical Runge-Kutta method of 4-th order.
+
+    :param dyn: time-invariant dynamics `dyn(x, u, param, x_dot)` writing $\dot{x} = f(x, u)$ into `x_dot`, must be
+                compiled with `njit` if numba is installed
+    :param state: state, modified in place
+    :param act: action, constant during the step
+    :param param: packed domain parameters
+    :param dt: step size [s]
+    """
+    n = state.shape[0]
+    k = np.empty((4, n))  # derivatives
+    s = np.empty(n)  # intermediate states
+    dyn(state, act, param, k[0])
+    for j in range(1, 4):
+        h = dt / 2.0 if j <= 2 else dt
+        for i in range(n):
+            s[i] = state[i] + h * k[j - 1, i]
+        dyn(s, act, param, k[j])
+    for i in range(n):
+        state[i] += dt / 6 * (k[0, i] + 2 * k[1, i] + 2 * k[2, i] + k[3, i])
+
+
+@njit
+def pend_step(state: np.ndarray, act: np.ndarray, param: np.ndarray, dt: float):
+    """
+    Step the `PendulumSim`.
+
+    :param state: angle and angular velocity, modified in place
+    :param act: torque
+    :param param: `[m_pole * g * l_pole / 2, d_pole, m_pole * l_pole**2 / 3]`
+    :param dt: step size [s]
+    """
+    acc = np.empty(1)
+    acc[0] = (act[0] - param[0] * np.sin(state[0]) - param[1] * state[1]) / param[2]
+    symplectic_euler(state, acc, dt)
+
+
+@njit
+def bob_step(state: np.ndarray, act: np.ndarray, param: np.ndarray, dt: float):
+    """
+    Step the `BallOnBeamSim`.
+
+    :param state: ball position, beam angle, and their velocities, modified in place
+    :param act: torque applied to the beam
+    :param param: `[g, m_ball, c_frict, ang_offset, J_beam, zeta_ball]`
+    :param dt: step size [s]
+    """
+    g, m_ball, c_frict, ang_offset, J_beam, zeta_ball = param[0], param[1], param[2], param[3], param[4], param[5]
+    x = state[0]
+    a = state[1] + ang_offset
+    x_dot = state[2]
+    a_dot = state[3]
+    zeta_beam = m_ball * x ** 2 + J_beam
+
+    acc = np.empty(2)
+    acc[0] = (-c_frict * x_dot + m_ball * x * a_dot ** 2 - m_ball * g * np.sin(a)) / zeta_ball
+    acc[1] = (act[0] - 2.0 * m_ball * x * x_dot * a_dot - m_ball * g * np.cos(a) * x) / zeta_beam
+    symplectic_euler(state, acc, dt)
+
+
+@njit
+def qcp_step(
+    state: np.ndarray, act: np.ndarray, param: np.ndarray, dt: float, simple_dynamics: bool, th_ddot: float
+) -> float:
+    """
+    Step the `QCartPoleSim`.
+
+    :param state: cart position, pole angle, and their velocities, modified in place
+    :param act: motor voltage
+    :param param: `[g, l_pole, m_pole, m_cart, eta_m, eta_g, K_g, R_m, k_m, r_mp, B_eq, B_pole, mu_cart, J_pole, J_eq]`
+    :param dt: step size [s]
+    :param simple_dynamics: if `True`, neglect the Coulomb friction between cart and rail
+    :param th_ddot: angular acceleration of the pole from the previous step, used for the friction
+    :return: angular acceleration of the pole
+    """
+    g, l_p, m_p, m_c, eta_m = param[0], param[1], param[2], param[3], param[4]
+    eta_g, K_g, R_m, k_m, r_mp = param[5], param[6], param[7], param[8], param[9]
+    B_eq, B_p, mu_c, J_pole, J_eq = param[10], param[11], param[12], param[13], param[14]
+
+    th, x_dot, th_dot = state[1], state[2], state[3]
+    sin_th = np.sin(th)
+    cos_th = np.cos(th)
+    m_tot = m_c + m_p
+
+    # Actuation force coming from the carts motor torque
+    f_tot = (eta_g * K_g * eta_m * k_m) / (R_m * r_mp) * (eta_m * act[0] - K_g * k_m * x_dot / r_mp)
+
+    if not simple_dynamics:
+        # Coulomb friction
+        f_normal = m_tot * g - m_p * l_p / 2 * (sin_th * th_ddot + cos_th * th_dot ** 2)
+        if f_normal >= 0:
+            f_tot -= mu_c * f_normal * np.sign(f_normal * x_dot)
+
+    # Solve the symmetric linear system of equations M * [x_ddot, th_ddot] = rhs in closed form
+    m00 = m_p + J_eq
+    m01 = m_p * l_p * cos_th
+    m11 = J_pole + m_p * l_p ** 2
+    rhs0 = f_tot - B_eq * x_dot - m_p * l_p * sin_th * th_dot ** 2
+    rhs1 = -B_p * th_dot - m_p * l_p * g * sin_th
+    det = m00 * m11 - m01 * m01
+
+    acc = np.empty(2)
+    acc[0] = (m11 * rhs0 - m01 * rhs1) / det
+    acc[1] = (m00 * rhs1 - m01 * rhs0) / det
+    symplectic_euler(state, acc, dt)
+    return acc[1]
+
+
+@njit
+def _qq_frozen_dyn(x: np.ndarray, acc: np.ndarray, param: np.ndarray, x_dot: np.ndarray):
+    """ Time derivative of the Qube's state with the accelerations held constant during the integration step. """
+    x_dot[0] = x[2]
+    x_dot[1] = x[3]
+    x_dot[2] = acc[0]
+    x_dot[3] = acc[1]
+
+
+@njit
+def qq_step(state: np.ndarray, act: np.ndarray, param: np.ndarray, dt: float):
+    """
+    Step the `QQubeSim`. Like in `QQubeSim._step_dynamics()`, the accelerations are evaluated at the current state
+    only, and the velocities are integrated with the Runge-Kutta method.
+
+    :param state: rotary arm angle, pendulum angle, and their velocities, modified in place
+    :param act: motor voltage
+    :param param: `[c0, c1, c2, c3, c4, km, Rm, Dr, Dp]`, see `QQubeSim._calc_constants()`
+    :param dt: step size [s]
+    """
+    c0, c1, c2, c3, c4 = param[0], param[1], param[2], param[3], param[4]
+    km, Rm, Dr, Dp = param[5], param[6], param[7], param[8]
+
+    al, thd, ald = state[1], state[2], state[3]
+    sin_al = np.sin(al)
+    sin_2al = np.sin(2 * al)
+
+    # Mass matrix M = [[a, b], [b, c]]
+    a = c0 + c1 * sin_al ** 2
+    b = c2 * np.cos(al)
+    c = c3
+    det = a * c - b * b
+
+    # Vector [x, y] = tau - C(q, qd)
+    trq = km * (act[0] - km * thd) / Rm
+    x = trq - Dr * thd - (c1 * sin_2al * thd * ald - c2 * sin_al * ald * ald)
+    y = -Dp * ald - (-0.5 * c1 * sin_2al * thd * thd + c4 * sin_al)
+
+    acc = np.empty(2)
+    acc[0] = (c * x - b * y) / det
+    acc[1] = (a * y - b * x) / det
+    rk4(_qq_frozen_dyn, state, acc, param, dt)
+
+
+@njit
+def qbb_step(
+    state: np.ndarray, plate_angs: np.ndarray, act: np.ndarray, param: np.ndarray, dt: float, simple_dynamics: bool
+):
+    """
+    Step the `QBallBalancerSim`.
+
+    :param state: servo angles, ball positions, and their velocities, modified in place
+    :param plate_angs: plate angles alpha and beta, modified in place
+    :param act: motor voltages, set to zero in place if inside the dead zone
+    :param param: `[g, m_ball, r_ball, c_frict, V_thold_x_neg, V_thold_x_pos, V_thold_y_neg, V_thold_y_pos,
+                  offset_th_x, offset_th_y, A_m, B_eq_v, J_eq, c_kin, J_ball, zeta]`
+    :param dt: step size [s]
+    :param simple_dynamics: if `True`, neglect the dead zone, friction, and Coriolis forces
+    """
+    g, m_ball, r_ball, c_frict = param[0], param[1], param[2], param[3]
+    V_thold_x_neg, V_thold_x_pos, V_thold_y_neg, V_thold_y_pos = param[4], param[5], param[6], param[7]
+    offset_th_x, offset_th_y, A_m, B_eq_v = param[8], param[9], param[10], param[11]
+    J_eq, c_kin, J_ball, zeta = param[12], param[13], param[14], param[15]
+
+    if not simple_dynamics:
+        # Voltage dead zone
+        if V_thold_x_neg <= act[0] <= V_thold_x_pos:
+            act[0] = 0
+        if V_thold_y_neg <= act[1] <= V_thold_y_pos:
+            act[1] = 0
+
+    th_x = state[0] + offset_th_x
+    th_y = state[1] + offset_th_y
+    x, y = state[2], state[3]
+    th_x_dot, th_y_dot = state[4], state[5]
+    x_dot, y_dot = state[6], state[7]
+
+    acc = np.empty(4)
+    acc[0] = (A_m * act[0] - B_eq_v * th_x_dot) / J_eq
+    acc[1] = (A_m * act[1] - B_eq_v * th_y_dot) / J_eq
+
+    # Plate angles and their derivatives
+    a = plate_angs[0]
+    b = plate_angs[1]
+    a_dot = c_kin * th_x_dot * np.cos(th_x) / np.cos(a)
+    b_dot = c_kin * -th_y_dot * np.cos(-th_y) / np.cos(b)
+
+    if simple_dynamics:
+        # Ball dynamic without friction and Coriolis forces
+        acc[2] = c_kin * m_ball * g * r_ball ** 2 * np.sin(th_x) / zeta
+        acc[3] = c_kin * m_ball * g * r_ball ** 2 * np.sin(th_y) / zeta
+    else:
+        a_ddot = (
+            1.0
+            / np.cos(a)
+            * (c_kin * (acc[0] * np.cos(th_x) - th_x_dot ** 2 * np.sin(th_x)) + a_dot ** 2 * np.sin(a))
+        )
+        b_ddot = (
+            1.0
+            / np.cos(b)
+            * (c_kin * (-acc[1] * np.cos(th_y) - (-th_y_dot) ** 2 * np.sin(-th_y)) + b_dot ** 2 * np.sin(b))
+        )
+
+        # Ball dynamic with friction and Coriolis forces
+        acc[2] = (
+            -c_frict * x_dot * r_ball ** 2
+            - J_ball * r_ball * a_ddot
+            + m_ball * x * a_dot ** 2 * r_ball ** 2
+            + c_kin * m_ball * g * r_ball ** 2 * np.sin(th_x)
+        ) / zeta
+        acc[3] = (
+            -c_frict * y_dot * r_ball ** 2
+            - J_ball * r_ball * b_ddot
+            + m_ball * y * (-b_dot) ** 2 * r_ball ** 2
+            + c_kin * m_ball * g * r_ball ** 2 * np.sin(th_y)
+        ) / zeta
+
+    symplectic_euler(state, acc, dt)
+
+    # Forward Euler for the plate angles
+    plate_angs[0] += a_dot * dt
+    plate_angs[1] += b_dot * dt
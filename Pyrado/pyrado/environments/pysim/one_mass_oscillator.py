@@ -54,7 +54,7 @@ class OneMassOscillatorSim(SimPyEnv, Serializable):
     name: str = "omo"
 
     def _create_spaces(self):
-        k = self.domain_param["k"]
+        k = self._domain_param["k"]
 
         # Define the spaces
         max_state = np.array([1.0, 10.0])  # pos [m], vel [m/s]
@@ -87,9 +87,9 @@ class OneMassOscillatorSim(SimPyEnv, Serializable):
         )  # damping constant [Ns/m]
 
     def _calc_constants(self):
-        m = self.domain_param["m"]
-        k = self.domain_param["k"]
-        d = self.domain_param["d"]
+        m = self._domain_param["m"]
+        k = self._domain_param["k"]
+        d = self._domain_param["d"]
 
         self.omega = np.sqrt(k / m)  # eigen frequency [Hz]
         self.zeta = d / (2.0 * np.sqrt(m * k))  # damping ratio [-]
@@ -103,7 +103,7 @@ class OneMassOscillatorSim(SimPyEnv, Serializable):
             self._omega_res = None  # damping too high, no resonance
 
     def _step_dynamics(self, act: np.ndarray):
-        m = self.domain_param["m"]
+        m = self._domain_param["m"]
 
         # Linear Dynamics
         A = np.array([[0, 1], [-self.omega ** 2, -2.0 * self.zeta * self.omega]])
@@ -30,6 +30,7 @@ import numpy as np
 from init_args_serializer.serializable import Serializable
 
 from pyrado.environments.pysim.base import SimPyEnv
+from pyrado.environments.pysim.kernels import pend_step
 from pyrado.spaces.box import BoxSpace
 from pyrado.spaces.singular import SingularStateSpace
 from pyrado.tasks.base import Task
@@ -47,7 +48,7 @@ class PendulumSim(SimPyEnv, Serializable):
         max_state = np.array([4 * np.pi, 4 * np.pi])  # [rad, rad/s]
         max_obs = np.array([1.0, 1.0, np.inf])  # [-, -, rad/s]
         init_state = np.zeros(2)  # [rad, rad/s]
-        tau_max = self.domain_param["tau_max"]
+        tau_max = self._domain_param["tau_max"]
 
         self._state_space = BoxSpace(-max_state, max_state, labels=["theta", "theta_dot"])
         self._obs_space = BoxSpace(-max_obs, max_obs, labels=["sin_theta", "cos_theta", "theta_dot"])
@@ -76,10 +77,10 @@ class PendulumSim(SimPyEnv, Serializable):
         )  # maximum applicable torque [N*m] (under-actuated if < m*l*g/2)
 
     def _step_dynamics(self, act: np.ndarray):
-        g = self.domain_param["g"]
-        m_pole = self.domain_param["m_pole"]
-        l_pole = self.domain_param["l_pole"]
-        d_pole = self.domain_param["d_pole"]
+        g = self._domain_param["g"]
+        m_pole = self._domain_param["m_pole"]
+        l_pole = self._domain_param["l_pole"]
+        d_pole = self._domain_param["d_pole"]
 
         # Dynamics (pendulum modeled as a rod)
         th, th_dot = self.state
@@ -89,6 +90,34 @@ class PendulumSim(SimPyEnv, Serializable):
         self.state[1] += th_ddot * self._dt  # next velocity
         self.state[0] += self.state[1] * self._dt  # next position
 
+    def _step_dynamics_batch(
+        self, states: np.ndarray, acts: np.ndarray, domain_param: dict, memory: dict
+    ) -> np.ndarray:
+        g = domain_param["g"]
+        m_pole = domain_param["m_pole"]
+        l_pole = domain_param["l_pole"]
+        d_pole = domain_param["d_pole"]
+
+        # Dynamics (pendulum modeled as a rod)
+        states = states.copy()
+        th, th_dot = states[:, 0], states[:, 1]
+        th_ddot = (acts[:, 0] - m_pole * g * l_pole / 2.0 * np.sin(th) - d_pole * th_dot) / (m_pole * l_pole ** 2 / 3.0)
+
+        # Integration step (symplectic Euler)
+        states[:, 1] += th_ddot * self._dt  # next velocity
+        states[:, 0] += states[:, 1] * self._dt  # next position
+        return states
+
+    def _calc_kernel_param(self) -> np.ndarray:
+        g = self._domain_param["g"]
+        m_pole = self._domain_param["m_pole"]
+        l_pole = self._domain_param["l_pole"]
+        d_pole = self._domain_param["d_pole"]
+        return np.array([m_pole * g * l_pole / 2.0, d_pole, m_pole * l_pole ** 2 / 3.0], dtype=np.float64)
+
+    def _step_kernel(self, act: np.ndarray):
+        pend_step(self.state, np.atleast_1d(np.asarray(act, dtype=np.float64)), self._kernel_param, self._dt)
+
     def _init_anim(self):
         # Import PandaVis Class
         from pyrado.environments.pysim.pandavis import PendulumVis
@@ -35,6 +35,7 @@ from init_args_serializer.serializable import Serializable
 
 import pyrado
 from pyrado.environments.pysim.base import SimPyEnv
+from pyrado.environments.pysim.kernels import qbb_step
 from pyrado.environments.quanser import max_act_qbb
 from pyrado.spaces.box import BoxSpace
 from pyrado.spaces.polar import Polar2DPosVelSpace
@@ -89,7 +90,7 @@ class QBallBalancerSim(SimPyEnv, Serializable):
             self._kin = QBallBalancerKin(self)
 
     def _create_spaces(self):
-        l_plate = self.domain_param["l_plate"]
+        l_plate = self._domain_param["l_plate"]
 
         # Define the spaces
         max_state = np.array(
@@ -192,18 +193,18 @@ class QBallBalancerSim(SimPyEnv, Serializable):
         )  # angular offset of the y axis motor shaft [rad]
 
     def _calc_constants(self):
-        l_plate = self.domain_param["l_plate"]
-        m_ball = self.domain_param["m_ball"]
-        r_ball = self.domain_param["r_ball"]
-        eta_g = self.domain_param["eta_g"]
-        eta_m = self.domain_param["eta_m"]
-        K_g = self.domain_param["K_g"]
-        J_m = self.domain_param["J_m"]
-        J_l = self.domain_param["J_l"]
-        r_arm = self.domain_param["r_arm"]
-        k_m = self.domain_param["k_m"]
-        R_m = self.domain_param["R_m"]
-        B_eq = self.domain_param["B_eq"]
+        l_plate = self._domain_param["l_plate"]
+        m_ball = self._domain_param["m_ball"]
+        r_ball = self._domain_param["r_ball"]
+        eta_g = self._domain_param["eta_g"]
+        eta_m = self._domain_param["eta_m"]
+        K_g = self._domain_param["K_g"]
+        J_m = self._domain_param["J_m"]
+        J_l = self._domain_param["J_l"]
+        r_arm = self._domain_param["r_arm"]
+        k_m = self._domain_param["k_m"]
+        R_m = self._domain_param["R_m"]
+        B_eq = self._domain_param["B_eq"]
 
         self.J_ball = 2.0 / 5 * m_ball * r_ball ** 2  # inertia of the ball [kg*m**2]
         self.J_eq = eta_g * K_g ** 2 * J_m + J_l  # equivalent moment of inertia [kg*m**2]
@@ -225,8 +226,8 @@ class QBallBalancerSim(SimPyEnv, Serializable):
         if self._simple_dynamics:
             self.plate_angs = np.zeros(2)  # actually not necessary since not used
         else:
-            offset_th_x = self.domain_param["offset_th_x"]
-            offset_th_y = self.domain_param["offset_th_y"]
+            offset_th_x = self._domain_param["offset_th_x"]
+            offset_th_y = self._domain_param["offset_th_y"]
             # Get the plate angles from inverse kinematics for initial pose
             self.plate_angs[0] = self._kin(self.state[0] + offset_th_x)
             self.plate_angs[1] = self._kin(self.state[1] + offset_th_y)
@@ -235,16 +236,16 @@ class QBallBalancerSim(SimPyEnv, Serializable):
         return obs
 
     def _step_dynamics(self, act: np.ndarray):
-        g = self.domain_param["g"]
-        m_ball = self.domain_param["m_ball"]
-        r_ball = self.domain_param["r_ball"]
-        c_frict = self.domain_param["c_frict"]
-        V_thold_x_neg = self.domain_param["V_thold_x_neg"]
-        V_thold_x_pos = self.domain_param["V_thold_x_pos"]
-        V_thold_y_neg = self.domain_param["V_thold_y_neg"]
-        V_thold_y_pos = self.domain_param["V_thold_y_pos"]
-        offset_th_x = self.domain_param["offset_th_x"]
-        offset_th_y = self.domain_param["offset_th_y"]
+        g = self._domain_param["g"]
+        m_ball = self._domain_param["m_ball"]
+        r_ball = self._domain_param["r_ball"]
+        c_frict = self._domain_param["c_frict"]
+        V_thold_x_neg = self._domain_param["V_thold_x_neg"]
+        V_thold_x_pos = self._domain_param["V_thold_x_pos"]
+        V_thold_y_neg = self._domain_param["V_thold_y_neg"]
+        V_thold_y_pos = self._domain_param["V_thold_y_pos"]
+        offset_th_x = self._domain_param["offset_th_x"]
+        offset_th_y = self._domain_param["offset_th_y"]
 
         if not self._simple_dynamics:
             # Apply a voltage dead zone (i.e. below a certain amplitude the system does not move). This is a very
@@ -320,6 +321,22 @@ class QBallBalancerSim(SimPyEnv, Serializable):
         # Integration step (forward Euler)
         self.plate_angs += np.array([a_dot, b_dot]) * self._dt  # just for debugging when simplified dynamics
 
+    def _calc_kernel_param(self) -> np.ndarray:
+        names = ["g", "m_ball", "r_ball", "c_frict", "V_thold_x_neg", "V_thold_x_pos", "V_thold_y_neg", "V_thold_y_pos"]
+        names += ["offset_th_x", "offset_th_y"]
+        consts = [self.A_m, self.B_eq_v, self.J_eq, self.c_kin, self.J_ball, self.zeta]
+        return np.array([self._domain_param[n] for n in names] + consts, dtype=np.float64)
+
+    def _step_kernel(self, act: np.ndarray):
+        qbb_step(
+            self.state,
+            self.plate_angs,
+            np.atleast_1d(np.asarray(act, dtype=np.float64)),
+            self._kernel_param,
+            self._dt,
+            self._simple_dynamics,
+        )
+
     def _init_anim(self):
         # Import PandaVis Class
         from pyrado.environments.pysim.pandavis import QBallBalancerVis
@@ -349,8 +366,8 @@ class QBallBalancerKin(Serializable):
         self.num_opt_iter = num_opt_iter
         self.render_mode = render_mode
 
-        self.r = float(self._qbb.domain_param["r_arm"])
-        self.l = float(self._qbb.domain_param["l_plate"] / 2.0)
+        self.r = float(self._qbb._domain_param["r_arm"])
+        self.l = float(self._qbb._domain_param["l_plate"] / 2.0)
         self.d = 0.10  # [m] roughly measured
 
         # Visualization
@@ -377,8 +394,8 @@ class QBallBalancerKin(Serializable):
 
         # Update the lengths, e.g. if the domain has been randomized
         # Need to use float() since the parameters might be 0d-arrays
-        self.r = float(self._qbb.domain_param["r_arm"])
-        self.l = float(self._qbb.domain_param["l_plate"] / 2.0)
+        self.r = float(self._qbb._domain_param["r_arm"])
+        self.l = float(self._qbb._domain_param["l_plate"] / 2.0)
         self.d = 0.10  # roughly measured
 
         tip = self.rod_tip(th)
@@ -33,6 +33,7 @@ from typing import Optional
 
 import pyrado
 from pyrado.environments.pysim.base import SimPyEnv
+from pyrado.environments.pysim.kernels import qcp_step
 from pyrado.environments.quanser import max_act_qcp
 from pyrado.spaces.box import BoxSpace
 from pyrado.tasks.base import Task
@@ -81,7 +82,7 @@ class QCartPoleSim(SimPyEnv, Serializable):
         self.domain_param = self.get_nominal_domain_param(long=long)
 
     def _create_spaces(self):
-        l_rail = self.domain_param["l_rail"]
+        l_rail = self._domain_param["l_rail"]
         max_obs = np.array([l_rail / 2.0, 1.0, 1.0, np.inf, np.inf])
 
         self._state_space = None
@@ -130,31 +131,31 @@ class QCartPoleSim(SimPyEnv, Serializable):
         )
 
     def _calc_constants(self):
-        l_pole = self.domain_param["l_pole"]
-        m_pole = self.domain_param["m_pole"]
-        m_cart = self.domain_param["m_cart"]
-        eta_g = self.domain_param["eta_g"]
-        K_g = self.domain_param["K_g"]
-        J_m = self.domain_param["J_m"]
-        r_mp = self.domain_param["r_mp"]
+        l_pole = self._domain_param["l_pole"]
+        m_pole = self._domain_param["m_pole"]
+        m_cart = self._domain_param["m_cart"]
+        eta_g = self._domain_param["eta_g"]
+        K_g = self._domain_param["K_g"]
+        J_m = self._domain_param["J_m"]
+        r_mp = self._domain_param["r_mp"]
 
         self.J_pole = l_pole ** 2 * m_pole / 3.0  # pole inertia [kg*m**2]
         self.J_eq = m_cart + (eta_g * K_g ** 2 * J_m) / r_mp ** 2  # equiv. inertia [kg]
 
     def _step_dynamics(self, act: np.ndarray):
-        g = self.domain_param["g"]
-        l_p = self.domain_param["l_pole"]
-        m_p = self.domain_param["m_pole"]
-        m_c = self.domain_param["m_cart"]
-        eta_m = self.domain_param["eta_m"]
-        eta_g = self.domain_param["eta_g"]
-        K_g = self.domain_param["K_g"]
-        R_m = self.domain_param["R_m"]
-        k_m = self.domain_param["k_m"]
-        r_mp = self.domain_param["r_mp"]
-        B_eq = self.domain_param["B_eq"]
-        B_p = self.domain_param["B_pole"]
-        mu_c = self.domain_param["mu_cart"]
+        g = self._domain_param["g"]
+        l_p = self._domain_param["l_pole"]
+        m_p = self._domain_param["m_pole"]
+        m_c = self._domain_param["m_cart"]
+        eta_m = self._domain_param["eta_m"]
+        eta_g = self._domain_param["eta_g"]
+        K_g = self._domain_param["K_g"]
+        R_m = self._domain_param["R_m"]
+        k_m = self._domain_param["k_m"]
+        r_mp = self._domain_param["r_mp"]
+        B_eq = self._domain_param["B_eq"]
+        B_p = self._domain_param["B_pole"]
+        mu_c = self._domain_param["mu_cart"]
 
         x, th, x_dot, th_dot = self.state
         sin_th = np.sin(th)
@@ -197,6 +198,76 @@ class QCartPoleSim(SimPyEnv, Serializable):
         self.state[2:] += np.array([float(x_ddot), float(self._th_ddot)]) * self._dt  # next velocity
         self.state[:2] += self.state[2:] * self._dt  # next position
 
+    def _step_dynamics_batch(
+        self, states: np.ndarray, acts: np.ndarray, domain_param: dict, memory: dict
+    ) -> np.ndarray:
+        g = domain_param["g"]
+        l_p = domain_param["l_pole"]
+        m_p = domain_param["m_pole"]
+        m_c = domain_param["m_cart"]
+        eta_m = domain_param["eta_m"]
+        eta_g = domain_param["eta_g"]
+        K_g = domain_param["K_g"]
+        J_m = domain_param["J_m"]
+        R_m = domain_param["R_m"]
+        k_m = domain_param["k_m"]
+        r_mp = domain_param["r_mp"]
+        B_eq = domain_param["B_eq"]
+        B_p = domain_param["B_pole"]
+        mu_c = domain_param["mu_cart"]
+        J_pole = l_p ** 2 * m_p / 3.0
+        J_eq = m_c + (eta_g * K_g ** 2 * J_m) / r_mp ** 2
+
+        states = states.copy()
+        x, th, x_dot, th_dot = states.T
+        sin_th = np.sin(th)
+        cos_th = np.cos(th)
+        m_tot = m_c + m_p
+
+        # Actuation force coming from the carts motor torque
+        f_tot = (eta_g * K_g * eta_m * k_m) / (R_m * r_mp) * (eta_m * acts[:, 0] - K_g * k_m * x_dot / r_mp)
+
+        if not self._simple_dynamics:
+            # Coulomb friction, depending on the angular acceleration of the previous step (zero after a reset)
+            th_ddot = memory.get("th_ddot", np.zeros(states.shape[0]))
+            f_normal = m_tot * g - m_p * l_p / 2 * (sin_th * th_ddot + cos_th * th_dot ** 2)
+            f_c = np.where(f_normal < 0, 0.0, mu_c * f_normal * np.sign(f_normal * x_dot))
+            f_tot = f_tot - f_c
+
+        # Solve M * x_ddot = rhs for all instances at once
+        M = np.empty((states.shape[0], 2, 2))
+        M[:, 0, 0] = m_p + J_eq
+        M[:, 0, 1] = m_p * l_p * cos_th
+        M[:, 1, 0] = m_p * l_p * cos_th
+        M[:, 1, 1] = J_pole + m_p * l_p ** 2
+        rhs = np.stack(
+            [f_tot - B_eq * x_dot - m_p * l_p * sin_th * th_dot ** 2, -B_p * th_dot - m_p * l_p * g * sin_th], axis=1
+        )
+        acc = np.linalg.solve(M, rhs[..., None])[..., 0]
+        memory["th_ddot"] = acc[:, 1]
+
+        # Integration step (symplectic Euler)
+        states[:, 2:] += acc * self._dt  # next velocity
+        states[:, :2] += states[:, 2:] * self._dt  # next position
+        return states
+
+    def _calc_kernel_param(self) -> np.ndarray:
+        names = ["g", "l_pole", "m_pole", "m_cart", "eta_m", "eta_g", "K_g", "R_m", "k_m", "r_mp", "B_eq", "B_pole"]
+        return np.array(
+            [self._domain_param[n] for n in names] + [self._domain_param["mu_cart"], self.J_pole, self.J_eq],
+            dtype=np.float64,
+        )
+
+    def _step_kernel(self, act: np.ndarray):
+        self._th_ddot = qcp_step(
+            self.state,
+            np.atleast_1d(np.asarray(act, dtype=np.float64)),
+            self._kernel_param,
+            self._dt,
+            self._simple_dynamics,
+            0.0 if self._th_ddot is None else float(self._th_ddot),
+        )
+
     def _init_anim(self):
         # Import PandaVis Class
         from pyrado.environments.pysim.pandavis import QCartPoleVis
@@ -240,7 +311,7 @@ class QCartPoleStabSim(QCartPoleSim, Serializable):
 
     def _create_spaces(self):
         super()._create_spaces()
-        l_rail = self.domain_param["l_rail"]
+        l_rail = self._domain_param["l_rail"]
 
         min_state = np.array(
             [-l_rail / 2.0 + self._x_buffer, np.pi - self.stab_thold, -l_rail, -2 * np.pi]
@@ -308,7 +379,7 @@ class QCartPoleSwingUpSim(QCartPoleSim, Serializable):
         super()._create_spaces()
 
         # Define the spaces
-        l_rail = self.domain_param["l_rail"]
+        l_rail = self._domain_param["l_rail"]
         max_state = np.array(
             [+l_rail / 2.0 - self._x_buffer, +4 * np.pi, 2 * l_rail, 20 * np.pi]
         )  # [m, rad, m/s, rad/s]
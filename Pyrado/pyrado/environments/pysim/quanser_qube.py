@@ -32,6 +32,7 @@ from abc import abstractmethod
 from init_args_serializer.serializable import Serializable
 
 from pyrado.environments.pysim.base import SimPyEnv
+from pyrado.environments.pysim.kernels import qq_step
 from pyrado.environments.pysim.pandavis import QQubeVis
 from pyrado.environments.quanser import max_act_qq
 from pyrado.spaces.box import BoxSpace
@@ -66,11 +67,11 @@ class QQubeSim(SimPyEnv, Serializable):
         )  # pendulum link viscous damping [N*m*s/rad], original: 0.0005, identified: 1e-6
 
     def _calc_constants(self):
-        Mr = self.domain_param["Mr"]
-        Mp = self.domain_param["Mp"]
-        Lr = self.domain_param["Lr"]
-        Lp = self.domain_param["Lp"]
-        g = self.domain_param["g"]
+        Mr = self._domain_param["Mr"]
+        Mp = self._domain_param["Mp"]
+        Lr = self._domain_param["Lr"]
+        Lp = self._domain_param["Lp"]
+        g = self._domain_param["g"]
 
         # Moments of inertia
         Jr = Mr * Lr ** 2 / 12  # inertia about COM of the rotary pole [kg*m^2]
@@ -93,10 +94,10 @@ class QQubeSim(SimPyEnv, Serializable):
         :param u: control command
         :return: time derivative of the state
         """
-        km = self.domain_param["km"]
-        Rm = self.domain_param["Rm"]
-        Dr = self.domain_param["Dr"]
-        Dp = self.domain_param["Dp"]
+        km = self._domain_param["km"]
+        Rm = self._domain_param["Rm"]
+        Dr = self._domain_param["Dr"]
+        Dp = self._domain_param["Dp"]
 
         # Decompose state
         th, al, thd, ald = x
@@ -138,6 +139,55 @@ class QQubeSim(SimPyEnv, Serializable):
             k[j, :] = np.array([s[2], s[3], thdd, aldd])
         self.state += self._dt / 6 * (k[0] + 2 * k[1] + 2 * k[2] + k[3])
 
+    def _step_dynamics_batch(
+        self, states: np.ndarray, acts: np.ndarray, domain_param: dict, memory: dict
+    ) -> np.ndarray:
+        g, Rm, km = domain_param["g"], domain_param["Rm"], domain_param["km"]
+        Mr, Lr, Dr = domain_param["Mr"], domain_param["Lr"], domain_param["Dr"]
+        Mp, Lp, Dp = domain_param["Mp"], domain_param["Lp"], domain_param["Dp"]
+
+        # Constants for equations of motion, see _calc_constants()
+        Jr = Mr * Lr ** 2 / 12
+        Jp = Mp * Lp ** 2 / 12
+        c0 = Jr + Mp * Lr ** 2
+        c1 = 0.25 * Mp * Lp ** 2
+        c2 = 0.5 * Mp * Lp * Lr
+        c3 = Jp + c1
+        c4 = 0.5 * Mp * Lp * g
+
+        # Compute the derivative, see _dyn()
+        th, al, thd, ald = states.T
+        sin_al = np.sin(al)
+        sin_2al = np.sin(2 * al)
+        a = c0 + c1 * sin_al ** 2
+        b = c2 * np.cos(al)
+        c = c3
+        det = a * c - b * b
+        trq = km * (acts[:, 0] - km * thd) / Rm
+        x = trq - Dr * thd - (c1 * sin_2al * thd * ald - c2 * sin_al * ald * ald)
+        y = -Dp * ald - (-0.5 * c1 * sin_2al * thd * thd + c4 * sin_al)
+        thdd = (c * x - b * y) / det
+        aldd = (a * y - b * x) / det
+
+        # Integration step (Runge-Kutta 4), the accelerations are evaluated at the current state like in the
+        # sequential version
+        k = np.empty((4,) + states.shape)
+        k[0] = np.stack([thd, ald, thdd, aldd], axis=1)
+        for j in range(1, 4):
+            if j <= 2:
+                s = states + self._dt / 2.0 * k[j - 1]
+            else:
+                s = states + self._dt * k[j - 1]
+            k[j] = np.stack([s[:, 2], s[:, 3], thdd, aldd], axis=1)
+        return states + self._dt / 6 * (k[0] + 2 * k[1] + 2 * k[2] + k[3])
+
+    def _calc_kernel_param(self) -> np.ndarray:
+        names = ["km", "Rm", "Dr", "Dp"]
+        return np.concatenate([self._c, [self._domain_param[n] for n in names]]).astype(np.float64)
+
+    def _step_kernel(self, act: np.ndarray):
+        qq_step(self.state, np.atleast_1d(np.asarray(act, dtype=np.float64)), self._kernel_param, self._dt)
+
     def _init_anim(self):
         # Import PandaVis Class
         from pyrado.environments.pysim.pandavis import PandaVis
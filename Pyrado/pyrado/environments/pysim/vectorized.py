@@ -0,0 +1,212 @@
+# Copyright (c) 2020, Fabio Muratore, Honda Research Institute Europe GmbH, and
+# Technical University of Darmstadt.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. Neither the name of Fabio Muratore, Honda Research Institute Europe GmbH,
+#    or Technical University of Darmstadt, nor the names of its contributors may
+#    be used to endorse or promote products derived from this software without
+#    specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL FABIO MURATORE, HONDA RESEARCH INSTITUTE EUROPE GMBH,
+# OR TECHNICAL UNIVERSITY OF DARMSTADT BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+# IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import numpy as np
+from copy import deepcopy
+from typing import List, Optional, Sequence, Tuple
+
+import pyrado
+from pyrado.environments.pysim.base import SimPyEnv
+from pyrado.utils.data_types import EnvSpec
+
+
+class VecSimEnv:
+    """
+    Batch of independent instances of the same `SimPyEnv`, which are advanced with one vectorized call of the
+    environment's `_step_dynamics_batch()`. The rewards, the termination, and the observations are still computed by
+    every instance's own task, such that the results are equal to stepping the instances one after another.
+    Environments which do not implement `_step_dynamics_batch()` fall back to stepping the instances sequentially.
+
+    .. note::
+        The instances' `state` attributes are views into the batch's state array. Instances which are done are not
+        stepped anymore until the next call to `reset()`.
+    """
+
+    def __init__(self, env: SimPyEnv, num_envs: int):
+        """
+        Constructor
+
+        :param env: environment to replicate, the instances are deep copies of it
+        :param num_envs: number of environment instances
+        """
+        if not isinstance(env, SimPyEnv):
+            raise pyrado.TypeErr(given=env, expected_type=SimPyEnv)
+        if not isinstance(num_envs, int) or num_envs < 1:
+            raise pyrado.ValueErr(given=num_envs, ge_constraint="1 (int)")
+
+        self._envs = [deepcopy(env) for _ in range(num_envs)]
+        self.max_steps = env.max_steps  # not part of the serialized state
+        self._batch_dynamics = type(env)._step_dynamics_batch is not SimPyEnv._step_dynamics_batch
+        self._states = None
+        self._domain_param = None
+        self._memory = dict()
+        self._done = np.zeros(num_envs, dtype=np.bool_)
+
+    @property
+    def envs(self) -> List[SimPyEnv]:
+        """ Get the environment instances. """
+        return self._envs
+
+    @property
+    def num_envs(self) -> int:
+        """ Get the number of environment instances. """
+        return len(self._envs)
+
+    @property
+    def spec(self) -> EnvSpec:
+        """ Get the environment specification of the first instance. """
+        return self._envs[0].spec
+
+    @property
+    def name(self) -> str:
+        """ Get the name of the environment. """
+        return self._envs[0].name
+
+    @property
+    def dt(self) -> float:
+        """ Get the time step size. """
+        return self._envs[0].dt
+
+    @property
+    def max_steps(self):
+        """ Get the maximum number of time steps. """
+        return self._envs[0].max_steps
+
+    @max_steps.setter
+    def max_steps(self, num_steps):
+        """ Set the maximum number of time steps for all instances. """
+        for env in self._envs:
+            env.max_steps = num_steps
+
+    @property
+    def states(self) -> np.ndarray:
+        """ Get the current states of all instances, shape [num_envs, state_dim]. """
+        return self._states
+
+    @property
+    def done(self) -> np.ndarray:
+        """ Get the flags which instances are done, shape [num_envs]. """
+        return self._done.copy()
+
+    @property
+    def domain_param(self) -> List[dict]:
+        """ Get the domain parameters of all instances. """
+        return [env.domain_param for env in self._envs]
+
+    def reset(
+        self, init_states: Optional[np.ndarray] = None, domain_params: Optional[Sequence[dict]] = None
+    ) -> np.ndarray:
+        """
+        Reset all instances.
+
+        :param init_states: initial states, one per instance, pass `None` to sample them from the init space
+        :param domain_params: domain parameters, one dict per instance, pass `None` to keep the current ones
+        :return: initial observations, shape [num_envs, obs_dim]
+        """
+        if init_states is not None and len(init_states) != self.num_envs:
+            raise pyrado.ShapeErr(msg=f"Expected {self.num_envs} initial states, but received {len(init_states)}!")
+        if domain_params is not None and len(domain_params) != self.num_envs:
+            raise pyrado.ShapeErr(
+                msg=f"Expected {self.num_envs} domain parameter sets, but received {len(domain_params)}!"
+            )
+
+        obs = [
+            env.reset(
+                init_state=None if init_states is None else init_states[i],
+                domain_param=None if domain_params is None else domain_params[i],
+            )
+            for i, env in enumerate(self._envs)
+        ]
+
+        # Gather the states in one array and let the instances operate on views of it
+        self._states = np.stack([env.state for env in self._envs]).astype(np.float64)
+        for i, env in enumerate(self._envs):
+            env.state = self._states[i]
+
+        # The domain parameters only change during a reset, thus collect them here
+        dps = self.domain_param
+        self._domain_param = {name: np.array([dp[name] for dp in dps]) for name in dps[0].keys()}
+        self._memory.clear()
+        self._done[:] = False
+
+        return np.stack(obs)
+
+    def step(self, acts: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, List[dict]]:
+        """
+        Perform one step for every instance which is not done yet.
+
+        :param acts: actions, shape [num_envs, act_dim]
+        :return: observations, rewards, done flags, and environment infos of all instances. For instances that were
+                 already done before this step, the last observation is repeated and the reward is zero.
+        """
+        if self._states is None:
+            raise pyrado.ValueErr(msg="Call reset() before step()!")
+        acts = np.asarray(acts).reshape(self.num_envs, -1)
+        active = np.flatnonzero(~self._done)
+
+        # Current reward depending on the state (before step) and the (unlimited) action, see SimPyEnv.step()
+        rews = np.zeros(self.num_envs)
+        remaining_steps = np.zeros(self.num_envs, dtype=np.int64)
+        acts_lim = np.zeros(acts.shape)
+        for i in active:
+            env = self._envs[i]
+            if env.max_steps is not pyrado.inf:
+                remaining_steps[i] = env.max_steps - (env.curr_step + 1)
+            rews[i] = env.task.step_rew(env.state, acts[i], remaining_steps[i])
+            acts_lim[i] = env.limit_act(acts[i])
+            env._curr_act = acts_lim[i]  # just for the render function
+
+        # Apply the actions and simulate the resulting dynamics
+        if self._batch_dynamics:
+            # All instances are integrated, but only the ones which are not done are updated
+            states_next = self._envs[0]._step_dynamics_batch(self._states, acts_lim, self._domain_param, self._memory)
+            self._states[active] = states_next[active]
+        else:
+            for i in active:
+                self._envs[i]._step_dynamics(acts_lim[i])
+                self._states[i] = self._envs[i].state
+                self._envs[i].state = self._states[i]
+
+        # Check if the task or the environment is done
+        for i in active:
+            env = self._envs[i]
+            env._curr_step += 1
+            done = env.task.is_done(env.state) or env.curr_step >= env.max_steps
+            if done:
+                # Add final reward if done
+                rews[i] += env.task.final_rew(env.state, remaining_steps[i])
+            env._curr_rew = rews[i]
+            self._done[i] = done
+
+        obs = np.stack([env.observe(env.state) for env in self._envs])
+        return obs, rews, self._done.copy(), [dict() for _ in range(self.num_envs)]
+
+    def close(self):
+        """ Close all instances. """
+        for env in self._envs:
+            env.close()
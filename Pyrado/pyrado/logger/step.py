@@ -26,16 +26,21 @@
 # ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
 # POSSIBILITY OF SUCH DAMAGE.
 
+import atexit
 import csv
+import json
 import numpy as np
 import os
 import os.path as osp
+import pickle
+import queue
+import threading
 import torch as to
 from abc import ABC, abstractmethod
 from contextlib import contextmanager
 from tabulate import tabulate
 from torch.utils.tensorboard import SummaryWriter
-from typing import Optional
+from typing import Dict, Optional
 
 import pyrado
 from pyrado.logger import resolve_log_path
@@ -152,6 +157,11 @@ class StepLogger:
         # Increase call counter
         self._counter += 1
 
+    def flush(self):
+        """ Make sure that all printers have written the recorded steps. """
+        for p in self.printers:
+            p.flush()
+
     # Prefix management
     def push_prefix(self, pfx):
         """
@@ -207,6 +217,9 @@ class StepLogPrinter(ABC):
         :param first_step: `True` for the first recorded step
         """
 
+    def flush(self):
+        """ Write the buffered values, by default printers do not buffer. """
+
 
 class ConsolePrinter(StepLogPrinter):
     """ Prints step data to the console """
@@ -220,12 +233,18 @@ class ConsolePrinter(StepLogPrinter):
 class CSVPrinter(StepLogPrinter):
     """ Logs step data to a CSV file """
 
-    def __init__(self, file: str):
+    def __init__(self, file: str, flush_intvl: int = 1):
         """
         Constructor
 
         :param file: csv file name
+        :param flush_intvl: number of steps after which the file is flushed, by default the disk is updated every step
         """
+        if not isinstance(flush_intvl, int):
+            raise pyrado.TypeErr(given=flush_intvl, expected_type=int)
+        if flush_intvl < 1:
+            raise pyrado.ValueErr(given=flush_intvl, ge_constraint="1")
+
         file = resolve_log_path(file)
 
         # Make sure the directory exists
@@ -233,6 +252,8 @@ class CSVPrinter(StepLogPrinter):
 
         # Open file descriptor
         self.file = file
+        self.flush_intvl = flush_intvl
+        self._num_unflushed = 0
 
         self._fd = open(file, "w")
         self._writer = csv.writer(self._fd)
@@ -246,12 +267,19 @@ class CSVPrinter(StepLogPrinter):
         self._writer.writerow([values[k] for k in ordered_keys])
 
         # Make sure we update the disk
+        self._num_unflushed += 1
+        if self._num_unflushed >= self.flush_intvl:
+            self.flush()
+
+    def flush(self):
         self._fd.flush()
+        self._num_unflushed = 0
 
     # Only serialize the machine-independent part of the file name
     def __getstate__(self):
+        self.flush()
         _, common_part = split_path_custom_common(self.file)
-        return {"file_common": common_part}
+        return {"file_common": common_part, "flush_intvl": self.flush_intvl}
 
     # And reopen the file for append on reload
     def __setstate__(self, state):
@@ -268,6 +296,8 @@ class CSVPrinter(StepLogPrinter):
                 if not osp.isfile(self.file):
                     raise pyrado.PathErr(given=self.file)
 
+        self.flush_intvl = state.get("flush_intvl", 1)
+        self._num_unflushed = 0
         self._fd = open(self.file, "a")
         self._writer = csv.writer(self._fd)
 
@@ -275,35 +305,59 @@ class CSVPrinter(StepLogPrinter):
 class TensorBoardPrinter(StepLogPrinter):
     """ Class for writing tensorboard logs """
 
-    def __init__(self, dir):
+    def __init__(self, dir, flush_intvl: int = 1):
         """
         Constructor
 
         :param dir: folder path name
+        :param flush_intvl: number of steps after which the writer is flushed, by default the disk is updated every step
         """
+        if not isinstance(flush_intvl, int):
+            raise pyrado.TypeErr(given=flush_intvl, expected_type=int)
+        if flush_intvl < 1:
+            raise pyrado.ValueErr(given=flush_intvl, ge_constraint="1")
+
         self.dir = dir
         self.step = 0
+        self.flush_intvl = flush_intvl
+        self._num_unflushed = 0
+        self._tags = {}
 
         self.writer = SummaryWriter(log_dir=dir)
 
+    def _get_tags(self, key: str, num: int, sep: str) -> list:
+        """ Get the tags for the elements of a vector-valued entry, they are only built once per key. """
+        tags = self._tags.get(key)
+        if tags is None or len(tags) != num:
+            tags = self._tags[key] = [key + sep + str(i) for i in range(num)]
+        return tags
+
     def print_values(self, values: dict, ordered_keys: list, first_step: bool):
         for k in ordered_keys:
             value = values[k]
             if isinstance(value, list):
-                for i, scalar in enumerate(value):
-                    self.writer.add_scalar(k + str(i), scalar, self.step)
+                for tag, scalar in zip(self._get_tags(k, len(value), ""), value):
+                    self.writer.add_scalar(tag, scalar, self.step)
             elif isinstance(value, np.ndarray):
-                for i, scalar in enumerate(value.flat):
-                    self.writer.add_scalar(k + "/" + str(i), scalar, self.step)
+                for tag, scalar in zip(self._get_tags(k, value.size, "/"), value.flat):
+                    self.writer.add_scalar(tag, scalar, self.step)
             else:
                 self.writer.add_scalar(k, values[k], self.step)
         self.step += 1
+
+        self._num_unflushed += 1
+        if self._num_unflushed >= self.flush_intvl:
+            self.flush()
+
+    def flush(self):
         self.writer.flush()
+        self._num_unflushed = 0
 
     # Only serialize machine-independent part of the directory, as well as the step
     def __getstate__(self):
+        self.flush()
         _, common_part = split_path_custom_common(self.dir)
-        return {"dir_common": common_part, "step": self.step}
+        return {"dir_common": common_part, "step": self.step, "flush_intvl": self.flush_intvl}
 
     # And reopen the writer on reload
     def __setstate__(self, state):
@@ -321,9 +375,261 @@ class TensorBoardPrinter(StepLogPrinter):
                     raise pyrado.PathErr(given=self.dir)
 
         self.step = state["step"]
+        self.flush_intvl = state.get("flush_intvl", 1)
+        self._num_unflushed = 0
+        self._tags = {}
         self.writer = SummaryWriter(log_dir=self.dir)
 
 
+class BinaryColumnPrinter(StepLogPrinter):
+    """
+    Logs step data to a directory with one binary file per key, to which the values are appended as raw `float64`
+    columns. A column is loaded by reading a single file with `read_binary_log()`, instead of parsing a csv file.
+    Values which can not be converted to numbers, e.g. '', are stored as NaN. Keys whose values are not numeric in the
+    first step are not logged. The files are only opened while the buffered steps are written.
+    """
+
+    meta_file = "columns.json"
+
+    def __init__(self, dir: str, flush_intvl: int = 100):
+        """
+        Constructor
+
+        :param dir: folder path name, the existing log in this folder is overwritten
+        :param flush_intvl: number of steps which are buffered in memory before they are written to the disk
+        """
+        if not isinstance(flush_intvl, int):
+            raise pyrado.TypeErr(given=flush_intvl, expected_type=int)
+        if flush_intvl < 1:
+            raise pyrado.ValueErr(given=flush_intvl, ge_constraint="1")
+
+        self.dir = resolve_log_path(dir)
+        self.flush_intvl = flush_intvl
+
+        # Make sure the directory exists
+        os.makedirs(self.dir, exist_ok=True)
+
+        # The columns are fixed in the first step
+        self._columns = None
+        self._buffer = []
+
+    def _setup_columns(self, values: dict, ordered_keys: list):
+        """ Select the numeric columns and their widths from the first step, and store them in the meta file. """
+        self._columns = {}
+        for key in ordered_keys:
+            try:
+                width = np.asarray(values[key], dtype=np.float64).size
+            except (TypeError, ValueError):
+                continue
+            self._columns[key] = dict(file=f"col{len(self._columns)}.bin", width=width)
+
+        with open(osp.join(self.dir, BinaryColumnPrinter.meta_file), "w") as f:
+            json.dump(self._columns, f)
+
+        # Overwrite the existing columns
+        for col in self._columns.values():
+            open(osp.join(self.dir, col["file"]), "wb").close()
+
+    @staticmethod
+    def _to_row(value, width: int) -> np.ndarray:
+        """ Convert a value to a row of the column, invalid values are replaced by NaN. """
+        try:
+            row = np.asarray(value, dtype=np.float64).reshape(-1)
+        except (TypeError, ValueError):
+            row = None
+        if row is None or row.size != width:
+            row = np.full(width, np.nan)
+        return row
+
+    def print_values(self, values: dict, ordered_keys: list, first_step: bool):
+        if first_step or self._columns is None:
+            self._setup_columns(values, ordered_keys)
+
+        self._buffer.append([self._to_row(values[k], col["width"]) for k, col in self._columns.items()])
+        if len(self._buffer) >= self.flush_intvl:
+            self.flush()
+
+    def flush(self):
+        if self._buffer:
+            for rows, col in zip(zip(*self._buffer), self._columns.values()):
+                with open(osp.join(self.dir, col["file"]), "ab") as f:
+                    np.concatenate(rows).tofile(f)
+            self._buffer = []
+
+    # Only serialize the machine-independent part of the directory
+    def __getstate__(self):
+        self.flush()
+        _, common_part = split_path_custom_common(self.dir)
+        return {"dir_common": common_part, "flush_intvl": self.flush_intvl, "columns": self._columns}
+
+    # And continue appending to the files on reload
+    def __setstate__(self, state):
+        common_part = state["dir_common"]
+
+        # First, try if it has been split at pyrado.EXP_DIR
+        self.dir = osp.join(pyrado.EXP_DIR, common_part)
+        if not osp.isdir(self.dir):
+            # If that did not work, try if it has been split at pyrado.TEMP_DIR
+            self.dir = osp.join(pyrado.TEMP_DIR, common_part)
+            if not osp.isdir(self.dir):
+                # If that did not work, try if it has been split at the pytest's temporary path
+                self.dir = osp.join("/tmp", common_part)
+                if not osp.isdir(self.dir):
+                    raise pyrado.PathErr(given=self.dir)
+
+        self.flush_intvl = state["flush_intvl"]
+        self._columns = state["columns"]
+        self._buffer = []
+
+
+def read_binary_log(dir: str, first_step: int = 0) -> Dict[str, np.ndarray]:
+    """
+    Load a log written by `BinaryColumnPrinter`. Steps which have only been written partially, e.g. because the log is
+    read while it is written, are discarded.
+
+    :param dir: folder path name of the log
+    :param first_step: index of the first step to load, e.g. the number of steps which have been loaded before
+    :return: dict mapping every key to an array of shape [num_steps] for scalars, or [num_steps, width] for vectors
+    """
+    meta_file = osp.join(dir, BinaryColumnPrinter.meta_file)
+    if not osp.isfile(meta_file):
+        raise pyrado.PathErr(given=meta_file)
+    with open(meta_file) as f:
+        columns = json.load(f)
+
+    # All columns are cut to the number of steps which is complete in every file
+    itemsize = np.dtype(np.float64).itemsize
+    num_steps = min(
+        (os.path.getsize(osp.join(dir, col["file"])) // (itemsize * col["width"]) for col in columns.values()),
+        default=0,
+    )
+
+    num_steps = max(num_steps - first_step, 0)
+
+    data = {}
+    for key, col in columns.items():
+        values = np.fromfile(
+            osp.join(dir, col["file"]),
+            dtype=np.float64,
+            count=num_steps * col["width"],
+            offset=first_step * col["width"] * itemsize,
+        )
+        data[key] = values if col["width"] == 1 else values.reshape(num_steps, col["width"])
+    return data
+
+
+class AsyncPrinter(StepLogPrinter):
+    """
+    Wraps a printer, and passes the values on to it from a background thread. The thread processes all steps which
+    are waiting in the queue at once, and flushes the wrapped printer once per batch. Since the queue is bounded, a
+    printer which can not keep up slows down the caller instead of piling up the values in memory.
+    """
+
+    def __init__(self, printer: StepLogPrinter, max_queue_size: int = 1000):
+        """
+        Constructor
+
+        :param printer: printer to wrap
+        :param max_queue_size: maximum number of steps waiting to be printed before `print_values()` blocks
+        """
+        if not isinstance(printer, StepLogPrinter):
+            raise pyrado.TypeErr(given=printer, expected_type=StepLogPrinter)
+        if not isinstance(max_queue_size, int):
+            raise pyrado.TypeErr(given=max_queue_size, expected_type=int)
+        if max_queue_size < 1:
+            raise pyrado.ValueErr(given=max_queue_size, ge_constraint="1")
+
+        self.printer = printer
+        self.max_queue_size = max_queue_size
+        self._start()
+
+    def _start(self):
+        """ Start the background thread, and make sure it is finished when the interpreter exits. """
+        self._pid = os.getpid()
+        self._queue = queue.Queue(maxsize=self.max_queue_size)
+        self._lock = threading.Lock()  # held by the background thread while it prints a batch
+        self._error = None
+        self._thread = threading.Thread(target=self._work, name=f"Async{type(self.printer).__name__}", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _ensure_started(self):
+        """
+        Restart the background thread in a forked process. A forked child inherits the queue and the lock in whatever
+        state they were, but not the thread, so it would block forever on them. The steps still waiting in the
+        queue are printed by the parent process.
+        """
+        if self._pid != os.getpid():
+            atexit.unregister(self.close)
+            self._start()
+
+    def _work(self):
+        """ Print the queued steps in batches until the stop signal (`None`) is received. """
+        stop = False
+        while not stop:
+            batch = [self._queue.get()]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                with self._lock:
+                    if self._error is None:
+                        for item in batch:
+                            if item is None:
+                                continue
+                            self.printer.print_values(*item)
+                        self.printer.flush()
+            except Exception as e:
+                # Keep the error to raise it in the caller's thread
+                self._error = e
+            finally:
+                stop = batch[-1] is None
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _check_error(self):
+        """ Raise an error in the caller's thread if the wrapped printer failed. """
+        if self._error is not None:
+            raise RuntimeError(f"The {type(self.printer).__name__} failed in the background!") from self._error
+
+    def print_values(self, values: dict, ordered_keys: list, first_step: bool):
+        self._ensure_started()
+        self._check_error()
+        # Copy the lists since the caller may change them before they are printed
+        values = {k: list(v) if isinstance(v, list) else v for k, v in values.items()}
+        self._queue.put((values, list(ordered_keys), first_step))
+
+    def flush(self):
+        """ Wait until all queued steps are printed and flushed. """
+        self._ensure_started()
+        self._queue.join()
+        self._check_error()
+
+    def close(self):
+        """ Print the remaining steps and stop the background thread. """
+        self._ensure_started()
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        atexit.unregister(self.close)
+        self._check_error()
+
+    # Only serialize the wrapped printer, and restart the thread on reload. The steps which are still queued are not
+    # waited for, they are printed by this instance. Holding the lock keeps the printer from changing while pickling.
+    def __getstate__(self):
+        self._ensure_started()
+        with self._lock:
+            return {"printer": pickle.dumps(self.printer), "max_queue_size": self.max_queue_size}
+
+    def __setstate__(self, state):
+        self.printer = pickle.loads(state["printer"])
+        self.max_queue_size = state["max_queue_size"]
+        self._start()
+
+
 class LoggerAware:
     """
     Base for objects holding a StepLogger.
@@ -356,7 +662,10 @@ class LoggerAware:
         super().__setattr__(key, value)
 
     def _create_default_logger(self) -> StepLogger:
-        """ Create a step-based logger which safes to a csv-file and prints to the console. """
+        """
+        Create a step-based logger which safes to a csv-file and to tensorboard, and which prints to the console.
+        If `pyrado.log_progress_bin` is set, the progress is also saved to a binary columnar log.
+        """
         logger = StepLogger()
         logger.printers.append(ConsolePrinter())
 
@@ -365,6 +674,8 @@ class LoggerAware:
             logfile = osp.join(self._save_dir, logfile)
         logger.printers.append(CSVPrinter(logfile))
         logger.printers.append(TensorBoardPrinter(osp.join(self._save_dir, "tb")))
+        if pyrado.log_progress_bin:
+            logger.printers.append(BinaryColumnPrinter(osp.join(self._save_dir, "progress_bin"), flush_intvl=1))
         return logger
 
     def register_as_logger_parent(self, child):
@@ -26,9 +26,13 @@
 # ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
 # POSSIBILITY OF SUCH DAMAGE.
 
+import hashlib
 import numpy as np
+import os
+import os.path as osp
 import seaborn as sns
 import torch as to
+from collections import OrderedDict
 from matplotlib import pyplot as plt, patches
 from sbi.inference.posteriors.direct_posterior import DirectPosterior
 from sbi.utils import BoxUniform
@@ -112,6 +116,132 @@ def draw_distr_evolution(
     return plt.gcf()
 
 
+class PosteriorGridEvaluator:
+    """
+    Evaluate the log-probability of posteriors on grids of domain parameter values. The grid points are passed to the
+    posterior in chunks of bounded size, and every evaluation is kept in memory as well as optionally on disk. Thereby,
+    a grid conditioned on the same data is only evaluated once, no matter how many plots use it.
+    """
+
+    def __init__(self, chunk_size: int = 10000, cache_dir: Optional[str] = None, max_cached: int = 128):
+        """
+        Constructor
+
+        :param chunk_size: maximum number of grid points which are passed to the posterior's `log_prob()` at once
+        :param cache_dir: directory to store the evaluated grids in, pass `None` to only keep them in memory. The files
+                          are named by the hash of the posterior's parameters, the grid, and the conditioning data.
+        :param max_cached: maximum number of evaluated grids kept in memory, the least recently used ones are dropped
+        """
+        if not isinstance(chunk_size, int):
+            raise pyrado.TypeErr(given=chunk_size, expected_type=int)
+        if chunk_size < 1:
+            raise pyrado.ValueErr(given=chunk_size, ge_constraint="1")
+        if max_cached < 1:
+            raise pyrado.ValueErr(given=max_cached, ge_constraint="1")
+
+        self.chunk_size = chunk_size
+        self.cache_dir = cache_dir
+        self.max_cached = max_cached
+        self._cache = OrderedDict()
+
+    @staticmethod
+    def _posterior_digest(posterior) -> Optional[str]:
+        """ Hash the posterior's parameters, returns `None` if the posterior is not backed by a PyTorch module. """
+        module = posterior.net if isinstance(posterior, DirectPosterior) else posterior
+        if not isinstance(module, to.nn.Module):
+            return None
+        h = hashlib.sha1(type(posterior).__name__.encode())
+        for name, value in module.state_dict().items():
+            h.update(name.encode())
+            h.update(value.detach().cpu().numpy().tobytes())
+        return h.hexdigest()
+
+    def _key(self, posterior, grid: to.Tensor, obs: Optional[to.Tensor], normalize_posterior: bool) -> Tuple[str, bool]:
+        """ Get the key of an evaluation, and whether it can be stored on disk. """
+        digest = self._posterior_digest(posterior)
+        persistent = digest is not None
+        if not persistent:
+            # The parameters of the posterior are unknown, thus only the object itself can be used to identify it
+            digest = f"obj{id(posterior)}"
+        h = hashlib.sha1(digest.encode())
+        h.update(str(bool(normalize_posterior)).encode())
+        for t in (grid, obs):
+            if t is None:
+                h.update(b"none")
+                continue
+            t = to.as_tensor(t).detach().cpu().contiguous()
+            h.update(f"{tuple(t.shape)}{t.dtype}".encode())
+            h.update(t.numpy().tobytes())
+        return h.hexdigest(), persistent
+
+    def log_prob(
+        self,
+        posterior: Union[DirectPosterior, MDNPolicy],
+        grid: to.Tensor,
+        obs: Optional[to.Tensor],
+        normalize_posterior: bool = False,
+    ) -> to.Tensor:
+        """
+        Evaluate the log-probability of the posterior for every point of the grid, or look it up if it has been
+        evaluated before.
+
+        :param posterior: sbi `DirectPosterior` object or `MDNPolicy` to evaluate
+        :param grid: domain parameter values to evaluate of shape [num_points, dim_domain_param]
+        :param obs: data which the posterior is conditioned on
+        :param normalize_posterior: if `True` the normalization of the posterior density is enforced by sbi
+        :return: log-probabilities of shape [num_points]
+        """
+        key, persistent = self._key(posterior, grid, obs, normalize_posterior)
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+
+        cache_file = osp.join(self.cache_dir, f"{key}.pt") if self.cache_dir is not None and persistent else None
+        if cache_file is not None and osp.isfile(cache_file):
+            log_prob = to.load(cache_file)
+        else:
+            log_prob = to.cat(
+                [
+                    posterior.log_prob(grid[i : i + self.chunk_size], obs, norm_posterior=normalize_posterior)
+                    .detach()
+                    .cpu()
+                    .view(-1)
+                    for i in range(0, grid.shape[0], self.chunk_size)
+                ]
+            )
+            if cache_file is not None:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                to.save(log_prob, cache_file)
+
+        self._cache[key] = log_prob
+        if len(self._cache) > self.max_cached:
+            self._cache.popitem(last=False)
+        return log_prob
+
+    def log_prob_sum(
+        self,
+        posterior: Union[DirectPosterior, MDNPolicy],
+        grids: to.Tensor,
+        data_real: to.Tensor,
+        normalize_posterior: bool = False,
+    ) -> to.Tensor:
+        """
+        Evaluate the joint log-probability of the posterior across all iterations, i.e. the sum of the log-probabilities
+        for every iteration's grid conditioned on that iteration's data.
+
+        :param posterior: sbi `DirectPosterior` object or `MDNPolicy` to evaluate
+        :param grids: domain parameter values to evaluate of shape [num_iter, num_points, dim_domain_param]
+        :param data_real: data from the real-world rollouts of shape [num_iter, dim_data]
+        :param normalize_posterior: if `True` the normalization of the posterior density is enforced by sbi
+        :return: summed log-probabilities of shape [num_points]
+        """
+        return sum([self.log_prob(posterior, grid, obs, normalize_posterior) for grid, obs in zip(grids, data_real)])
+
+    def clear(self):
+        """ Drop all evaluations kept in memory. The files on disk are not touched. """
+        self._cache.clear()
+
+
 @to.no_grad()
 def draw_posterior_distr_1d(
     ax: plt.Axes,
@@ -132,6 +262,7 @@ def draw_posterior_distr_1d(
     y_label: Optional[str] = "",
     transposed: Optional[bool] = False,
     plot_kwargs: Optional[dict] = None,
+    grid_evaluator: Optional[PosteriorGridEvaluator] = None,
 ) -> plt.Figure:
     r"""
     Evaluate an posterior obtained from the sbi package on a 2-dim grid of domain parameter values.
@@ -164,6 +295,8 @@ def draw_posterior_distr_1d(
     :param y_label: label for the y-axis, use domain parameter name by default
     :param transposed: if `True`, plot the x and y axes
     :param plot_kwargs: keyword arguments forwarded to pyplot's `plot()` function for the posterior distribution
+    :param grid_evaluator: evaluator used to compute (or to look up) the posterior probabilities on the grid, by default
+                           a new one is created which does not cache on disk
     :return: handle to the resulting figure
     """
     if not data_real.ndim == 2:
@@ -227,11 +360,13 @@ def draw_posterior_distr_1d(
 
     if prob is None:
         # Compute the posterior probabilities
+        if grid_evaluator is None:
+            grid_evaluator = PosteriorGridEvaluator()
         if rescale_posterior:
-            log_prob = sum([posterior.log_prob(grid, obs, False) for grid, obs in zip(grids, data_real)])
+            log_prob = grid_evaluator.log_prob_sum(posterior, grids, data_real, False)
             prob = to.exp(log_prob - log_prob.max())  # scale the probabilities to [0, 1]
         else:
-            log_prob = sum([posterior.log_prob(grid, obs, normalize_posterior) for grid, obs in zip(grids, data_real)])
+            log_prob = grid_evaluator.log_prob_sum(posterior, grids, data_real, normalize_posterior)
             prob = to.exp(log_prob)
     else:
         # Use precomputed posterior probabilities
@@ -293,6 +428,7 @@ def draw_posterior_distr_2d(
     contourf_kwargs: Optional[dict] = None,
     scatter_kwargs: Optional[dict] = None,
     colorbar_kwargs: Optional[dict] = None,
+    grid_evaluator: Optional[PosteriorGridEvaluator] = None,
 ) -> Union[plt.Figure, Optional[Union[Any, plt.Figure]], to.Tensor]:
     r"""
     Evaluate an posterior obtained from the sbi package on a 2-dim grid of domain parameter values.
@@ -331,6 +467,8 @@ def draw_posterior_distr_2d(
     :param scatter_kwargs: keyword arguments forwarded to pyplot's `scatter()` function for the true parameter
     :param colorbar_kwargs: keyword arguments forwarded to `draw_sep_cbar()` function, possible kwargs: `ax_cb`,
                             `colorbar_label`, `colorbar_orientation`, `fig_size`, `cmap`, `norm`, num_major_ticks_cb`
+    :param grid_evaluator: evaluator used to compute (or to look up) the posterior probabilities on the grid, by default
+                           a new one is created which does not cache on disk
     :return: handle to the resulting figure, optionally the handle to a color bar, and the tensor of the marginal
              probabilities obtained averaging over the rows and columns of the the 2-dim evaluation grid
     """
@@ -407,33 +545,40 @@ def draw_posterior_distr_2d(
         raise pyrado.ValueErr(msg="Neither an explicit grid nor a prior has been provided!")
     x = to.linspace(grid_bounds[0, 0].item(), grid_bounds[0, 1].item(), grid_res)  # 1 2 3
     y = to.linspace(grid_bounds[1, 0].item(), grid_bounds[1, 1].item(), grid_res)  # 4 5 6
-    x = x.repeat(grid_res)  # 1 2 3 1 2 3 1 2 3
-    y = to.repeat_interleave(y, grid_res)  # 4 4 4 5 5 5 6 6 6
-    grid_x, grid_y = x.view(grid_res, grid_res), y.view(grid_res, grid_res)
+    grid_x = x.repeat(grid_res).view(grid_res, grid_res)  # 1 2 3 1 2 3 1 2 3
+    grid_y = to.repeat_interleave(y, grid_res).view(grid_res, grid_res)  # 4 4 4 5 5 5 6 6 6
+    # Order the points by the lower dimension first, such that the evaluation for the dimensions (dim_x, dim_y) is the
+    # same as the one for (dim_y, dim_x), and only has to be transposed
+    swap_dims = dim_x > dim_y
+    points_x = grid_x.T.reshape(-1) if swap_dims else grid_x.reshape(-1)
+    points_y = grid_y.T.reshape(-1) if swap_dims else grid_y.reshape(-1)
     if condition is None:
         # No condition is necessary since dim(posterior) = dim(grid) = 2
-        grids = to.stack([x, y], dim=1).repeat(num_iter, 1, 1)
+        grids = to.empty(num_iter, grid_res ** 2, 2, dtype=x.dtype)
     else:
         # A condition is necessary since dim(posterior) > dim(grid) = 2
         grids = condition.repeat(1, grid_res ** 2, 1)
-        grids[:, :, dim_x] = x
-        grids[:, :, dim_y] = y
+    grids[:, :, dim_x] = points_x
+    grids[:, :, dim_y] = points_y
     if grids.shape != (num_iter, grid_res ** 2, len(dp_mapping)):
         raise pyrado.ShapeErr(given=grids, expected_match=(grid_res ** 2, len(dp_mapping)))
 
+    if grid_evaluator is None:
+        grid_evaluator = PosteriorGridEvaluator()
+
     fig = plt.gcf()
     if plot_type == "joint":
         # Compute the posterior probabilities
         with completion_context("Evaluating domain param grid", color="w"):
             if rescale_posterior:
-                log_prob = sum([posterior.log_prob(grid, obs, False) for grid, obs in zip(grids, data_real)])
+                log_prob = grid_evaluator.log_prob_sum(posterior, grids, data_real, False)
                 prob = to.exp(log_prob - log_prob.max())  # scale the probabilities to [0, 1]
             else:
-                log_prob = sum(
-                    [posterior.log_prob(grid, obs, normalize_posterior) for grid, obs in zip(grids, data_real)]
-                )
+                log_prob = grid_evaluator.log_prob_sum(posterior, grids, data_real, normalize_posterior)
                 prob = to.exp(log_prob)
         prob = prob.reshape(grid_res, grid_res)
+        if swap_dims:
+            prob = prob.T
 
         # Plot the posterior
         axs.contourf(
@@ -468,12 +613,14 @@ def draw_posterior_distr_2d(
                 p = posterior if plot_type == "separate" else posterior[idx]
                 with completion_context("Evaluating domain param grid", color="w"):
                     if rescale_posterior:
-                        log_prob = p.log_prob(grids[idx], data_real[idx], False)
+                        log_prob = grid_evaluator.log_prob(p, grids[idx], data_real[idx], False)
                         prob = to.exp(log_prob - log_prob.max())  # scale the probabilities to [0, 1]
                     else:
-                        log_prob = p.log_prob(grids[idx], data_real[idx], normalize_posterior)
+                        log_prob = grid_evaluator.log_prob(p, grids[idx], data_real[idx], normalize_posterior)
                         prob = to.exp(log_prob)
                 prob = prob.reshape(grid_res, grid_res)
+                if swap_dims:
+                    prob = prob.T
 
                 # Plot the posterior
                 axs[i, j].contourf(
@@ -553,6 +700,7 @@ def draw_posterior_distr_pairwise(
     x_labels: Optional[np.ndarray] = "",
     y_labels: Optional[np.ndarray] = "",
     prob_labels: Optional[np.ndarray] = "",
+    grid_evaluator: Optional[PosteriorGridEvaluator] = None,
 ) -> plt.Figure:
     """
     Plot a 2-dim gird of pairwise slices of the posterior distribution evaluated on a grid across these two dimensions,
@@ -583,6 +731,9 @@ def draw_posterior_distr_pairwise(
     :param y_labels: 2-dim numpy array of labels for the y-axes, pass `""` to use domain parameter name by default,
                      or pass `None` to use no labels
     :param prob_labels: 1-dim numpy array of labels for the probability axis in the marginal plots
+    :param grid_evaluator: evaluator used to compute (or to look up) the posterior probabilities on the grids, by
+                           default a new one is created which does not cache on disk. It is shared by all panels, thus
+                           every pair of dimensions is only evaluated once.
     :return: figure containing the pair plot
     """
     # Check the inputs
@@ -657,6 +808,8 @@ def draw_posterior_distr_pairwise(
 
     # Initialize a container for the probabilities of each 2-dim grid evaluation
     marginal_probs = to.zeros((len(dp_mapping), grid_res))
+    if grid_evaluator is None:
+        grid_evaluator = PosteriorGridEvaluator()
 
     # Plot the pairwise posteriors
     for i, j in idcs_pair:
@@ -683,6 +836,7 @@ def draw_posterior_distr_pairwise(
             y_label=y_labels[dim_x, dim_y] if y_labels is not None else None,
             title=None,
             add_sep_colorbar=False,
+            grid_evaluator=grid_evaluator,
         )
 
         # Extract the marginals (1st dim is always the x-axis in the 2-dim plots)
@@ -730,6 +884,7 @@ def draw_posterior_distr_pairwise(
             x_label=x_label,
             y_label=y_label,
             transposed=rotate,
+            grid_evaluator=grid_evaluator,
         )
 
     if marginal_layout == "outside":
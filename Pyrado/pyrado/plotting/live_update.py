@@ -26,9 +26,58 @@
 # ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
 # POSSIBILITY OF SUCH DAMAGE.
 
+import inspect
 import os.path as osp
+import pandas as pd
+from abc import ABC, abstractmethod
 from matplotlib import pyplot as plt
-from typing import Callable, Any
+from typing import Callable, Any, Optional, Tuple, Union
+
+
+class IncrementalLoader(ABC):
+    """
+    Base class for loaders which only read the part of a file that has been appended since the previous call, and keep
+    all data loaded so far in memory. Thereby, the cost of a refresh does not grow with the size of the file.
+    """
+
+    def __init__(self):
+        """ Constructor """
+        self._data = None
+        self.reset()
+
+    def reset(self):
+        """ Forget the data loaded so far, the next call to `load()` reads the file from the beginning. """
+        self._data = None
+
+    @property
+    def data(self) -> Optional[pd.DataFrame]:
+        """ Get all data loaded so far, or `None` if nothing has been loaded yet. """
+        return self._data
+
+    @abstractmethod
+    def _load_delta(self, path: str) -> Optional[pd.DataFrame]:
+        """
+        Read the rows which have been appended since the previous call. Implementations call `reset()` if they detect
+        that the file has been rewritten.
+
+        :param path: path to the file or folder to load from
+        :return: new rows, or `None` if there are none
+        """
+        raise NotImplementedError
+
+    def load(self, path: str) -> Tuple[Optional[pd.DataFrame], Optional[pd.DataFrame]]:
+        """
+        Load the rows which have been appended since the previous call, and add them to the data loaded so far.
+
+        :param path: path to the file or folder to load from
+        :return: all data loaded so far, and the new rows or `None` if there are none
+        """
+        delta = self._load_delta(path)
+        if delta is not None and len(delta) > 0:
+            self._data = delta if self._data is None else pd.concat([self._data, delta])
+        else:
+            delta = None
+        return self._data, delta
 
 
 class _LFMEntry:
@@ -45,12 +94,16 @@ class _LFMEntry:
         self.title = title
         self._fignum = None
 
-    def update(self, data, args) -> bool:
+        # Only pass the new data to update functions which ask for it
+        self._pass_delta = "delta" in inspect.signature(update_fcn).parameters
+
+    def update(self, data, args, delta=None) -> bool:
         """
         Update an individual plot.
 
         :param data: data to plot
         :param args: parsed command line arguments
+        :param delta: data which has been added since the last update, only given when using an `IncrementalLoader`
         :return
         """
         if self._fignum is None:
@@ -64,7 +117,10 @@ class _LFMEntry:
         fig.clf()
 
         # Call drawer
-        res = self.update_fcn(fig, data, args)
+        if self._pass_delta:
+            res = self.update_fcn(fig, data, args, delta=delta)
+        else:
+            res = self.update_fcn(fig, data, args)
 
         # Signal that we're still alive
         if res is False:
@@ -80,14 +136,23 @@ class LiveFigureManager:
     Manages multiple matplotlib figures and refreshes them when the input file changes.
     It also ensures that if you close a figure, it does not reappear on the next update.
     If all figures are closed, the update loop is stopped.
+    When the data is loaded with an `IncrementalLoader`, only the appended part of the file is read, and the update
+    functions can additionally receive the new rows by having a `delta` argument.
     """
 
-    def __init__(self, file_path: str, data_loader: Callable[[str], Any], args, update_interval: int = 3):
+    def __init__(
+        self,
+        file_path: str,
+        data_loader: Union[Callable[[str], Any], IncrementalLoader],
+        args,
+        update_interval: int = 3,
+    ):
         """
         Constructor
 
         :param file_path: name of file to load updates from
-        :param data_loader: called to load the file contents into some internal representation like a pandas `DataFrame`
+        :param data_loader: called to load the file contents into some internal representation like a pandas
+                            `DataFrame`, or an `IncrementalLoader` which only reads the appended rows on every update
         :param args: parsed command line arguments
         :param update_interval: time to wait between figure updates [s]
         """
@@ -110,6 +175,10 @@ class LiveFigureManager:
                 ax = fig.add_subplot(111)
                 ax.plot(data[...])
 
+            @lfm.figure('A figure which also receives the new rows')
+            def another_figure(fig, data, args, delta):
+                ...
+
         :param title: figure title
         :return: decorator for the plotting function
         """
@@ -121,15 +190,36 @@ class LiveFigureManager:
 
         return wrapper
 
-    def _plot_all(self):
-        """ Load the data and plot all registered figures. """
-        data = self._data_loader(self._file_path)
-        self._figure_list[:] = [pl for pl in self._figure_list if pl.update(data, self._args)]
+    def _plot_all(self, data=None, delta=None):
+        """ Load the data (if not given) and plot all registered figures. """
+        if data is None:
+            data = self._data_loader(self._file_path)
+        self._figure_list[:] = [pl for pl in self._figure_list if pl.update(data, self._args, delta)]
+
+    def _spin_incremental(self):
+        """ Run the plot update loop, loading only the appended rows and updating when there are any. """
+        # Wait for the first rows before creating the plots
+        data, delta = self._data_loader.load(self._file_path)
+        while data is None:
+            plt.pause(self._update_interval)
+            data, delta = self._data_loader.load(self._file_path)
+        self._plot_all(data, delta)
+
+        while len(plt.get_fignums()) > 0:
+            # Check for new rows
+            data, delta = self._data_loader.load(self._file_path)
+            if delta is not None:
+                self._plot_all(data, delta)
+
+            # Give matplotlib some time
+            plt.pause(self._update_interval)
 
     def spin(self):
         """ Run the plot update loop.  """
         # Create all plots
         plt.ion()
+        if isinstance(self._data_loader, IncrementalLoader):
+            return self._spin_incremental()
         self._plot_all()
 
         # Watch modification time
@@ -26,11 +26,13 @@
 # ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
 # POSSIBILITY OF SUCH DAMAGE.
 
+import numpy as np
 import torch as to
 import torch.nn as nn
 from abc import ABC, abstractmethod
 from torch.jit import ScriptModule, trace, script
 from torch.nn.utils import convert_parameters as cp
+from typing import Callable, Optional
 from warnings import warn
 
 import pyrado
@@ -203,6 +205,44 @@ class Policy(nn.Module, ABC):
         # This does not work for recurrent policies, which is why they override this function.
         return script(TracedPolicyWrapper(self))
 
+    def compile_inference(self) -> Optional[Callable[[np.ndarray], np.ndarray]]:
+        """
+        Create a function which maps an observation to the action of the policy with its current parameters in
+        evaluation mode, without the autograd bookkeeping and the Python dispatch of the modules. The function does not
+        follow later changes of the parameters, thus it has to be created again after every update.
+        Only policies whose action is a stateless and deterministic function of the observation can support this. The
+        default implementation returns `None`, i.e. the policy has to be called directly.
+
+        :return: function taking and returning (unbatched) numpy arrays, or `None` if the policy does not support it
+        """
+        return None
+
+    def _compile_script_inference(self) -> Optional[Callable[[np.ndarray], np.ndarray]]:
+        """
+        Implementation of `compile_inference()` for subclasses, which freezes the policy's `ScriptModule`, i.e. inlines
+        the current parameters as constants. Policies containing dropout or batch normalization are not supported,
+        since they behave differently in training mode.
+
+        :return: function taking and returning (unbatched) numpy arrays, or `None` if freezing is not possible
+        """
+        if not hasattr(to.jit, "freeze") or self.device != "cpu":
+            return None
+        if any(isinstance(m, (nn.Dropout, nn.modules.batchnorm._BatchNorm)) for m in self.modules()):
+            return None
+
+        training = self.training
+        self.eval()
+        try:
+            module = to.jit.freeze(self.script().eval())
+        finally:
+            self.train(training)
+        dtype = to.get_default_dtype()
+
+        def _inference(obs: np.ndarray) -> np.ndarray:
+            return module(to.from_numpy(np.asarray(obs)).to(dtype)).numpy()
+
+        return _inference
+
 
 class TracedPolicyWrapper(nn.Module):
     """ Wrapper for a traced policy. Mainly used to add `input_size` and `output_size` attributes. """
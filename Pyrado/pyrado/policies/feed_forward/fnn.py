@@ -26,11 +26,13 @@
 # ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
 # POSSIBILITY OF SUCH DAMAGE.
 
+import numpy as np
 import torch as to
 import torch.nn as nn
+import torch.nn.functional as F
 import torch.cuda as cuda
 from torch.nn.utils import convert_parameters as cp
-from typing import Sequence, Callable, Iterable, Tuple, Union, Optional
+from typing import Sequence, Callable, Iterable, Tuple, Union, Optional, List
 
 import pyrado
 from pyrado.spaces.discrete import DiscreteSpace
@@ -39,6 +41,15 @@ from pyrado.policies.base import Policy
 from pyrado.policies.initialization import init_param
 
 
+# NumPy counterparts of the nonlinearities commonly used for the hidden and output layers
+_NP_NONLINS = {
+    to.tanh: np.tanh,
+    to.relu: lambda x: np.maximum(x, 0),
+    F.relu: lambda x: np.maximum(x, 0),
+    to.sigmoid: lambda x: 0.5 * (1.0 + np.tanh(0.5 * x)),
+}
+
+
 class FNN(nn.Module):
     """ Feed-forward neural network """
 
@@ -158,6 +169,68 @@ class FNN(nn.Module):
 
         return output
 
+    def numpy_layers(self) -> Optional[List[Tuple[np.ndarray, np.ndarray, Optional[Callable]]]]:
+        """
+        Get copies of the network's weights, biases, and NumPy nonlinearities for a forward pass without PyTorch.
+
+        :return: list of transposed weight matrix, bias, and nonlinearity (or `None`) per layer, or `None` if the
+                 network contains dropout or a nonlinearity without NumPy counterpart
+        """
+        if self.dropout > 0:
+            return None
+        nonlins = []
+        for f in list(self.hidden_nonlin) + [self.output_nonlin]:
+            if f is not None and f not in _NP_NONLINS:
+                return None
+            nonlins.append(_NP_NONLINS[f] if f is not None else None)
+
+        linears = list(self.hidden_layers) + [self.output_layer]
+        return [
+            (layer.weight.detach().cpu().numpy().T.copy(), layer.bias.detach().cpu().numpy().copy(), f)
+            for layer, f in zip(linears, nonlins)
+        ]
+
+
+def batched_fnn_forward(nets: Sequence[FNN], inputs: Sequence[to.Tensor]) -> Optional[List[to.Tensor]]:
+    """
+    Pass one input batch through each of a number of networks with the same architecture at once. The weights of every
+    layer are stacked along a new first dimension, and the inputs are zero-padded to the longest batch, such that every
+    layer is computed by one batched matrix multiplication instead of one per network.
+
+    :param nets: networks with identical layer sizes and nonlinearities, and without dropout
+    :param inputs: inputs of shape [batch_size_i, input_size], one per network
+    :return: outputs of shape [batch_size_i, output_size], one per network, or `None` if the networks can not be batched
+    """
+    if len(nets) != len(inputs):
+        raise pyrado.ShapeErr(msg=f"Got {len(inputs)} inputs for {len(nets)} networks!")
+    if len(nets) == 0:
+        return []
+    if not all(isinstance(net, FNN) and net.dropout == 0 for net in nets):
+        return None
+
+    # Every network's linear layers, and the nonlinearities applied after them
+    layers = [list(net.hidden_layers) + [net.output_layer] for net in nets]
+    nonlins = list(nets[0].hidden_nonlin) + [nets[0].output_nonlin]
+    for net, net_layers in zip(nets, layers):
+        if list(net.hidden_nonlin) + [net.output_nonlin] != nonlins:
+            return None
+        if [layer.weight.shape for layer in net_layers] != [layer.weight.shape for layer in layers[0]]:
+            return None
+
+    lengths = [x.shape[0] for x in inputs]
+    x = nn.utils.rnn.pad_sequence(
+        [x.to(device=nets[0].device, dtype=to.get_default_dtype()) for x in inputs], batch_first=True
+    )  # shape [num_nets, max_batch_size, input_size]
+
+    for idx_layer, f in enumerate(nonlins):
+        weights = to.stack([ls[idx_layer].weight for ls in layers]).transpose(1, 2)  # [num_nets, in_size, out_size]
+        biases = to.stack([ls[idx_layer].bias for ls in layers]).unsqueeze(1)  # [num_nets, 1, out_size]
+        x = to.baddbmm(biases, x, weights)
+        if f is not None:
+            x = f(x)
+
+    return [x[i, :length] for i, length in enumerate(lengths)]
+
 
 class FNNPolicy(Policy):
     """ Feed-forward neural network policy """
@@ -213,6 +286,23 @@ class FNNPolicy(Policy):
         # Get the action from the owned FNN
         return self.net(obs)
 
+    def compile_inference(self) -> Optional[Callable[[np.ndarray], np.ndarray]]:
+        layers = self.net.numpy_layers()
+        if layers is None:
+            # Fall back to the frozen ScriptModule
+            return self._compile_script_inference()
+        dtype = layers[0][0].dtype
+
+        def _inference(obs: np.ndarray) -> np.ndarray:
+            x = np.asarray(obs, dtype=dtype)
+            for w, b, f in layers:
+                x = x @ w + b
+                if f is not None:
+                    x = f(x)
+            return x
+
+        return _inference
+
 
 class DiscreteActQValPolicy(Policy):
     """ State-action value (Q-value) feed-forward neural network policy for discrete actions """
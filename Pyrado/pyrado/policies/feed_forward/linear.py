@@ -26,8 +26,10 @@
 # ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
 # POSSIBILITY OF SUCH DAMAGE.
 
+import numpy as np
 import torch as to
 import torch.nn as nn
+from typing import Callable, Optional
 
 import pyrado
 from pyrado.utils.data_types import EnvSpec
@@ -104,3 +106,7 @@ class LinearPolicy(Policy):
 
         # Return the flattened tensor if not run in a batch mode to be compatible with the action spaces
         return act.flatten() if not batched else act
+
+    def compile_inference(self) -> Optional[Callable[[np.ndarray], np.ndarray]]:
+        # The features are arbitrary PyTorch functions, thus use the frozen ScriptModule
+        return self._compile_script_inference()
@@ -27,12 +27,68 @@
 # POSSIBILITY OF SUCH DAMAGE.
 
 import numpy as np
-from typing import Callable
+from typing import Callable, Optional, Tuple
 
 import pyrado
+from pyrado.sampling.sampler_pool import SamplerPool
 from pyrado.utils.input_output import print_cbt
 
 
+def _bs_replications(
+    data: np.ndarray, stat_fcn: Callable, num_reps: int, studentized: bool, seed: int
+) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    Compute a chunk of bootstrap replications of the statistic of interest.
+
+    If the statistic is the mean, the resampling is represented by multinomial counts, and the replications are computed
+    as weighted means. Thus, the resampled data is never materialized. For all other statistics, the data is indexed
+    once with a matrix of random indices for the whole chunk.
+
+    :param data: data to bootstrap from of shape [num_samples, dim_samples]
+    :param stat_fcn: function to compute a statistic of interest which needs to expect the argument `axis`
+    :param num_reps: number of replications in this chunk
+    :param studentized: if `True`, compute the standard error of every replication too
+    :param seed: seed for the chunk's own random number generator
+    :return: replications of shape [dim_samples, num_reps], and their standard errors of the same shape or `None`
+    """
+    rng = np.random.RandomState(seed)
+    num_samples = data.shape[0]
+    se_bs = None
+
+    if stat_fcn is np.mean:
+        # Every row of the weight matrix holds how often each sample was drawn, divided by the sample size
+        weights = rng.multinomial(num_samples, np.full(num_samples, 1.0 / num_samples), size=num_reps) / num_samples
+        stat_bs = np.transpose(weights @ data)
+        if studentized:
+            # Center the data first, otherwise E[x^2] - E[x]^2 cancels catastrophically if the mean is large
+            data_c = data - np.mean(data, axis=0)
+            stat_bs_c = np.transpose(weights @ data_c)
+            var_bs = np.transpose(weights @ data_c ** 2) - stat_bs_c ** 2
+            se_bs = np.sqrt(np.maximum(var_bs, 0.0)) / np.sqrt(num_samples)
+
+    else:
+        idcs = rng.randint(num_samples, size=(num_samples, num_reps))
+        data_bs = np.transpose(data[idcs], (0, 2, 1))  # num_samples x dim_samples x num_reps
+        stat_bs = stat_fcn(data_bs, axis=0)
+        if studentized:
+            se_bs = np.std(data_bs, axis=0, ddof=0) / np.sqrt(num_samples)
+
+    return stat_bs, se_bs
+
+
+def _bs_init(G, data: np.ndarray, stat_fcn: Callable, studentized: bool):
+    """ Store the data and the settings for computing the replications. """
+    G.data = data
+    G.stat_fcn = stat_fcn
+    G.studentized = studentized
+
+
+def _bs_run_chunk(G, arg: tuple):
+    """ Compute one chunk of replications given a tuple of the number of replications and the seed. """
+    num_reps, seed = arg
+    return _bs_replications(G.data, G.stat_fcn, num_reps, G.studentized, seed)
+
+
 def bootstrap_ci(
     data: np.ndarray,
     stat_fcn: Callable,
@@ -42,6 +98,8 @@ def bootstrap_ci(
     bias_correction: bool = False,
     studentized: bool = False,
     seed: int = None,
+    chunk_size: Optional[int] = 1000,
+    num_workers: int = 1,
 ):
     r"""
     Re-sampling input data using the nonparametric bootstrap method, computing bootstrap replications using stat_fcn and
@@ -57,7 +115,7 @@ def bootstrap_ci(
         [6] https://www.ethz.ch/content/dam/ethz/special-interest/math/statistics/sfs/Education/Advanced%20Studies%20in%20Applied%20Statistics/course-material-1719/Nonparametric%20Methods/lecture_2up.pdf
         [7] https://ocw.mit.edu/courses/mathematics/18-05-introduction-to-probability-and-statistics-spring-2014/readings/MIT18_05S14_Reading24.pdf
 
-    :param data: data to bootstrap from (for now only 1D arrays supported)
+    :param data: data to bootstrap from, either 1-dim or 2-dim where every column is bootstrapped independently
     :param stat_fcn: function to compute a statistic of interest (e.g. mean, variance) on bootstrap samples
     :param num_reps: number of samples in every bootstrap sample
     :param alpha: determines the confidence level $1 - \alpha \in [0, 1]$
@@ -72,6 +130,12 @@ def bootstrap_ci(
                             Other estimates of the bias-correction factor than stat_emp possible, see [4].
     :param studentized: flag to determine if the method based on the t-distribution is used (leads to a wider ci)
     :param seed: value for the random number generators' seeds, pass `None` to skip seeding
+    :param chunk_size: maximum number of replications computed at once, pass `None` to compute all of them at once.
+                       Only the replications of the statistic are kept, thus this bounds the memory consumption.
+                       Every chunk draws from its own random number generator, so the result depends on the chunk size.
+    :param num_workers: number of parallel processes computing the chunks of replications. For a given seed and
+                        `chunk_size`, the result does not depend on the number of workers. For `num_workers > 1` the
+                        `stat_fcn` must be picklable, e.g. a numpy function.
     :return: mean of the bootstrap replications, and the confidence interval
     """
     if not isinstance(data, np.ndarray):
@@ -84,6 +148,10 @@ def bootstrap_ci(
         raise pyrado.TypeErr(given=num_reps, expected_type=int)
     if not (ci_sides == 1 or ci_sides == 2):
         raise pyrado.ValueErr(given=ci_sides, eq_constraint="1 or 2")
+    if chunk_size is not None and chunk_size < 1:
+        raise pyrado.ValueErr(given=chunk_size, ge_constraint="1")
+    if num_workers < 1:
+        raise pyrado.ValueErr(given=num_workers, ge_constraint="1")
 
     data = np.atleast_2d(data)
     if data.shape[0] == 1:
@@ -96,27 +164,37 @@ def bootstrap_ci(
     # Set the seed if provided
     pyrado.set_seed(seed)
 
+    # Split the replications into chunks. Every chunk gets its own seed such that the result only depends on the seed.
+    if chunk_size is None:
+        chunk_size = num_reps
+    chunks = [min(chunk_size, num_reps - i) for i in range(0, num_reps, chunk_size)]
+    chunk_seeds = np.random.randint(np.iinfo(np.int32).max, size=len(chunks))
+
     # Get the bootstrap replications. The size of the samples drawn by the bootstrap method have to be equal input
     # sample, since the variance of the statistic to be computed depends on sample size
-    data_bs = np.stack(
-        [data[np.random.choice(num_data_samples, num_data_samples, replace=True)] for _ in range(num_reps)], axis=2
-    )
-    # data_bs = np.random.choice(data, size=(num_data_samples, dim_data_samples, num_reps), replace=True)
+    if num_workers > 1:
+        pool = SamplerPool(num_workers)
+        try:
+            pool.invoke_all(_bs_init, data, stat_fcn, studentized)
+            results = pool.run_map(_bs_run_chunk, list(zip(chunks, chunk_seeds.tolist())))
+        finally:
+            pool.stop()
+    else:
+        results = [_bs_replications(data, stat_fcn, n, studentized, s) for n, s in zip(chunks, chunk_seeds.tolist())]
 
     # Compute the statistic of interest based on the empirical distribution (input data)
     stat_emp = stat_fcn(data, axis=0)
     assert stat_emp.shape == (dim_data_samples,)
 
     # Compute the statistic of interest based on the resampled distribution -->> bootstrap replications
-    stat_bs = stat_fcn(data_bs, axis=0)
+    stat_bs = np.concatenate([r[0] for r in results], axis=1)
     assert stat_bs.shape == (dim_data_samples, num_reps)
 
     # Correct for the bias introduced by bootstrapping
     if bias_correction:
         # bias-corrected statistic (see (2) in [2], or (11.10) in [3])
-        stat_bs_bc = 2 * stat_emp.reshape(-1, 1) - np.mean(
-            stat_bs
-        )  # repl_bc = stat_emp - bias, with bias = mean_repl - stat_emp
+        # repl_bc = stat_emp - bias, with bias = mean_repl - stat_emp
+        stat_bs_bc = 2 * stat_emp - np.mean(stat_bs, axis=1)
         # Return the bias-corrected estimator based on the original sample a.k.a. empirical distribution,
         # but use the correction also for the bootstrap replications
         stat_ret = stat_bs_bc
@@ -140,7 +218,7 @@ def bootstrap_ci(
             print_cbt("The standard error of the empirical data (se_emp) is below 1e-9.", "y")
 
         # Compute the standard error of the replications for the bootstrapped t-statistic
-        se_bs = np.std(data_bs, axis=0, ddof=0) / np.sqrt(data_bs.shape[0])
+        se_bs = np.concatenate([r[1] for r in results], axis=1)
         assert se_bs.shape == (dim_data_samples, num_reps)
         if np.any(se_bs < 1e-9):  # use any for version 2 above
             print_cbt(
@@ -153,7 +231,6 @@ def bootstrap_ci(
         # Compute the t-statistic of the replications
         t_bs = delta_bs / se_bs  # is consistent with [3, p. 360]
 
-        t_bs.sort()
         # Two-sided confidence interval
         if ci_sides == 2:
             t_lo, t_up = np.percentile(t_bs, 100 * np.array([alpha / 2, 1 - alpha / 2]), axis=1)
@@ -166,7 +243,6 @@ def bootstrap_ci(
 
     # Confidence interval without asymptotic refinement (a.k.a. basic method)
     else:
-        delta_bs.sort()
         # Two-sided confidence interval
         if ci_sides == 2:
             delta_lo, delta_up = np.percentile(delta_bs, 100 * np.array([alpha / 2, 1 - alpha / 2]), axis=1)
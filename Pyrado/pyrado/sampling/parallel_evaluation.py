@@ -54,23 +54,125 @@
 # ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
 # POSSIBILITY OF SUCH DAMAGE.
 
+import csv
 import pickle
 import functools
 import numpy as np
+import os
+import os.path as osp
+import pandas as pd
+import re
 import sys
 from tqdm import tqdm
-from typing import List, Dict, Optional
+from typing import Callable, List, Dict, Optional, Union
 
+import pyrado
 from pyrado.domain_randomization.domain_randomizer import DomainRandomizer
 from pyrado.environment_wrappers.domain_randomization import remove_all_dr_wrappers, DomainRandWrapperLive
+from pyrado.environments.base import Env
 from pyrado.environments.sim_base import SimEnv
 from pyrado.policies.base import Policy
 from pyrado.sampling.parallel_rollout_sampler import _ps_init, _ps_run_one_domain_param, _ps_run_one_init_state
+from pyrado.sampling.rollout import rollout
 from pyrado.sampling.sampler_pool import SamplerPool
 from pyrado.sampling.step_sequence import StepSequence
 from pyrado.spaces.singular import SingularStateSpace
 
 
+def reduce_return(ro: StepSequence, env: Env) -> float:
+    """ Reduce a rollout to its undiscounted return. """
+    return ro.undiscounted_return()
+
+
+def reduce_length(ro: StepSequence, env: Env) -> float:
+    """ Reduce a rollout to its number of steps. """
+    return float(ro.length)
+
+
+def reduce_success(ro: StepSequence, env: Env) -> float:
+    """ Reduce a rollout to 1 if the environment's task has been solved in the final state, else 0. """
+    return float(env.task.has_succeeded(ro.states[-1]))
+
+
+def reduce_final_state(ro: StepSequence, env: Env) -> np.ndarray:
+    """ Reduce a rollout to its final state. """
+    return ro.states[-1]
+
+
+def _ps_run_one_domain_param_reduced(G, domain_param: dict, reducers: Dict[str, Callable]):
+    """
+    Sample one rollout with given domain parameters, and only return the reduced results.
+    This function is used by `eval_domain_params_reduced()`.
+    """
+    ro = rollout(G.env, G.policy, eval=True, reset_kwargs=dict(domain_param=domain_param))
+    return ro.rollout_info["domain_param"], {name: fcn(ro, G.env) for name, fcn in reducers.items()}
+
+
+def _table_row(domain_param: dict, results: Dict[str, Union[float, np.ndarray]]) -> dict:
+    """
+    Flatten the results of one grid point into one row of the results table.
+
+    :param domain_param: all domain parameters of the rollout, non-scalar values are not stored
+    :param results: reduced results, array-valued ones are split into one column per element
+    :return: dict mapping the column names to the values
+    """
+    row = {name: float(value) for name, value in domain_param.items() if np.ndim(value) == 0}
+    for name, value in results.items():
+        value = np.asarray(value, dtype=np.float64)
+        if value.ndim == 0:
+            row[name] = float(value)
+        else:
+            row.update({f"{name}_{i}": float(v) for i, v in enumerate(value.ravel())})
+    return row
+
+
+def _load_table(save_path: str, domain_param: dict, params: List[Dict], reducers: Dict[str, Callable]) -> List[dict]:
+    """
+    Load the results of a previous (interrupted) evaluation, and check that they belong to the given evaluation.
+    An incomplete last line, e.g. from a process which has been killed while writing, is removed from the file.
+
+    :param save_path: path to the csv file
+    :param domain_param: domain parameters of the environment, used to infer the stored columns
+    :param params: multidimensional grid of domain parameters
+    :param reducers: dict mapping column names to the reducing functions
+    :return: list of rows, the i-th row belongs to the i-th grid point
+    """
+    with open(save_path, newline="") as f:
+        content = f.read()
+    if not content.endswith("\n"):
+        # Only keep the complete lines
+        content = content[: content.rfind("\n") + 1]
+        with open(save_path, "w", newline="") as f:
+            f.write(content)
+    if not content:
+        return []
+
+    def _is_result_col(col: str, name: str) -> bool:
+        # Array-valued results are stored in one column per element, see _table_row()
+        return col == name or re.fullmatch(rf"{re.escape(name)}_\d+", col) is not None
+
+    # The header must consist of the scalar domain parameters and (at least one column for) every reducer
+    header = next(csv.reader([content.splitlines()[0]]))
+    dp_cols = [name for name, value in {**domain_param, **params[0]}.items() if np.ndim(value) == 0]
+    res_cols = [col for col in header if col not in dp_cols]
+    if (
+        not all(col in header for col in dp_cols)
+        or not all(any(_is_result_col(col, name) for name in reducers) for col in res_cols)
+        or not all(any(_is_result_col(col, name) for col in res_cols) for name in reducers)
+    ):
+        raise pyrado.ValueErr(
+            msg=f"The columns {header} stored in {save_path} do not match the domain parameters and the reducers "
+            f"{list(reducers.keys())}!"
+        )
+
+    rows = pd.read_csv(save_path).to_dict(orient="records")
+    if len(rows) > len(params) or not all(
+        np.isclose(row[k], float(v)) for row, p in zip(rows, params) for k, v in p.items() if np.ndim(v) == 0
+    ):
+        raise pyrado.ValueErr(msg=f"The results stored in {save_path} do not belong to the given grid!")
+    return rows
+
+
 def eval_domain_params(
     pool: SamplerPool, env: SimEnv, policy: Policy, params: List[Dict], init_state: Optional[np.ndarray] = None
 ) -> List[StepSequence]:
@@ -96,6 +198,81 @@ def eval_domain_params(
         return pool.run_map(functools.partial(_ps_run_one_domain_param, eval=True), params, pb)
 
 
+def eval_domain_params_reduced(
+    pool: SamplerPool,
+    env: SimEnv,
+    policy: Policy,
+    params: List[Dict],
+    reducers: Optional[Dict[str, Callable]] = None,
+    init_state: Optional[np.ndarray] = None,
+    save_path: Optional[str] = None,
+    chunk_size: Optional[int] = None,
+) -> pd.DataFrame:
+    """
+    Evaluate a policy on a multidimensional grid of domain parameters, only keeping a summary of every rollout.
+    The rollouts are reduced by the workers, and the results are collected chunk by chunk. Optionally, they are
+    appended to a csv file after every chunk. If this file already exists, e.g. from an interrupted evaluation, the
+    grid points contained in it are skipped.
+
+    :param pool: parallel sampler
+    :param env: environment to evaluate in
+    :param policy: policy to evaluate
+    :param params: multidimensional grid of domain parameters
+    :param reducers: dict mapping column names to functions `fcn(ro, env)` which reduce a rollout to a float or an
+                     array, e.g. `reduce_return()`, `reduce_success()`, or `reduce_final_state()`. The functions must be
+                     pickleable. By default, the return and the length are recorded.
+    :param init_state: initial state of the environment which will be fixed if not set to `None`
+    :param save_path: path to the csv file for storing the results, pass `None` to only keep them in memory
+    :param chunk_size: number of grid points evaluated before the results are written, by default 10 per worker
+    :return: table with all scalar domain parameters and the reduced results, one row per grid point in the order of
+             `params`
+    """
+    if reducers is None:
+        reducers = dict(ret=reduce_return, len=reduce_length)
+    if not isinstance(reducers, dict) or not all(callable(fcn) for fcn in reducers.values()):
+        raise pyrado.TypeErr(msg="The reducers must be given as a dict of callables!")
+    if chunk_size is None:
+        chunk_size = 10 * pool.num_threads
+    if chunk_size < 1:
+        raise pyrado.ValueErr(given=chunk_size, ge_constraint="1")
+
+    # Strip all domain randomization wrappers from the environment
+    env = remove_all_dr_wrappers(env, verbose=True)
+    if init_state is not None:
+        env.init_space = SingularStateSpace(fixed_state=init_state)
+
+    # Load the results of a previous (interrupted) evaluation. The chunks are written in the order of the grid, thus
+    # the stored rows always belong to the first grid points.
+    rows = []
+    if save_path is not None and osp.isfile(save_path):
+        rows = _load_table(save_path, env.domain_param, params, reducers)
+
+    if len(rows) < len(params):
+        pool.invoke_all(_ps_init, pickle.dumps(env), pickle.dumps(policy))
+    func = functools.partial(_ps_run_one_domain_param_reduced, reducers=reducers)
+
+    with tqdm(
+        total=len(params), initial=len(rows), leave=False, file=sys.stdout, unit="rollouts", desc="Sampling"
+    ) as pb:
+        for start in range(len(rows), len(params), chunk_size):
+            chunk = params[start : start + chunk_size]
+            rows_chunk = [_table_row(dp, res) for dp, res in pool.run_map(func, chunk)]
+            rows.extend(rows_chunk)
+            pb.update(len(chunk))
+
+            if save_path is not None:
+                # Append the chunk's results, and write the header if the file is new (or empty)
+                os.makedirs(osp.dirname(osp.abspath(save_path)), exist_ok=True)
+                new_file = not osp.isfile(save_path) or osp.getsize(save_path) == 0
+                with open(save_path, "a", newline="") as f:
+                    writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+                    if new_file:
+                        writer.writeheader()
+                    writer.writerows(rows_chunk)
+
+    return pd.DataFrame(rows)
+
+
 def eval_nominal_domain(
     pool: SamplerPool, env: SimEnv, policy: Policy, init_states: List[np.ndarray]
 ) -> List[StepSequence]:
@@ -29,6 +29,7 @@
 import numpy as np
 import pickle
 import sys
+import torch as to
 import torch.multiprocessing as mp
 from functools import partial
 from init_args_serializer import Serializable
@@ -39,22 +40,54 @@ from typing import List, Optional
 
 import pyrado
 from pyrado.environments.base import Env
+from pyrado.logger.step import LoggerAware
 from pyrado.policies.base import Policy
 from pyrado.sampling.sampler_pool import SamplerPool
 from pyrado.sampling.step_sequence import StepSequence
 from pyrado.sampling.rollout import rollout
 from pyrado.sampling.sampler import SamplerBase
+from pyrado.utils.profiling import collect_from_pool, enable_in_pool, profiler
 
 
-def _ps_init(G, env, policy):
+def _ps_init(G, env, policy, compile_policy: bool = False):
     """ Store pickled (and thus copied) environment and policy. """
     G.env = pickle.loads(env)
     G.policy = pickle.loads(policy)
+    G.shared_state = None
+    G.shared_version = None
+    G.compile_policy = compile_policy
+    _ps_compile_policy(G)
 
 
-def _ps_update_policy(G, state):
-    """ Update policy state_dict. """
-    G.policy.load_state_dict(state)
+def _ps_compile_policy(G):
+    """ Create the policy's compiled inference function with its current parameters, if desired and supported. """
+    if G.compile_policy and isinstance(G.policy, Policy):
+        G.inference = G.policy.compile_inference()
+    else:
+        G.inference = None
+
+
+def _ps_init_env(G, env):
+    """ Store pickled (and thus copied) environment, keeping the policy. """
+    G.env = pickle.loads(env)
+
+
+def _ps_init_shared_state(G, shared_state: dict, shared_version: to.Tensor):
+    """ Store the references to the policy's state in shared memory, and to its version counter. """
+    G.shared_state = shared_state
+    G.shared_version = shared_version
+    G.policy_version = None  # force loading the state before the next rollout
+
+
+def _ps_sync_policy(G):
+    """ Load the policy's state from shared memory if the master process has changed it since the last rollout. """
+    if G.shared_version is None:
+        return
+    version = int(G.shared_version.item())
+    if version != G.policy_version:
+        G.policy.load_state_dict(G.shared_state)
+        G.policy_version = version
+        _ps_compile_policy(G)
 
 
 def _ps_sample_one(G, eval: bool):
@@ -62,7 +95,8 @@ def _ps_sample_one(G, eval: bool):
     Sample one rollout and return step count if counting steps, rollout count (1) otherwise.
     This function is used when a minimum number of steps was given.
     """
-    ro = rollout(G.env, G.policy, eval=eval)
+    _ps_sync_policy(G)
+    ro = rollout(G.env, G.policy, eval=eval, inference=G.inference)
     return ro, len(ro)
 
 
@@ -71,7 +105,8 @@ def _ps_run_one(G, num: int, eval: bool):
     Sample one rollout without specifying the initial state or the domain parameters.
     This function is used when a minimum number of rollouts was given.
     """
-    return rollout(G.env, G.policy, eval=eval)
+    _ps_sync_policy(G)
+    return rollout(G.env, G.policy, eval=eval, inference=G.inference)
 
 
 def _ps_run_one_init_state(G, init_state: np.ndarray, eval: bool):
@@ -79,7 +114,8 @@ def _ps_run_one_init_state(G, init_state: np.ndarray, eval: bool):
     Sample one rollout with given init state.
     This function is used when a minimum number of rollouts was given.
     """
-    return rollout(G.env, G.policy, eval=eval, reset_kwargs=dict(init_state=init_state))
+    _ps_sync_policy(G)
+    return rollout(G.env, G.policy, eval=eval, reset_kwargs=dict(init_state=init_state), inference=G.inference)
 
 
 def _ps_run_one_domain_param(G, domain_param: dict, eval: bool):
@@ -87,7 +123,8 @@ def _ps_run_one_domain_param(G, domain_param: dict, eval: bool):
     Sample one rollout with given domain parameters.
     This function is used when a minimum number of rollouts was given.
     """
-    return rollout(G.env, G.policy, eval=eval, reset_kwargs=dict(domain_param=domain_param))
+    _ps_sync_policy(G)
+    return rollout(G.env, G.policy, eval=eval, reset_kwargs=dict(domain_param=domain_param), inference=G.inference)
 
 
 def _ps_run_one_reset_kwargs(G, reset_kwargs: tuple, eval: bool):
@@ -101,12 +138,17 @@ def _ps_run_one_reset_kwargs(G, reset_kwargs: tuple, eval: bool):
         raise pyrado.TypeErr(given=reset_kwargs[0], expected_type=np.ndarray)
     if not isinstance(reset_kwargs[1], dict):
         raise pyrado.TypeErr(given=reset_kwargs[1], expected_type=dict)
+    _ps_sync_policy(G)
     return rollout(
-        G.env, G.policy, eval=eval, reset_kwargs=dict(init_state=reset_kwargs[0], domain_param=reset_kwargs[1])
+        G.env,
+        G.policy,
+        eval=eval,
+        reset_kwargs=dict(init_state=reset_kwargs[0], domain_param=reset_kwargs[1]),
+        inference=G.inference,
     )
 
 
-class ParallelRolloutSampler(SamplerBase, Serializable):
+class ParallelRolloutSampler(SamplerBase, LoggerAware, Serializable):
     """ Class for sampling from multiple environments in parallel """
 
     def __init__(
@@ -119,6 +161,9 @@ class ParallelRolloutSampler(SamplerBase, Serializable):
         min_steps: int = None,
         show_progress_bar: bool = True,
         seed: int = None,
+        compile_policy: bool = False,
+        log_utilization: bool = False,
+        profile: bool = False,
     ):
         """
         Constructor
@@ -130,6 +175,18 @@ class ParallelRolloutSampler(SamplerBase, Serializable):
         :param min_steps: minimum total number of steps to sample
         :param show_progress_bar: it `True`, display a progress bar using `tqdm`
         :param seed: seed value for the random number generators, pass `None` for no seeding
+        :param compile_policy: if `True`, the workers replace the policy by its compiled inference function (see
+                               `Policy.compile_inference()`), which is created again whenever the policy's parameters
+                               change. This is ignored for policies which do not support it, e.g. exploration
+                               strategies. The actions are only equal to the policy's up to floating point precision.
+        :param log_utilization: if `True`, the workers' utilization is added to the logger after every sampling with a
+                                given number of rollouts, see `SamplerPool.log_utilization()`. The logger is the one of
+                                the algorithm holding this sampler, thus the values must be logged in every iteration.
+                                A sampler without logger, e.g. one which is not held by an algorithm, does not log.
+        :param profile: if `True`, the profiler is enabled in all workers (see `pyrado.utils.profiling`), and the
+                        average time per call of every component recorded during a sampling is added to the logger.
+                        With only one worker, the profiler is enabled in the main process. Call `close()` to disable
+                        the profiler again.
         """
         Serializable._init(self, locals())
         super().__init__(min_rollouts=min_rollouts, min_steps=min_steps)
@@ -137,6 +194,11 @@ class ParallelRolloutSampler(SamplerBase, Serializable):
         self.env = env
         self.policy = policy
         self.show_progress_bar = show_progress_bar
+        self.compile_policy = compile_policy
+        self.log_utilization = log_utilization
+        self.profile = profile
+        self._profiled_names = None  # the logger's keys are fixed after the first step
+        self._profiling = False
 
         # Set method to spawn if using cuda
         if self.policy.device != "cpu" and mp.get_start_method(allow_none=True) != "spawn":
@@ -150,7 +212,33 @@ class ParallelRolloutSampler(SamplerBase, Serializable):
             self.set_seed(seed)
 
         # Distribute environments. We use pickle to make sure a copy is created for n_envs=1
-        self.pool.invoke_all(_ps_init, pickle.dumps(self.env), pickle.dumps(self.policy))
+        self.pool.invoke_all(_ps_init, pickle.dumps(self.env), pickle.dumps(self.policy), self.compile_policy)
+        self._init_shared_state()
+
+        if self.profile:
+            # Instrument after the workers received the environment and the policy, such that their classes are known.
+            # The main process is only instrumented if it does the sampling, i.e. for one worker.
+            enable_in_pool(self.pool, include_main=False)
+            self._profiling = True
+
+    def _init_shared_state(self):
+        """
+        Create a copy of the policy's state in shared memory, and distribute the references to it to the workers.
+        The workers keep them and load the state from there whenever the version counter has changed.
+        """
+        self._shared_state = {k: v.detach().cpu().clone().share_memory_() for k, v in self.policy.state_dict().items()}
+        self._shared_version = to.zeros(1, dtype=to.int64).share_memory_()
+        self.pool.invoke_all(_ps_init_shared_state, self._shared_state, self._shared_version)
+
+    def _update_shared_state(self):
+        """ Write the policy's current state into shared memory, and increase the version counter if it changed. """
+        changed = False
+        for k, v in self.policy.state_dict().items():
+            if not to.equal(self._shared_state[k], v.detach().cpu()):
+                self._shared_state[k].copy_(v.detach())
+                changed = True
+        if changed:
+            self._shared_version += 1
 
     def set_seed(self, seed):
         """
@@ -167,14 +255,21 @@ class ParallelRolloutSampler(SamplerBase, Serializable):
         :param env: the environment which the policy operates
         :param policy: the policy used for sampling
         """
+        if env is not None and policy is None:
+            # Only broadcast the new environment, the workers keep the policy and the shared state
+            self.env = env
+            self.pool.invoke_all(_ps_init_env, pickle.dumps(self.env))
+            return
+
         # Update env and policy if passed
         if env is not None:
             self.env = env
         if policy is not None:
             self.policy = policy
 
-        # Always broadcast to workers
-        self.pool.invoke_all(_ps_init, pickle.dumps(self.env), pickle.dumps(self.policy))
+        # Broadcast to workers
+        self.pool.invoke_all(_ps_init, pickle.dumps(self.env), pickle.dumps(self.policy), self.compile_policy)
+        self._init_shared_state()
 
     def sample(
         self,
@@ -191,8 +286,12 @@ class ParallelRolloutSampler(SamplerBase, Serializable):
         :param eval: pass `False` if the rollout is executed during training, else `True`. Forwarded to `rollout()`.
         :return: list of sampled rollouts
         """
-        # Update policy's state
-        self.pool.invoke_all(_ps_update_policy, self.policy.state_dict())
+        # Update policy's state, the workers read it from shared memory before their next rollout
+        self._update_shared_state()
+
+        if self._profiling:
+            # Discard what has been recorded in the main process outside of the sampling, e.g. during training
+            profiler.reset()
 
         # Collect samples
         with tqdm(
@@ -227,12 +326,14 @@ class ParallelRolloutSampler(SamplerBase, Serializable):
                     arglist = rep_factor * allcombs
 
                 # Only minimum number of rollouts given, thus use run_map
-                return self.pool.run_map(func, arglist, pb)
+                ros = self.pool.run_map(func, arglist, pb)
+                if self.log_utilization and self._has_logger():
+                    self.pool.log_utilization(self.logger, prefix="sampler")
 
             else:
                 # Minimum number of steps given, thus use run_collect (automatically handles min_runs=None)
                 if init_states is None:
-                    return self.pool.run_collect(
+                    ros = self.pool.run_collect(
                         self.min_steps,
                         partial(_ps_sample_one, eval=eval),
                         collect_progressbar=pb,
@@ -247,3 +348,34 @@ class ParallelRolloutSampler(SamplerBase, Serializable):
                     #     collect_progressbar=pb,
                     #     min_runs=self.min_rollouts
                     # )[0]
+
+        if self._profiling and self._has_logger():
+            self._log_profile()
+        return ros
+
+    def _has_logger(self) -> bool:
+        """
+        Check if there is a logger to add values to, i.e. if the sampler is held by an algorithm or if a logger has been
+        set explicitly. Otherwise, accessing the logger would create a default one without a directory to save to.
+        """
+        return self._logger is not None or hasattr(self, "_logger_parent")
+
+    def _log_profile(self):
+        """ Gather the data recorded by the workers' profilers during the last sampling, and add it to the logger. """
+        collect_from_pool(self.pool)
+        if self._profiled_names is None:
+            self._profiled_names = sorted(profiler.stats.keys())
+        profiler.log(self.logger, self._profiled_names, prefix="sampler prof")
+        profiler.reset()
+
+    def close(self):
+        """ Disable the profiler if it has been enabled by this sampler, and terminate the workers. """
+        if self._profiling:
+            enable_in_pool(self.pool, enable=False, include_main=False)
+            self._profiling = False
+        self.pool.stop()
+
+    def __del__(self):
+        # Restore the methods patched in the main process, the workers' patches vanish with the workers
+        if getattr(self, "_profiling", False) and self.pool.num_threads == 1:
+            profiler.disable()
@@ -50,6 +50,7 @@ from pyrado.sampling.step_sequence import StepSequence
 from torch.nn.utils.convert_parameters import vector_to_parameters
 from pyrado.sampling.sampler_pool import SamplerPool
 from pyrado.sampling.rollout import rollout
+from pyrado.sampling.rollout_cache import RolloutCache
 from pyrado.utils.properties import cached_property
 from pyrado.environment_wrappers.utils import typed_env, attr_env_get, inner_env
 
@@ -119,10 +120,11 @@ class ParameterSamplingResult(Sequence[ParameterSample]):
         return int(np.sum([s.num_rollouts for s in self._samples]))
 
 
-def _pes_init(G, env, policy):
-    """ Store pickled (and thus copied) environment and policy. """
+def _pes_init(G, env, policy, cache: Optional[RolloutCache] = None):
+    """ Store pickled (and thus copied) environment and policy, as well as the worker's rollout cache. """
     G.env = pickle.loads(env)
     G.policy = pickle.loads(policy)
+    G.cache = cache
 
 
 def _pes_sample_one(G, param):
@@ -137,6 +139,7 @@ def _pes_sample_one(G, param):
             "init_state": init_state,
             "domain_param": dom_param,
         },
+        cache=G.cache,
     )
 
 
@@ -151,6 +154,8 @@ class ParameterExplorationSampler(Serializable):
         num_domains: int,
         num_workers: int,
         seed: Optional[int] = None,
+        shared_memory: bool = False,
+        cache: Optional[RolloutCache] = None,
     ):
         """
         Constructor
@@ -161,6 +166,11 @@ class ParameterExplorationSampler(Serializable):
         :param num_domains: number of rollouts due to the variance over domain parameters
         :param num_workers: number of parallel samplers
         :param seed: seed value for the random number generators, pass `None` for no seeding
+        :param shared_memory: if `True`, the workers send the rollouts' data via shared memory instead of pickling it,
+                              see `SamplerPool`
+        :param cache: rollout cache to serve repeated evaluations of the same policy parameters, domain parameters,
+                      and initial states without simulating, pass `None` to disable caching. Every worker gets its own
+                      copy of the in-memory tier, the on-disk tier is shared.
         """
         if not isinstance(num_init_states_per_domain, int):
             raise pyrado.TypeErr(given=num_init_states_per_domain, expected_type=int)
@@ -183,20 +193,21 @@ class ParameterExplorationSampler(Serializable):
         self.env, self.policy = env, policy
         self.num_init_states_per_domain = num_init_states_per_domain
         self.num_domains = num_domains
+        self.cache = cache
 
         # Set method to spawn if using cuda
         if self.policy.device != "cpu" and mp.get_start_method(allow_none=True) != "spawn":
             mp.set_start_method("spawn", force=True)
 
         # Create parallel pool. We use one thread per environment because it's easier.
-        self.pool = SamplerPool(num_workers)
+        self.pool = SamplerPool(num_workers, shared_memory)
 
         # Set all rngs' seeds
         if seed is not None:
             self.pool.set_seed(seed)
 
         # Distribute environments. We use pickle to make sure a copy is created for n_envs = 1
-        self.pool.invoke_all(_pes_init, pickle.dumps(self.env), pickle.dumps(self.policy))
+        self.pool.invoke_all(_pes_init, pickle.dumps(self.env), pickle.dumps(self.policy), self.cache)
 
     @property
     def num_rollouts_per_param(self) -> int:
@@ -250,7 +261,7 @@ class ParameterExplorationSampler(Serializable):
             self.policy = policy
 
         # Always broadcast to workers
-        self.pool.invoke_all(_pes_init, pickle.dumps(self.env), pickle.dumps(self.policy))
+        self.pool.invoke_all(_pes_init, pickle.dumps(self.env), pickle.dumps(self.policy), self.cache)
 
     def sample(self, param_sets: to.Tensor, init_states: Optional[List[np.ndarray]] = None) -> ParameterSamplingResult:
         """
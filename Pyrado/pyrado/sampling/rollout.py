@@ -31,12 +31,13 @@ import time
 import torch as to
 import torch.nn as nn
 from matplotlib import pyplot as plt
-from typing import Callable, Tuple, Optional, Union
+from typing import Callable, List, Tuple, Optional, Union
 from tabulate import tabulate
 
 import pyrado
 from pyrado.environment_wrappers.action_delay import ActDelayWrapper
 from pyrado.environments.base import Env
+from pyrado.environments.pysim.vectorized import VecSimEnv
 from pyrado.environments.real_base import RealEnv
 from pyrado.environments.sim_base import SimEnv
 from pyrado.environment_wrappers.utils import inner_env, typed_env
@@ -52,9 +53,110 @@ from pyrado.plotting.rollout_based import (
 )
 from pyrado.policies.base import Policy, TwoHeadedPolicy
 from pyrado.policies.recurrent.potential_based import PotentialBasedPolicy
+from pyrado.sampling.rollout_cache import RolloutCache
 from pyrado.sampling.step_sequence import StepSequence
 from pyrado.utils.data_types import RenderMode
 from pyrado.utils.input_output import print_cbt, color_validity
+from pyrado.utils.profiling import profiler
+
+
+def _check_nan(env: Env, render_mode: RenderMode, values: np.ndarray, labels, name: str):
+    """ Raise an error showing the invalid entries if any of the observation or action values is NaN. """
+    if np.isnan(values).any():
+        env.render(render_mode, render_step=1)
+        raise pyrado.ValueErr(
+            msg=f"At least one {name} value is NaN!"
+            + tabulate([list(labels), [*color_validity(values, np.invert(np.isnan(values)))]], headers="firstrow")
+        )
+
+
+def _supports_preallocation(env: Env, policy) -> bool:
+    """ Check if the rollout can be done with preallocated buffers, i.e. it needs no policy-specific recordings. """
+    if not np.isfinite(env.max_steps):
+        return False
+    if isinstance(policy, Policy):
+        inner_policy = getattr(policy, "policy", policy)
+        return not (policy.is_recurrent or isinstance(inner_policy, (PotentialBasedPolicy, TwoHeadedPolicy)))
+    return True
+
+
+def _rollout_preallocated(
+    env: Env,
+    policy: Union[nn.Module, Policy, Callable],
+    obs: np.ndarray,
+    rollout_info: dict,
+    render_mode: RenderMode,
+    render_step: int,
+    no_close: bool,
+    stop_on_done: bool,
+    check_nan: bool,
+    inference: Optional[Callable[[np.ndarray], np.ndarray]] = None,
+) -> StepSequence:
+    """
+    Run the loop of `rollout()` writing into arrays which are allocated once for the maximum number of steps. The
+    policy's input is copied into the same tensor every step. The filled parts of the arrays are passed to the
+    `StepSequence` without stacking. See `rollout()` for the parameters, the environment must already be reset.
+    """
+    num_rows = int(env.max_steps) - env.curr_step + 1  # the observations and states have one more entry
+    obs_buf = np.empty((num_rows,) + np.shape(obs), dtype=np.asarray(obs).dtype)
+    state_buf = np.empty((num_rows,) + np.shape(env.state), dtype=np.asarray(env.state).dtype)
+    rew_buf = np.empty(num_rows - 1)
+    time_buf = np.empty(num_rows)
+    act_buf = None  # allocated with the type of the first action
+    env_info_hist = []
+    obs_to = to.empty(np.shape(obs), dtype=to.get_default_dtype())
+
+    done = False
+    k = 0
+    time_buf[0] = 0.0  # time starts at zero
+    while not (done and stop_on_done) and env.curr_step < env.max_steps:
+        if check_nan:
+            _check_nan(env, render_mode, obs, env.obs_space.labels, "observation")
+
+        # Get the agent's action, the policy operates on PyTorch tensors
+        if inference is not None:
+            act = inference(obs)
+        else:
+            obs_to.copy_(to.from_numpy(np.asarray(obs)))
+            with to.no_grad():
+                act = policy(obs_to).detach().cpu().numpy()  # environment operates on numpy arrays
+
+        if check_nan:
+            _check_nan(env, render_mode, act, env.act_space.labels, "action")
+        if act_buf is None:
+            act_buf = np.empty((num_rows - 1,) + act.shape, dtype=act.dtype)
+
+        # Record the data before stepping, the state and the observation are copied into the buffers
+        obs_buf[k] = obs
+        state_buf[k] = env.state
+        act_buf[k] = act
+        obs, rew, done, env_info = env.step(act)
+        rew_buf[k] = rew
+        env_info_hist.append(env_info)
+        time_buf[k + 1] = time_buf[k] + env.dt
+        k += 1
+
+        # Render if wanted (actually renders the next state)
+        env.render(render_mode, render_step)
+
+    if not no_close:
+        # Disconnect from EnvReal instance (does nothing for EnvSim instances)
+        env.close()
+
+    # Add final observation and state
+    obs_buf[k] = obs
+    state_buf[k] = env.state
+
+    return StepSequence(
+        observations=obs_buf[: k + 1],
+        actions=act_buf[:k],
+        rewards=rew_buf[:k],
+        states=state_buf[: k + 1],
+        time=time_buf[: k + 1],
+        rollout_info=rollout_info,
+        env_infos=env_info_hist,
+        complete=True,  # the rollout function always returns complete paths
+    )
 
 
 def rollout(
@@ -70,6 +172,10 @@ def rollout(
     record_dts: Optional[bool] = False,
     stop_on_done: Optional[bool] = True,
     seed: Optional[int] = None,
+    cache: Optional[RolloutCache] = None,
+    preallocate: Optional[bool] = False,
+    check_nan: Optional[bool] = True,
+    inference: Optional[Callable[[np.ndarray], np.ndarray]] = None,
 ) -> StepSequence:
     """
     Perform a rollout (i.e. sample a trajectory) in the given environment using given policy.
@@ -87,11 +193,50 @@ def rollout(
     :param record_dts: flag if the time intervals of different parts of one step should be recorded (for debugging)
     :param stop_on_done: set to false to ignore the environments's done flag (for debugging)
     :param seed: seed value for the random number generators, pass `None` for no seeding
+    :param cache: optional cache to look up deterministic rollouts before simulating them, see `RolloutCache`. On a
+                  cache hit, the environment is reset with `reset_kwargs` (after seeding), but not stepped. Rollouts
+                  which are rendered, record the time intervals, or for which the environment is not reset are not
+                  cached.
+    :param preallocate: if `True`, record the data in arrays which are allocated once for the maximum number of steps,
+                        instead of collecting and stacking the steps. This is ignored for recurrent, potential-based,
+                        or two-headed policies, when recording the time intervals or profiling, or if playing a video,
+                        since these need additional recordings per step.
+    :param check_nan: if `True`, raise an error if any observation or action value is NaN
+    :param inference: function computing the action from the observation in place of the policy, usually created by
+                      `policy.compile_inference()` with the policy's current parameters. The policy is still reset.
+                      This is not supported for recurrent, potential-based, or two-headed policies.
     :return paths of the observations, actions, rewards, and information about the environment as well as the policy
     """
     # Check the input
     if not isinstance(env, Env):
         raise pyrado.TypeErr(given=env, expected_type=Env)
+
+    if cache is not None and not (no_reset or record_dts or any(render_mode)):
+        key = cache.make_key(env, policy, reset_kwargs, seed, eval=eval, max_steps=max_steps, stop_on_done=stop_on_done)
+        if key is not None:
+            ro = cache.get(key)
+            if ro is None:
+                ro = rollout(
+                    env,
+                    policy,
+                    eval=eval,
+                    max_steps=max_steps,
+                    reset_kwargs=reset_kwargs,
+                    no_close=no_close,
+                    stop_on_done=stop_on_done,
+                    seed=seed,
+                    preallocate=preallocate,
+                    check_nan=check_nan,
+                    inference=inference,
+                )
+                cache.put(key, ro)
+            else:
+                # Leave the environment in its initial state with the commanded domain parameters, as if the rollout
+                # had been started. Its final state is not restored.
+                if seed is not None:
+                    pyrado.set_seed(seed)
+                env.reset(**(reset_kwargs or {}))
+            return ro
     # Don't restrain policy type, can be any callable
     if not isinstance(eval, bool):
         raise pyrado.TypeErr(given=eval, expected_type=bool)
@@ -100,6 +245,10 @@ def rollout(
         raise pyrado.TypeErr(given=reset_kwargs, expected_type=dict)
     if not isinstance(render_mode, RenderMode):
         raise pyrado.TypeErr(given=render_mode, expected_type=RenderMode)
+    if inference is not None and isinstance(policy, Policy):
+        inner_policy = getattr(policy, "policy", policy)
+        if policy.is_recurrent or isinstance(inner_policy, (PotentialBasedPolicy, TwoHeadedPolicy)):
+            raise pyrado.ValueErr(msg="A compiled inference function can not replace a recurrent or two-headed policy!")
 
     # Initialize the paths
     obs_hist = []
@@ -162,6 +311,16 @@ def rollout(
     # Initialize animation
     env.render(render_mode, render_step=1)
 
+    # Profiling is only supported by the default loop
+    if (
+        preallocate
+        and not (record_dts or render_mode.video or profiler.enabled)
+        and _supports_preallocation(env, policy)
+    ):
+        return _rollout_preallocated(
+            env, policy, obs, rollout_info, render_mode, render_step, no_close, stop_on_done, check_nan, inference
+        )
+
     # Initialize the main loop variables
     done = False
     t = 0.0  # time starts at zero
@@ -182,52 +341,47 @@ def rollout(
             dt_remainder = t_start - t_post_step
 
         # Check observations
-        if np.isnan(obs).any():
-            env.render(render_mode, render_step=1)
-            raise pyrado.ValueErr(
-                msg=f"At least one observation value is NaN!"
-                + tabulate(
-                    [list(env.obs_space.labels), [*color_validity(obs, np.invert(np.isnan(obs)))]], headers="firstrow"
-                )
-            )
+        if check_nan:
+            _check_nan(env, render_mode, obs, env.obs_space.labels, "observation")
 
         # Get the agent's action
-        obs_to = to.from_numpy(obs).type(to.get_default_dtype())  # policy operates on PyTorch tensors
-        with to.no_grad():
-            if isinstance(policy, Policy):
-                if policy.is_recurrent:
-                    if isinstance(getattr(policy, "policy", policy), TwoHeadedPolicy):
-                        act_to, head_2_to, hidden_next = policy(obs_to, hidden)
+        if inference is not None:
+            # The compiled inference function operates on numpy arrays directly
+            with profiler.section("rollout.policy"):
+                act = inference(obs)
+        else:
+            with profiler.section("rollout.obs_to_tensor"):
+                obs_to = to.from_numpy(obs).type(to.get_default_dtype())  # policy operates on PyTorch tensors
+            with profiler.section("rollout.policy"), to.no_grad():
+                if isinstance(policy, Policy):
+                    if policy.is_recurrent:
+                        if isinstance(getattr(policy, "policy", policy), TwoHeadedPolicy):
+                            act_to, head_2_to, hidden_next = policy(obs_to, hidden)
+                        else:
+                            act_to, hidden_next = policy(obs_to, hidden)
                     else:
-                        act_to, hidden_next = policy(obs_to, hidden)
+                        if isinstance(getattr(policy, "policy", policy), TwoHeadedPolicy):
+                            act_to, head_2_to = policy(obs_to)
+                        else:
+                            act_to = policy(obs_to)
                 else:
-                    if isinstance(getattr(policy, "policy", policy), TwoHeadedPolicy):
-                        act_to, head_2_to = policy(obs_to)
-                    else:
-                        act_to = policy(obs_to)
-            else:
-                # If the policy ist not of type Policy, it should still operate on PyTorch tensors
-                act_to = policy(obs_to)
-
-        act = act_to.detach().cpu().numpy()  # environment operates on numpy arrays
+                    # If the policy ist not of type Policy, it should still operate on PyTorch tensors
+                    act_to = policy(obs_to)
+            with profiler.section("rollout.act_to_numpy"):
+                act = act_to.detach().cpu().numpy()  # environment operates on numpy arrays
 
         # Check actions
-        if np.isnan(act).any():
-            env.render(render_mode, render_step=1)
-            raise pyrado.ValueErr(
-                msg=f"At least one action value is NaN!"
-                + tabulate(
-                    [list(env.act_space.labels), [*color_validity(act, np.invert(np.isnan(act)))]], headers="firstrow"
-                )
-            )
+        if check_nan:
+            _check_nan(env, render_mode, act, env.act_space.labels, "action")
 
         # Record time after the action was calculated
         if record_dts:
             t_post_policy = time.time()
 
         # Ask the environment to perform the simulation step
-        state = env.state.copy()
-        obs_next, rew, done, env_info = env.step(act)
+        with profiler.section("rollout.env_step"):
+            state = env.state.copy()
+            obs_next, rew, done, env_info = env.step(act)
 
         # Record time after the step i.e. the send and receive is completed
         if record_dts:
@@ -323,6 +477,132 @@ def rollout(
     return res
 
 
+def batched_rollout(
+    vec_env: VecSimEnv,
+    policy: Union[nn.Module, Policy, Callable],
+    eval: Optional[bool] = False,
+    max_steps: Optional[int] = None,
+    reset_kwargs: Optional[dict] = None,
+    no_close: Optional[bool] = False,
+    seed: Optional[int] = None,
+) -> List[StepSequence]:
+    """
+    Perform one rollout in every instance of a batch of environments. The policy is evaluated once per time step for
+    all instances, and the environment instances are stepped jointly. The instances which are done are not stepped
+    anymore, while the others continue. The results are equal to calling `rollout()` on every instance.
+
+    .. note::
+        Only feed-forward policies with a single output head are supported, since the policy is called on a batch of
+        observations.
+
+    :param vec_env: batch of environments to use
+    :param policy: policy to determine the next actions given the current observations of all instances
+                   This policy may be wrapped by an exploration strategy.
+    :param eval: pass `False` if the rollout is executed during training, else `True`. Forwarded to PyTorch `Module`.
+    :param max_steps: maximum number of time steps, if `None` the environment's property is used
+    :param reset_kwargs: keyword arguments passed to the batch's reset function, i.e. `init_states` and
+                         `domain_params` with one entry per instance
+    :param no_close: do not close the environment instances after running the rollouts
+    :param seed: seed value for the random number generators, pass `None` for no seeding
+    :return: list of rollouts, one per environment instance
+    """
+    # Check the input
+    if not isinstance(vec_env, VecSimEnv):
+        raise pyrado.TypeErr(given=vec_env, expected_type=VecSimEnv)
+    if not isinstance(eval, bool):
+        raise pyrado.TypeErr(given=eval, expected_type=bool)
+    if not (isinstance(reset_kwargs, dict) or reset_kwargs is None):
+        raise pyrado.TypeErr(given=reset_kwargs, expected_type=dict)
+    if isinstance(policy, Policy) and (
+        policy.is_recurrent or isinstance(getattr(policy, "policy", policy), (TwoHeadedPolicy, PotentialBasedPolicy))
+    ):
+        raise pyrado.TypeErr(msg="Batched rollouts only support non-recurrent policies with a single output head!")
+
+    # Override the number of steps to execute
+    if max_steps is not None:
+        vec_env.max_steps = max_steps
+
+    # Set all rngs' seeds
+    if seed is not None:
+        pyrado.set_seed(seed)
+
+    # Reset the environment instances and pass the kwargs
+    obs = vec_env.reset(**(reset_kwargs if reset_kwargs is not None else {}))
+
+    if isinstance(policy, Policy):
+        # Reset the policy / the exploration strategy
+        policy.reset()
+
+        # Set dropout and batch normalization layers to the right mode
+        if eval:
+            policy.eval()
+        else:
+            policy.train()
+
+    # Setup rollout information
+    rollout_infos = [dict(env_name=vec_env.name, env_spec=vec_env.spec, domain_param=dp) for dp in vec_env.domain_param]
+
+    # Initialize the paths, every entry contains the values of all instances at one time step
+    obs_hist = [obs]
+    act_hist = []
+    rew_hist = []
+    state_hist = [vec_env.states.copy()]
+    env_info_hist = []
+    lengths = np.zeros(vec_env.num_envs, dtype=np.int64)
+    done = vec_env.done
+
+    # Terminate if all instances signal done, the VecSimEnv also keeps track of the time
+    while not done.all():
+        # Check observations
+        if np.isnan(obs[~done]).any():
+            raise pyrado.ValueErr(msg=f"At least one observation value is NaN!")
+
+        # Get the agent's actions for all instances at once
+        obs_to = to.from_numpy(obs).type(to.get_default_dtype())  # policy operates on PyTorch tensors
+        with to.no_grad():
+            act_to = policy(obs_to)
+        act = act_to.detach().cpu().numpy().reshape(vec_env.num_envs, -1)  # environment operates on numpy arrays
+
+        # Check actions
+        if np.isnan(act[~done]).any():
+            raise pyrado.ValueErr(msg=f"At least one action value is NaN!")
+
+        # Ask the environment instances to perform the simulation step
+        lengths[~done] += 1
+        obs, rew, done, env_info = vec_env.step(act)
+
+        # Record data
+        obs_hist.append(obs)
+        act_hist.append(act)
+        rew_hist.append(rew)
+        state_hist.append(vec_env.states.copy())
+        env_info_hist.append(env_info)
+
+    if not no_close:
+        vec_env.close()
+
+    # Split the stacked data into one rollout per instance
+    obs_hist = np.stack(obs_hist, axis=1)
+    act_hist = np.stack(act_hist, axis=1)
+    rew_hist = np.stack(rew_hist, axis=1)
+    state_hist = np.stack(state_hist, axis=1)
+    ros = []
+    for i, length in enumerate(lengths):
+        ros.append(
+            StepSequence(
+                observations=obs_hist[i, : length + 1],
+                actions=act_hist[i, :length],
+                rewards=rew_hist[i, :length],
+                states=state_hist[i, : length + 1],
+                time=np.concatenate([[0.0], np.cumsum(np.full(length, vec_env.dt))]),
+                rollout_info=rollout_infos[i],
+                env_infos=[env_info_hist[t][i] for t in range(length)],
+                complete=True,
+            )
+        )
+    return ros
+
+
 def after_rollout_query(
     env: Env, policy: Policy, rollout: StepSequence
 ) -> Tuple[bool, Optional[np.ndarray], Optional[dict]]:
@@ -0,0 +1,226 @@
+# Copyright (c) 2020, Fabio Muratore, Honda Research Institute Europe GmbH, and
+# Technical University of Darmstadt.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. Neither the name of Fabio Muratore, Honda Research Institute Europe GmbH,
+#    or Technical University of Darmstadt, nor the names of its contributors may
+#    be used to endorse or promote products derived from this software without
+#    specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL FABIO MURATORE, HONDA RESEARCH INSTITUTE EUROPE GMBH,
+# OR TECHNICAL UNIVERSITY OF DARMSTADT BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+# IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import hashlib
+import joblib
+import numpy as np
+import os
+import os.path as osp
+import pickle
+import tempfile
+import torch as to
+import torch.nn as nn
+from collections import OrderedDict
+from copy import deepcopy
+from typing import Optional
+from urllib.parse import quote
+
+import pyrado
+from pyrado.environment_wrappers.action_noise import GaussianActNoiseWrapper
+from pyrado.environment_wrappers.adversarial import AdversarialWrapper
+from pyrado.environment_wrappers.domain_randomization import DomainRandWrapper
+from pyrado.environment_wrappers.observation_noise import GaussianObsNoiseWrapper
+from pyrado.environment_wrappers.utils import inner_env, typed_env
+from pyrado.environments.base import Env
+from pyrado.environments.sim_base import SimEnv
+from pyrado.exploration.stochastic_action import StochasticActionExplStrat
+from pyrado.sampling.step_sequence import StepSequence
+
+
+def _update_hash(h, obj):
+    """
+    Feed an object into a hash in a deterministic way, i.e. independent of the objects' identities.
+
+    :param h: hash object from `hashlib`
+    :param obj: object to add, dicts, lists, tuples, arrays, and tensors are processed recursively or by their content
+    """
+    if isinstance(obj, dict):
+        h.update(b"dict")
+        for k in sorted(obj.keys(), key=str):
+            _update_hash(h, k)
+            _update_hash(h, obj[k])
+    elif isinstance(obj, (list, tuple)):
+        h.update(type(obj).__name__.encode())
+        for o in obj:
+            _update_hash(h, o)
+    elif isinstance(obj, to.Tensor):
+        _update_hash(h, obj.detach().cpu().numpy())
+    elif isinstance(obj, np.ndarray):
+        h.update(f"{obj.dtype}{obj.shape}".encode())
+        h.update(np.ascontiguousarray(obj).tobytes())
+    elif obj is None or isinstance(obj, (bool, int, float, str, np.number)):
+        h.update(repr(obj).encode())
+    else:
+        h.update(pickle.dumps(obj))
+
+
+class RolloutCache:
+    """
+    Content-addressed cache for deterministic rollouts, with a least-recently-used in-memory tier and an optional
+    on-disk tier.
+
+    The key of a rollout is a hash of everything determining it, i.e. the policy's parameters and buffers, the
+    environment's specification and domain parameters, the reset arguments (initial state and domain parameters),
+    the seed, and the arguments of `rollout()` which change the result. Rollouts whose outcome is not determined by
+    these, e.g. with a random initial state, or with noise or domain randomization wrappers and no seed, are not cached.
+
+    .. note::
+        Use this cache only if the rollouts are deterministic given the key, i.e. the environment has no hidden state
+        and the policy is deterministic or seeded. The cached rollouts are copied when they are stored and retrieved.
+
+    Example:
+        cache = RolloutCache(max_size=1000, cache_dir=osp.join(ex_dir, "rollout_cache"))
+        ro = rollout(env, policy, eval=True, reset_kwargs=dict(init_state=init_state), cache=cache)
+    """
+
+    # Wrappers which draw random numbers, the rollouts of environments wrapped with them are only cached if seeded
+    stochastic_wrappers = (GaussianActNoiseWrapper, GaussianObsNoiseWrapper, AdversarialWrapper, DomainRandWrapper)
+
+    def __init__(self, max_size: int = 1000, cache_dir: Optional[str] = None):
+        """
+        Constructor
+
+        :param max_size: maximum number of rollouts in the in-memory tier, the least recently used ones are dropped
+        :param cache_dir: directory for the on-disk tier, pass `None` to only cache in memory
+        """
+        if not isinstance(max_size, int) or max_size < 0:
+            raise pyrado.ValueErr(given=max_size, ge_constraint="0 (int)")
+        if cache_dir is not None and not osp.isdir(cache_dir):
+            raise pyrado.PathErr(given=cache_dir)
+
+        self.max_size = max_size
+        self.cache_dir = cache_dir
+        self._memory = OrderedDict()
+        self.num_hits = 0
+        self.num_misses = 0
+
+    def __len__(self) -> int:
+        """ Get the number of rollouts in the in-memory tier. """
+        return len(self._memory)
+
+    def clear(self):
+        """ Empty the in-memory tier, the on-disk tier is kept. """
+        self._memory.clear()
+
+    @staticmethod
+    def make_key(
+        env: Env,
+        policy,
+        reset_kwargs: Optional[dict],
+        seed: Optional[int],
+        **rollout_kwargs,
+    ) -> Optional[str]:
+        """
+        Compute the key for a rollout.
+
+        :param env: environment to use
+        :param policy: policy to use
+        :param reset_kwargs: keyword arguments passed to environment's reset function
+        :param seed: seed value for the random number generators, can be `None`
+        :param rollout_kwargs: other arguments of `rollout()` which change the result, e.g. `max_steps`
+        :return: key of the rollout, or `None` if the rollout can not be cached because its outcome is not determined
+        """
+        reset_kwargs = reset_kwargs or {}
+        if not isinstance(policy, nn.Module):
+            return None  # arbitrary callables can not be hashed by content
+        if seed is None:
+            if reset_kwargs.get("init_state", None) is None or isinstance(policy, StochasticActionExplStrat):
+                return None  # random initial state or random actions
+            if any(typed_env(env, tp) is not None for tp in RolloutCache.stochastic_wrappers):
+                return None  # random observations, actions, or domain parameters
+        if typed_env(env, DomainRandWrapper) is not None and reset_kwargs.get("domain_param", None) is None:
+            return None  # the domain parameters are drawn in the reset, possibly from a buffer with hidden state
+
+        h = hashlib.sha256()
+        _update_hash(h, policy.state_dict())
+        _update_hash(h, env.name)
+        _update_hash(h, env.spec)
+        _update_hash(h, env.max_steps)
+        if isinstance(inner_env(env), SimEnv):
+            _update_hash(h, env.domain_param)
+        _update_hash(h, reset_kwargs)
+        _update_hash(h, seed)
+        _update_hash(h, rollout_kwargs)
+        return h.hexdigest()
+
+    def get(self, key: str) -> Optional[StepSequence]:
+        """
+        Look up a rollout, first in memory then on disk.
+
+        :param key: key of the rollout, see `make_key()`
+        :return: copy of the cached rollout, or `None` if it is not cached
+        """
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            self.num_hits += 1
+            return deepcopy(self._memory[key])
+
+        if self.cache_dir is not None and osp.isfile(osp.join(self.cache_dir, f"{self._file_name(key)}.pkl")):
+            ro = pyrado.load(None, self._file_name(key), "pkl", self.cache_dir)
+            self._put_memory(key, ro)
+            self.num_hits += 1
+            return deepcopy(ro)
+
+        self.num_misses += 1
+        return None
+
+    def put(self, key: str, ro: StepSequence):
+        """
+        Store a rollout in memory, and on disk if the cache has a directory.
+
+        :param key: key of the rollout, see `make_key()`
+        :param ro: rollout to store
+        """
+        if not isinstance(ro, StepSequence):
+            raise pyrado.TypeErr(given=ro, expected_type=StepSequence)
+
+        ro = deepcopy(ro)
+        self._put_memory(key, ro)
+        if self.cache_dir is not None:
+            # Write to a temporary file first, such that concurrent readers never see a partially written rollout
+            fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=self.cache_dir)
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    joblib.dump(ro, f)
+                os.replace(tmp_path, osp.join(self.cache_dir, f"{self._file_name(key)}.pkl"))
+            except BaseException:
+                if osp.isfile(tmp_path):
+                    os.remove(tmp_path)
+                raise
+
+    @staticmethod
+    def _file_name(key: str) -> str:
+        """ Get the name of a rollout's file, escaping path separators which may occur in custom keys. """
+        return quote(key, safe="")
+
+    def _put_memory(self, key: str, ro: StepSequence):
+        """ Store a rollout in the in-memory tier, and drop the least recently used ones if necessary. """
+        self._memory[key] = ro
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
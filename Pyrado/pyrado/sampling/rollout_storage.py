@@ -0,0 +1,280 @@
+# Copyright (c) 2020, Fabio Muratore, Honda Research Institute Europe GmbH, and
+# Technical University of Darmstadt.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. Neither the name of Fabio Muratore, Honda Research Institute Europe GmbH,
+#    or Technical University of Darmstadt, nor the names of its contributors may
+#    be used to endorse or promote products derived from this software without
+#    specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL FABIO MURATORE, HONDA RESEARCH INSTITUTE EUROPE GMBH,
+# OR TECHNICAL UNIVERSITY OF DARMSTADT BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+# IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Columnar on-disk storage for rollouts, i.e. `StepSequence` objects.
+
+An archive is a directory which holds one raw binary file per data field, containing the concatenated values of all
+stored rollouts, together with the lengths of the rollouts and the meta data. Since the binary files are accessed via
+`np.memmap`, the rollouts can be used without loading the whole archive into memory. New rollouts are appended to the
+end of the binary files.
+"""
+import joblib
+import numpy as np
+import os
+import os.path as osp
+import torch as to
+from typing import Sequence, Union, List, Optional
+from urllib.parse import quote
+
+import pyrado
+from pyrado.sampling.data_format import new_tuple, to_format
+from pyrado.sampling.step_sequence import StepSequence
+
+
+_META_FILE = "meta.pkl"
+_DONE_COLUMN = "__done__"
+
+
+class _Column:
+    """ Description of one data field stored in an archive """
+
+    def __init__(self, dtype: np.dtype, item_shape: tuple, with_after_last: bool):
+        """
+        Constructor
+
+        :param dtype: data type of the stored values
+        :param item_shape: shape of the value for one step
+        :param with_after_last: `True` if there is one more element than the rollout's length (e.g. last observation)
+        """
+        self.dtype = np.dtype(dtype)
+        self.item_shape = tuple(item_shape)
+        self.with_after_last = with_after_last
+
+
+def _flatten_data(value, prefix: str, columns: dict):
+    """
+    Flatten the (nested) value of a data field into columns, and return its structure.
+
+    :param value: value of a data field, i.e. an array, or a dict or tuple of them
+    :param prefix: name of the column for arrays, or prefix of the names for nested values
+    :param columns: dict to store the arrays in by their column name
+    :return: structure of the value with the column names in place of the arrays
+    """
+    if isinstance(value, dict):
+        return {k: _flatten_data(v, f"{prefix}.{k}", columns) for k, v in value.items()}
+    if isinstance(value, tuple):
+        return new_tuple(type(value), (_flatten_data(v, f"{prefix}[{i}]", columns) for i, v in enumerate(value)))
+    if isinstance(value, (np.ndarray, to.Tensor)):
+        value = to_format(value, "numpy")
+        if value.dtype == np.object_:
+            raise pyrado.TypeErr(msg=f"The data field {prefix} holds Python objects, which can not be stored columnar!")
+        if prefix in columns:
+            # E.g. a dict key containing a dot, which clashes with the name of a nested value
+            raise pyrado.KeyErr(msg=f"The column name {prefix} is not unique!")
+        columns[prefix] = value
+        return prefix
+    raise pyrado.TypeErr(given=value, expected_type=[np.ndarray, to.Tensor, dict, tuple])
+
+
+def _unflatten_data(structure, columns: dict):
+    """
+    Reassemble the (nested) value of a data field from its columns.
+
+    :param structure: structure of the value with the column names in place of the arrays
+    :param columns: dict of arrays by their column name
+    :return: value of the data field
+    """
+    if isinstance(structure, dict):
+        return {k: _unflatten_data(v, columns) for k, v in structure.items()}
+    if isinstance(structure, tuple):
+        return new_tuple(type(structure), (_unflatten_data(v, columns) for v in structure))
+    return columns[structure]
+
+
+class RolloutArchive(Sequence[StepSequence]):
+    """
+    Columnar, memory-mapped collection of rollouts on disk.
+
+    Indexing the archive returns a `StepSequence` whose data fields are views into the memory-mapped files, i.e. only
+    the accessed parts are read from disk. Changes to these views are not written back to the archive.
+
+    Example:
+        archive = RolloutArchive(osp.join(ex_dir, "rollouts"))
+        archive.append(ros)
+        rets = [ro.undiscounted_return() for ro in archive]
+        all_rewards = archive.column("rewards")
+    """
+
+    def __init__(self, archive_dir: str):
+        """
+        Constructor
+
+        :param archive_dir: directory of the archive, it is created if it does not exist
+        """
+        if not isinstance(archive_dir, str):
+            raise pyrado.TypeErr(given=archive_dir, expected_type=str)
+
+        self._dir = archive_dir
+        if osp.isfile(osp.join(archive_dir, _META_FILE)):
+            self._meta = joblib.load(osp.join(archive_dir, _META_FILE))
+        else:
+            os.makedirs(archive_dir, exist_ok=True)
+            self._meta = dict(data_format=None, data_names=[], structures={}, columns={}, lengths=[], rollout_infos=[])
+        self._mmaps = {}
+        self._update_bounds()
+
+    @staticmethod
+    def is_archive(archive_dir: str) -> bool:
+        """
+        Check if the given directory contains a rollout archive.
+
+        :param archive_dir: directory to check
+        :return: `True` if the directory contains an archive
+        """
+        return osp.isfile(osp.join(archive_dir, _META_FILE))
+
+    @property
+    def archive_dir(self) -> str:
+        """ Get the archive's directory. """
+        return self._dir
+
+    @property
+    def lengths(self) -> np.ndarray:
+        """ Get the lengths of the stored rollouts. """
+        return np.asarray(self._meta["lengths"], dtype=np.int64)
+
+    @property
+    def column_names(self) -> List[str]:
+        """ Get the names of the stored columns, nested data fields are flattened, e.g. `env_infos.key`. """
+        return [name for name in self._meta["columns"].keys() if name != _DONE_COLUMN]
+
+    def _update_bounds(self):
+        """ Compute the step index where every rollout starts, with one extra entry for the end of the last one. """
+        self._bounds = np.concatenate([[0], np.cumsum(self._meta["lengths"], dtype=np.int64)])
+
+    def _column_file(self, name: str) -> str:
+        """ Get the path to a column's file, escaping characters like path separators which may occur in dict keys. """
+        return osp.join(self._dir, f"{quote(name, safe='[]')}.bin")
+
+    def _num_rows(self, col: _Column) -> int:
+        """ Get the total number of rows of a column, accounting for the entries after the last steps. """
+        return int(self._bounds[-1]) + (len(self) if col.with_after_last else 0)
+
+    def _row_bounds(self, col: _Column, index: int) -> tuple:
+        """ Get the first and the end row of a rollout inside a column. """
+        offset = index if col.with_after_last else 0
+        return int(self._bounds[index]) + offset, int(self._bounds[index + 1]) + offset + int(col.with_after_last)
+
+    def column(self, name: str) -> np.ndarray:
+        """
+        Get the memory-mapped values of one column across all stored rollouts.
+
+        :param name: name of the column, nested data fields are flattened, e.g. `env_infos.key`
+        :return: copy-on-write memory map with the concatenated values of all rollouts
+        """
+        if name not in self._meta["columns"]:
+            raise pyrado.KeyErr(keys=name, container=self._meta["columns"])
+        if name not in self._mmaps:
+            col = self._meta["columns"][name]
+            self._mmaps[name] = np.memmap(
+                self._column_file(name), dtype=col.dtype, mode="c", shape=(self._num_rows(col),) + col.item_shape
+            )
+        return self._mmaps[name]
+
+    def __len__(self) -> int:
+        return len(self._meta["lengths"])
+
+    def __getitem__(self, index: int) -> StepSequence:
+        if not isinstance(index, (int, np.integer)):
+            raise pyrado.TypeErr(given=index, expected_type=int)
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(f"Index {index} is out of range for an archive with {len(self)} rollouts!")
+
+        # Cut the rollout's rows from all columns, this does not read any data
+        columns = {}
+        for name, col in self._meta["columns"].items():
+            first, end = self._row_bounds(col, index)
+            columns[name] = self.column(name)[first:end]
+
+        data = {dn: _unflatten_data(self._meta["structures"][dn], columns) for dn in self._meta["data_names"]}
+        return StepSequence(
+            rollout_info=self._meta["rollout_infos"][index],
+            data_format=self._meta["data_format"],
+            done=columns[_DONE_COLUMN],
+            **data,
+        )
+
+    def append(self, rollouts: Union[StepSequence, Sequence[StepSequence]]):
+        """
+        Append rollouts to the end of the archive. All rollouts need to have the same data fields.
+
+        :param rollouts: one or multiple rollouts
+        """
+        if isinstance(rollouts, StepSequence):
+            rollouts = [rollouts]
+
+        for ro in rollouts:
+            if not isinstance(ro, StepSequence):
+                raise pyrado.TypeErr(given=ro, expected_type=StepSequence)
+
+            # Flatten the rollout's data into columns
+            columns = {_DONE_COLUMN: ro.done}
+            structures = {dn: _flatten_data(ro.get_data_values(dn), dn, columns) for dn in ro.data_names}
+
+            if not self._meta["columns"]:
+                # Define the archive's layout with the first rollout
+                self._meta["data_format"] = ro.data_format
+                self._meta["data_names"] = list(ro.data_names)
+                self._meta["structures"] = structures
+                self._meta["columns"] = {
+                    name: _Column(arr.dtype, arr.shape[1:], arr.shape[0] == ro.length + 1)
+                    for name, arr in columns.items()
+                }
+            elif columns.keys() != self._meta["columns"].keys():
+                raise pyrado.KeyErr(
+                    msg=f"The rollout's data fields {sorted(columns.keys())} do not match the archive's data fields "
+                    f"{sorted(self._meta['columns'].keys())}!"
+                )
+
+            # Check all columns before writing anything to keep the archive consistent
+            for name, arr in columns.items():
+                col = self._meta["columns"][name]
+                if arr.shape != (ro.length + int(col.with_after_last),) + col.item_shape:
+                    raise pyrado.ShapeErr(
+                        msg=f"The shape {arr.shape} of the data field {name} does not match the archive's layout!"
+                    )
+
+            # Append the values behind the stored rows, discarding the leftovers of a previously interrupted append
+            for name, arr in columns.items():
+                col = self._meta["columns"][name]
+                num_bytes = self._num_rows(col) * col.dtype.itemsize * int(np.prod(col.item_shape))
+                with open(self._column_file(name), "r+b" if osp.isfile(self._column_file(name)) else "wb") as f:
+                    f.seek(num_bytes)
+                    f.truncate()
+                    f.write(np.ascontiguousarray(arr, dtype=col.dtype).tobytes())
+
+            self._meta["lengths"].append(ro.length)
+            self._meta["rollout_infos"].append(ro.rollout_info)
+            self._update_bounds()
+
+        # The meta data is written last, thus an interrupted append does not change the archive's content
+        joblib.dump(self._meta, osp.join(self._dir, _META_FILE))
+        self._mmaps.clear()  # the memory maps have to be recreated with the new shapes
@@ -26,16 +26,24 @@
 # ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
 # POSSIBILITY OF SUCH DAMAGE.
 
+import numpy as np
+import os
+import time
+import torch as to
 import traceback
-from copy import deepcopy
+from copy import copy, deepcopy
 
 import torch.multiprocessing as mp
 from enum import Enum, auto
 from queue import Empty
 from time import sleep
 from tqdm import tqdm
+from typing import Optional, Sequence
 
 import pyrado
+from pyrado.logger.step import StepLogger
+from pyrado.sampling.data_format import new_tuple
+from pyrado.sampling.step_sequence import StepSequence
 
 
 class GlobalNamespace:
@@ -50,12 +58,144 @@ _RES_ERROR = "error"
 _RES_FATAL = "fatal"
 
 
-def _pool_worker(from_master, to_master):
+class _ArrayRef:
+    """ Placeholder for an array which has been moved into the shared memory block of a result """
+
+    __slots__ = ("offset", "dtype", "shape", "is_tensor")
+
+    def __init__(self, offset: int, dtype: np.dtype, shape: tuple, is_tensor: bool):
+        self.offset = offset
+        self.dtype = dtype
+        self.shape = shape
+        self.is_tensor = is_tensor
+
+
+# Alignment of the arrays inside a shared memory block in bytes
+_SHM_ALIGNMENT = 64
+
+# Tensor types which have a numpy equivalent and can hence be moved into a shared memory block
+_SHM_TENSOR_DTYPES = (
+    to.bool,
+    to.uint8,
+    to.int8,
+    to.int16,
+    to.int32,
+    to.int64,
+    to.float16,
+    to.float32,
+    to.float64,
+    to.complex64,
+    to.complex128,
+)
+
+
+def _pack_shared(obj):
+    """
+    Move all arrays and tensors contained in the (nested) result into one shared memory block. The step sequences,
+    dicts (keeping their type, e.g. `OrderedDict`), lists, and tuples of the result are rebuilt with descriptors in
+    place of the arrays. Everything else is left untouched and will be pickled as usual.
+
+    .. note::
+        This function is called once for the whole result of an invocation, e.g. all (index, rollout) pairs a worker
+        produced during `run_map()`. Hence, there is one block, i.e. one file descriptor, per worker and call instead
+        of one per rollout.
+
+    :param obj: result of a function invoked on a worker
+    :return: tuple of the shared memory block as uint8 tensor (`None` if there are no arrays) and the result holding
+             the descriptors
+    """
+    arrays = []
+    num_bytes = 0
+
+    def _replace(elem):
+        nonlocal num_bytes
+        if isinstance(elem, StepSequence):
+            packed = StepSequence.__new__(StepSequence)
+            packed.__dict__.update({k: _replace(v) for k, v in elem.__dict__.items()})
+            return packed
+        if isinstance(elem, dict):
+            # Shallow copy to keep the dict's type and attributes, e.g. the default factory of a defaultdict
+            packed = copy(elem)
+            for k, v in elem.items():
+                packed[k] = _replace(v)
+            return packed
+        if isinstance(elem, list):
+            return [_replace(v) for v in elem]
+        if isinstance(elem, tuple):
+            return new_tuple(type(elem), (_replace(v) for v in elem))
+
+        is_tensor = isinstance(elem, to.Tensor) and elem.device.type == "cpu" and not elem.requires_grad
+        if is_tensor and elem.dtype not in _SHM_TENSOR_DTYPES:
+            # There is no numpy equivalent for these tensors (e.g. bfloat16), thus they can not be put into the block
+            raise pyrado.TypeErr(
+                msg=f"Tensors of type {elem.dtype} can not be transferred via shared memory! Convert the tensor, or "
+                f"construct the SamplerPool with shared_memory=False."
+            )
+        if is_tensor or (isinstance(elem, np.ndarray) and not elem.dtype.hasobject):
+            arr = np.ascontiguousarray(elem.numpy() if is_tensor else elem)
+            ref = _ArrayRef(num_bytes, arr.dtype, arr.shape, is_tensor)
+            arrays.append(arr)
+            num_bytes += -(-arr.nbytes // _SHM_ALIGNMENT) * _SHM_ALIGNMENT  # round up
+            return ref
+
+        return elem
+
+    packed_obj = _replace(obj)
+    if not arrays:
+        return None, packed_obj
+
+    # Copy all arrays into one block, only the handle of this block is sent to the master
+    block = to.empty(num_bytes, dtype=to.uint8).share_memory_()
+    buffer = block.numpy()
+    offset = 0
+    for arr in arrays:
+        buffer[offset : offset + arr.nbytes] = arr.reshape(-1).view(np.uint8)
+        offset += -(-arr.nbytes // _SHM_ALIGNMENT) * _SHM_ALIGNMENT
+    return block, packed_obj
+
+
+def _unpack_shared(block: Optional[to.Tensor], packed_obj):
+    """
+    Rebuild a result packed by `_pack_shared`. The arrays and tensors are views into the shared memory block, thus no
+    data is copied.
+
+    :param block: shared memory block as uint8 tensor
+    :param packed_obj: result holding the descriptors
+    :return: result holding the arrays and tensors
+    """
+    if block is None:
+        return packed_obj
+    buffer = block.numpy()
+
+    def _restore(elem):
+        if isinstance(elem, _ArrayRef):
+            num_bytes = elem.dtype.itemsize * int(np.prod(elem.shape))
+            arr = buffer[elem.offset : elem.offset + num_bytes].view(elem.dtype).reshape(elem.shape)
+            return to.from_numpy(arr) if elem.is_tensor else arr
+        if isinstance(elem, StepSequence):
+            elem.__dict__.update({k: _restore(v) for k, v in elem.__dict__.items()})
+            return elem
+        if isinstance(elem, dict):
+            # The dict is the unpickled copy, thus it can be modified in-place which keeps its type
+            for k, v in elem.items():
+                elem[k] = _restore(v)
+            return elem
+        if isinstance(elem, list):
+            return [_restore(v) for v in elem]
+        if isinstance(elem, tuple):
+            return new_tuple(type(elem), (_restore(v) for v in elem))
+        return elem
+
+    return _restore(packed_obj)
+
+
+def _pool_worker(from_master, to_master, shared_memory: bool):
     """
     Two queues: from master and to master
 
     :param from_master: tuple (func, args) or the special _CMD_STOP
     :param to_master: tuple (success, obj), where obj is the result on success=True and an error message on success=False
+    :param shared_memory: if `True`, the results' arrays are sent in a shared memory block, see `_pack_shared()`
     """
     # Use a custom global namespace. This 'trick'
     G = GlobalNamespace()
@@ -73,6 +213,8 @@ def _pool_worker(from_master, to_master):
         # Invoke func
         try:
             res = func(G, *args, **kwargs)
+            if shared_memory:
+                res = _pack_shared(res)
         except Exception:
             msg = traceback.format_exc()
             to_master.put((_RES_ERROR, msg))
@@ -83,6 +225,9 @@ def _pool_worker(from_master, to_master):
             raise
         else:
             to_master.put((_RES_SUCCESS, res))
+        finally:
+            # Do not keep the last result, and thereby its shared memory block, alive while waiting for the next command
+            res = None
 
 
 class _OpState(Enum):
@@ -96,19 +241,22 @@ class _WorkerInfo:
     Internal class managing a single worker process in the sampler pool.
     """
 
-    def __init__(self, num):
+    def __init__(self, num, shared_memory: bool = False):
         self._to_slave = mp.Queue()
         self._from_slave = mp.Queue()
+        self._shared_memory = shared_memory
 
         # Create the process
         self._process = mp.Process(
             target=_pool_worker,
-            args=(self._to_slave, self._from_slave),
+            args=(self._to_slave, self._from_slave, shared_memory),
             name=f"Sampler-Worker-{num}",
         )
         self._process.daemon = True
         # Start it
         self._process.start()
+        # Only the creating process can talk to the worker, e.g. not a process forked from it
+        self._owner_pid = os.getpid()
 
         # Track pending invocations
         self._pending = False
@@ -117,6 +265,10 @@ class _WorkerInfo:
         self._result = None
 
     def invoke_start(self, func, *args, **kwargs):
+        if os.getpid() != self._owner_pid:
+            raise RuntimeError(
+                "The worker belongs to another process! Create a new SamplerPool in every forked process using one."
+            )
         if not self._process.is_alive():
             raise RuntimeError("Worker has terminated")
         if self._pending:
@@ -168,7 +320,7 @@ class _WorkerInfo:
         stat, value = res
 
         if stat == _RES_SUCCESS:
-            return value
+            return _unpack_shared(*value) if self._shared_memory else value
         elif stat == _RES_ERROR:
             raise RuntimeError(f"Caught error in {self._process.name}:\n{value}")
         elif stat == _RES_FATAL:
@@ -177,6 +329,9 @@ class _WorkerInfo:
         raise pyrado.ValueErr(given=stat, eq_constraint="_RES_SUCCESS, _RES_ERROR, or _RES_FATAL")
 
     def stop(self):
+        if os.getpid() != self._owner_pid:
+            # The copy of a pool inherited by a forked process must not stop the original process' workers
+            return
         if self._pending:
             raise RuntimeError("There is still a pending call waiting for completion.")
         # Send stop signal
@@ -222,14 +377,51 @@ def _run_collect(G, counter, run_counter, lock, n, min_runs, func, args, kwargs)
 
 
 def _run_map(G, func, argqueue):
+    """ Worker function for run_map, processing chunks of indexed arguments until the queue is empty """
     result = []
+    busy_time, num_items, num_chunks = 0.0, 0, 0
     while True:
         try:
-            index, arg = argqueue.get(block=False)
+            chunk = argqueue.get(block=False)
         except Empty:
             break
-        result.append((index, func(G, arg)))
-    return result
+        t_start = time.perf_counter()
+        for index, arg in chunk:
+            result.append((index, func(G, arg)))
+        busy_time += time.perf_counter() - t_start
+        num_items += len(chunk)
+        num_chunks += 1
+    return result, dict(busy_time=busy_time, num_items=num_items, num_chunks=num_chunks)
+
+
+def _make_chunks(costs: np.ndarray, num_workers: int, adaptive: bool) -> list:
+    """
+    Split the (sorted) argument indices into chunks. With adaptive chunking, every chunk gets approximately half of the
+    remaining expected cost per worker (guided self-scheduling), i.e. the chunks get smaller towards the end such that
+    the workers finish at approximately the same time while the queue overhead for many cheap tasks is reduced.
+
+    :param costs: expected costs of the arguments in the order of processing
+    :param num_workers: number of workers
+    :param adaptive: if `True` create chunks of decreasing size, else one chunk per argument
+    :return: list of chunks, each being a list of positions in `costs`
+    """
+    if not adaptive:
+        return [[i] for i in range(len(costs))]
+
+    chunks = []
+    remaining_cost = float(np.sum(costs))
+    start = 0
+    while start < len(costs):
+        target = remaining_cost / (2 * num_workers)
+        end = start + 1  # at least one argument per chunk
+        chunk_cost = costs[start]
+        while end < len(costs) and chunk_cost + costs[end] <= target:
+            chunk_cost += costs[end]
+            end += 1
+        chunks.append(list(range(start, end)))
+        remaining_cost -= chunk_cost
+        start = end
+    return chunks
 
 
 class SamplerPool:
@@ -244,9 +436,20 @@ class SamplerPool:
 
     This class also contains additional methods to call a function exactly once in each worker, to setup worker-local
     state.
+
+    Optionally, the workers send the arrays of their results, e.g. the data of the sampled rollouts, in one shared
+    memory block per worker and call. Then, only the block's handle and small descriptors are pickled, and the master
+    process rebuilds the results with views into the shared memory.
     """
 
-    def __init__(self, num_threads: int):
+    def __init__(self, num_threads: int, shared_memory: bool = False):
+        """
+        Constructor
+
+        :param num_threads: number of parallel worker processes
+        :param shared_memory: if `True`, the results' arrays and tensors are transferred via shared memory instead of
+                              being pickled. This pays off for large results, e.g. many or long rollouts.
+        """
         if not isinstance(num_threads, int):
             raise pyrado.TypeErr(given=num_threads, expected_type=int)
         if num_threads < 1:
@@ -255,9 +458,11 @@ class SamplerPool:
         self._n_threads = num_threads
         if num_threads > 1:
             # Create workers
-            self._workers = [_WorkerInfo(i + 1) for i in range(num_threads)]
+            self._workers = [_WorkerInfo(i + 1, shared_memory) for i in range(num_threads)]
             self._manager = mp.Manager()
+        self._shared_memory = shared_memory
         self._G = GlobalNamespace()
+        self._utilization_stats = []
 
     def stop(self):
         """ Terminate all workers. """
@@ -316,20 +521,47 @@ class SamplerPool:
         # Await results
         return self._await_result()
 
-    def run_map(self, func, arglist: list, progressbar: tqdm = None):
+    def run_map(
+        self,
+        func,
+        arglist: list,
+        progressbar: tqdm = None,
+        adaptive_chunks: bool = False,
+        expected_costs: Optional[Sequence[float]] = None,
+    ):
         """
         A parallel version of `[func(G, arg) for arg in arglist]`.
         There is no deterministic assignment of workers to arglist elements. Optionally runs with progress bar.
 
+        The arguments are distributed through a queue from which the idle workers fetch the next chunk. If the expected
+        costs are given, e.g. the lengths of previous rollouts with the same domain parameters, the most expensive
+        arguments are processed first (longest processing time first), which reduces the time the other workers wait
+        for the last ones. The workers' utilization during the last call is available via `utilization_stats`.
+
         :param func: mapper function, must be pickleable
         :param arglist: list of function args
         :param progressbar: optional progress bar from the `tqdm` library
+        :param adaptive_chunks: if `True`, the arguments are sent in chunks of decreasing size, see `_make_chunks()`.
+                                Use this for many cheap function calls. By default, every argument is sent separately.
+        :param expected_costs: expected computational cost for every argument, pass `None` to assume equal costs
         :return: list of results
         """
+        if expected_costs is None:
+            costs = np.ones(len(arglist))
+            order = np.arange(len(arglist))
+        else:
+            if not len(expected_costs) == len(arglist):
+                raise pyrado.ShapeErr(given=expected_costs, expected_match=arglist)
+            costs = np.asarray(expected_costs, dtype=np.float64)
+            order = np.argsort(-costs, kind="stable")  # most expensive first
+            costs = costs[order]
+
         # Set max on progress bar
         if progressbar is not None:
             progressbar.total = len(arglist)
 
+        t_start = time.perf_counter()
+
         # Single thread optimization
         if self._n_threads == 1:
             res = []
@@ -337,28 +569,37 @@ class SamplerPool:
                 res.append(func(self._G, deepcopy(arg)))  # numpy arrays and others are passed by reference
                 if progressbar:
                     progressbar.update(1)
+            duration = time.perf_counter() - t_start
+            self._set_utilization_stats(duration, [dict(busy_time=duration, num_items=len(arglist), num_chunks=1)])
             return res
 
+        # Group the indexed args into chunks, the original argument index is needed to restore the order later
+        chunks = [
+            [(int(order[i]), arglist[int(order[i])]) for i in pos]
+            for pos in _make_chunks(costs, self._n_threads, adaptive_chunks)
+        ]
+
         # Put args into a parallel queue
-        argqueue = self._manager.Queue(maxsize=len(arglist))
+        argqueue = self._manager.Queue(maxsize=len(chunks))
 
         # Fill the queue, must be done fist to avoid race conditions
-        # Add the original argument index to be able to restore it later
-        for indexedArg in enumerate(arglist):
-            argqueue.put(indexedArg)
+        for chunk in chunks:
+            argqueue.put(chunk)
 
         # Start workers
         self._start(_run_map, func, argqueue)
 
         # show progress bar if any
         if progressbar is not None:
+            # Number of arguments in the last chunks, since the queue is processed in order
+            num_args_in_last_chunks = np.cumsum([len(chunk) for chunk in reversed(chunks)])
             while self._operation_in_progress():
                 # Retrieve number of remaining jobs
                 remaining = argqueue.qsize()
                 if remaining == 0:
                     break
 
-                done = len(arglist) - remaining
+                done = len(arglist) - int(num_args_in_last_chunks[remaining - 1])
 
                 # Update progress (need to subtract since it's incremental)
                 progressbar.update(done - progressbar.n)
@@ -366,11 +607,49 @@ class SamplerPool:
 
         # Collect results in one list
         allres = self._await_result()
-        result = [item for res in allres for item in res]
+        self._set_utilization_stats(time.perf_counter() - t_start, [stats for _, stats in allres])
+        result = [item for res, _ in allres for item in res]
         # Sort results by index to ensure consistent order with args
         result.sort(key=lambda t: t[0])
         return [item for _, item in result]
 
+    def _set_utilization_stats(self, duration: float, worker_stats: Sequence[dict]):
+        """ Store the workers' statistics of the last `run_map()` call, adding their utilization. """
+        for stats in worker_stats:
+            stats["utilization"] = stats["busy_time"] / duration if duration > 0 else 1.0
+        self._utilization_stats = list(worker_stats)
+
+    @property
+    def num_threads(self) -> int:
+        """ Get the number of workers, for 1 all work is done in the main process. """
+        return self._n_threads
+
+    @property
+    def shared_memory(self) -> bool:
+        """ Get the flag if the results are transferred via shared memory. """
+        return self._shared_memory
+
+    @property
+    def utilization_stats(self) -> Sequence[dict]:
+        """
+        Get the statistics of every worker during the last `run_map()` call, i.e. the time spent in the mapped function,
+        the numbers of processed arguments and chunks, and the utilization which is the ratio of the busy time and the
+        call's total duration.
+        """
+        return self._utilization_stats
+
+    def log_utilization(self, logger: StepLogger, prefix: str = "pool"):
+        """
+        Add the summary of the workers' utilization during the last `run_map()` call to the given logger.
+
+        :param logger: step logger to record the values with
+        :param prefix: prefix of the logged keys
+        """
+        util = [stats["utilization"] for stats in self._utilization_stats] or [0.0]
+        logger.add_value(f"{prefix} min util", min(util), 3)
+        logger.add_value(f"{prefix} avg util", float(np.mean(util)), 3)
+        logger.add_value(f"{prefix} max num items", max([s["num_items"] for s in self._utilization_stats] or [0]))
+
     def run_collect(self, n, func, *args, collect_progressbar: tqdm = None, min_runs=None, **kwargs) -> tuple:
         """
         Collect at least n samples from func, where the number of samples per run can vary.
@@ -28,6 +28,7 @@
 
 import numpy as np
 import os
+import pickle
 import torch as to
 from abc import ABC, abstractmethod
 from init_args_serializer import Serializable
@@ -44,6 +45,7 @@ from pyrado.environments.sim_base import SimEnv
 from pyrado.policies.base import Policy
 from pyrado.policies.special.time import PlaybackPolicy
 from pyrado.sampling.rollout import rollout
+from pyrado.sampling.sampler_pool import SamplerPool
 from pyrado.sampling.step_sequence import StepSequence
 from pyrado.spaces import BoxSpace
 from pyrado.utils.checks import check_act_equal
@@ -133,6 +135,131 @@ class RolloutSamplerForSBI(ABC, Serializable):
         return spec.state_space.flat_dim + spec.act_space.flat_dim
 
 
+def _sbi_sim_init(
+    G,
+    env: bytes,
+    policy: bytes,
+    dp_names: List[str],
+    requires_target_domain_data: bool,
+    rollouts_real: Optional[List[StepSequence]],
+    num_segments: Optional[int],
+    len_segments: Optional[int],
+):
+    """ Store pickled (and thus copied) environment and policy, and the segments of the target domain rollouts. """
+    G.env = pickle.loads(env)
+    G.dp_names = dp_names
+    G.requires_target_domain_data = requires_target_domain_data
+    G.shared_state = None
+    G.shared_version = None
+
+    if rollouts_real is None:
+        # There are no pre-recorded rollouts, e.g. during _setup_sbi() in LFI.__init__()
+        G.policy = pickle.loads(policy)
+        G.segs_real = None
+        return
+
+    # Create a policy that simply replays the recorded actions
+    G.policy = PlaybackPolicy(G.env.spec, [ro.actions for ro in rollouts_real], no_reset=True)
+
+    # The initial states will be set to states which will most likely not the be in the initial state space of
+    # the environment, thus we set the initial state space to an infinite space
+    G.env.init_space = BoxSpace(-pyrado.inf, pyrado.inf, G.env.state_space.shape, labels=G.env.state_space.labels)
+
+    # Split the target domain rollouts if desired
+    G.segs_real = []
+    for ro_real in rollouts_real:
+        ro_real.numpy()
+        if num_segments is not None:
+            G.segs_real.append(list(ro_real.split_ordered_batches(num_batches=num_segments)))
+        else:
+            G.segs_real.append(list(ro_real.split_ordered_batches(batch_size=len_segments)))
+
+
+def _sbi_sim_init_shared_state(G, shared_state: dict, shared_version: to.Tensor):
+    """ Store the references to the policy's state in shared memory, and to its version counter. """
+    G.shared_state = shared_state
+    G.shared_version = shared_version
+    G.policy_version = None  # force loading the state before the next rollout
+
+
+def _sbi_sim_sync_policy(G):
+    """ Load the policy's state from shared memory if the master process has changed it since the last rollout. """
+    if G.shared_version is None:
+        return
+    version = int(G.shared_version.item())
+    if version != G.policy_version:
+        G.policy.load_state_dict(G.shared_state)
+        G.policy_version = version
+
+
+def _sbi_sim_one(G, dp_value: np.ndarray) -> to.Tensor:
+    """
+    Simulate one domain parameter set. If there are target domain rollouts, they are replayed in segments, and the
+    simulation state is set to the current state in the target domain rollout at the beginning of every segment.
+
+    :param G: worker-local namespace, see `_sbi_sim_init()`
+    :param dp_value: one set of domain parameters
+    :return: time series data of shape [num_rollouts, len_time_series, dim_data] if there are target domain rollouts,
+             else of shape [len_time_series, dim_data]
+    """
+    domain_param = dict(zip(G.dp_names, dp_value))
+
+    if G.segs_real is None:
+        _sbi_sim_sync_policy(G)
+        ro_sim = rollout(G.env, G.policy, eval=True, reset_kwargs=dict(domain_param=domain_param), stop_on_done=False)
+        # _check_domain_params(ro_sim, dp_value, G.dp_names)
+
+        # Concatenate states and actions of the simulated segments
+        data_one_seg = np.concatenate([ro_sim.states[:-1, :], ro_sim.actions], axis=1)
+        if G.requires_target_domain_data:
+            data_one_seg = np.concatenate([data_one_seg, data_one_seg], axis=1)
+        return to.from_numpy(data_one_seg).to(dtype=to.get_default_dtype())
+
+    data_sim_one_dp = []  # for all target domain rollouts of one domain parameter set
+
+    # Iterate over target domain rollouts
+    for idx_r, segs_real in enumerate(G.segs_real):
+        data_one_ro = []
+
+        # Iterate over segments of one target domain rollout
+        cnt_step = 0
+        for seg_real in segs_real:
+            # Disabled the policy reset of PlaybackPolicy to do it here manually
+            G.policy.curr_rec = idx_r
+            G.policy.curr_step = cnt_step
+
+            # Do the rollout for a segment
+            seg_sim = rollout(
+                G.env,
+                G.policy,
+                eval=True,
+                reset_kwargs=dict(init_state=seg_real.states[0, :], domain_param=domain_param),
+                stop_on_done=False,
+                max_steps=seg_real.length,
+            )
+            check_act_equal(seg_real, seg_sim)
+            # _check_domain_params(seg_sim, dp_value, G.dp_names)
+
+            # Increase step counter for next segment
+            cnt_step += seg_real.length
+
+            # Concatenate states and actions of the simulated and real segments
+            data_one_seg = np.concatenate(
+                [seg_sim.states[: len(seg_real), :], seg_sim.actions[: len(seg_real), :]], axis=1
+            )
+            if G.requires_target_domain_data:
+                # The embedding is also using target domain data (the case for DTW distance)
+                data_one_seg_real = np.concatenate([seg_real.states[: len(seg_real), :], seg_real.actions], axis=1)
+                data_one_seg = np.concatenate([data_one_seg, data_one_seg_real], axis=1)
+            data_one_seg = to.from_numpy(data_one_seg).to(dtype=to.get_default_dtype())
+            data_one_ro.append(data_one_seg)
+
+        # Append one simulated rollout
+        data_sim_one_dp.append(to.cat(data_one_ro, dim=0))
+
+    return to.stack(data_sim_one_dp, dim=0)
+
+
 class SimRolloutSamplerForSBI(RolloutSamplerForSBI, Serializable):
     """ Wrapper to make SimuRLacra's simulation environments usable as simulators for the sbi package """
 
@@ -145,6 +272,7 @@ class SimRolloutSamplerForSBI(RolloutSamplerForSBI, Serializable):
         num_segments: int = None,
         len_segments: int = None,
         rollouts_real: Optional[List[StepSequence]] = None,
+        num_workers: int = 1,
     ):
         """
         Constructor
@@ -160,6 +288,11 @@ class SimRolloutSamplerForSBI(RolloutSamplerForSBI, Serializable):
         :param len_segments: length of the segments in which the rollouts are split into. For every segment, the initial
                             state of the simulation is reset, and thus for every set the features of the trajectories
                             are computed separately. Either specify `num_segments` or `len_segments`.
+        :param rollouts_real: list of rollouts recorded from the target domain, which are used to sync the simulations'
+                              initial states
+        :param num_workers: number of parallel processes simulating the domain parameter sets of one batch. If this
+                            is larger than 1, use sbi's `simulate_for_sbi()` with `num_workers=1` and a large
+                            `simulation_batch_size` to avoid nested process pools.
         """
         if typed_env(env, DomainRandWrapper):
             raise pyrado.TypeErr(
@@ -181,86 +314,65 @@ class SimRolloutSamplerForSBI(RolloutSamplerForSBI, Serializable):
         self.dp_names = dp_mapping.values()
         self.rollouts_real = rollouts_real
 
+        # Distribute the environment, the policy, and the target domain rollouts. We use pickle to make sure a copy is
+        # created for num_workers = 1, since the workers modify the environment's initial state space.
+        self._pool = SamplerPool(num_workers)
+        self._pool.invoke_all(
+            _sbi_sim_init,
+            pickle.dumps(self._env),
+            pickle.dumps(self._policy),
+            list(self.dp_names),
+            self._embedding.requires_target_domain_data,
+            self.rollouts_real,
+            self.num_segments,
+            self.len_segments,
+        )
+        if self.rollouts_real is None:
+            # The workers roll out the policy itself, which is trained between the calls, e.g. in BayesSim
+            self._init_shared_state()
+
+    def _init_shared_state(self):
+        """
+        Create a copy of the policy's state in shared memory, and distribute the references to it to the workers.
+        The workers keep them and load the state from there whenever the version counter has changed.
+        """
+        self._shared_state = {k: v.detach().cpu().clone().share_memory_() for k, v in self._policy.state_dict().items()}
+        self._shared_version = to.zeros(1, dtype=to.int64).share_memory_()
+        self._pool.invoke_all(_sbi_sim_init_shared_state, self._shared_state, self._shared_version)
+
+    def _update_shared_state(self):
+        """ Write the policy's current state into shared memory, and increase the version counter if it changed. """
+        changed = False
+        for k, v in self._policy.state_dict().items():
+            if not to.equal(self._shared_state[k], v.detach().cpu()):
+                self._shared_state[k].copy_(v.detach())
+                changed = True
+        if changed:
+            self._shared_version += 1
+
+    def stop(self):
+        """ Terminate the worker processes. Call this before discarding the sampler. """
+        self._pool.stop()
+
     def __call__(self, dp_values: to.Tensor) -> to.Tensor:
         """
         Run one rollout for every domain parameter set. The rollouts are done in segments, and after every segment the
-        simulation state is set to the current state in the target domain rollout.
+        simulation state is set to the current state in the target domain rollout. The domain parameter sets are
+        distributed among the workers.
 
         :param dp_values: tensor containing domain parameters along the 1st dimension
         :return: features computed from the time series data
         """
         dp_values = to.atleast_2d(dp_values).numpy()
 
-        if self.rollouts_real is not None:
-            # Create a policy that simply replays the recorded actions
-            policy = PlaybackPolicy(self._env.spec, [ro.actions for ro in self.rollouts_real], no_reset=True)
-
-            # The initial states will be set to states which will most likely not the be in the initial state space of
-            # the environment, thus we set the initial state space to an infinite space
-            self._env.init_space = BoxSpace(
-                -pyrado.inf, pyrado.inf, self._env.state_space.shape, labels=self._env.state_space.labels
-            )
+        # Update policy's state, the workers read it from shared memory before their next rollout
+        if self.rollouts_real is None:
+            self._update_shared_state()
 
-            data_sim_all = []  # for all target domain rollouts
-
-            # Iterate over domain parameter sets
-            for dp_value in dp_values:
-                data_sim_one_dp = []  # for all target domain rollouts of one domain parameter set
-
-                # Iterate over target domain rollouts
-                for idx_r, ro_real in enumerate(self.rollouts_real):
-                    data_one_ro = []
-                    ro_real.numpy()
-
-                    # Split the target domain rollout if desired
-                    if self.num_segments is not None:
-                        segs_real = list(ro_real.split_ordered_batches(num_batches=self.num_segments))
-                    else:
-                        segs_real = list(ro_real.split_ordered_batches(batch_size=self.len_segments))
-
-                    # Iterate over segments of one target domain rollout
-                    cnt_step = 0
-                    for seg_real in segs_real:
-                        # Disabled the policy reset of PlaybackPolicy to do it here manually
-                        policy.curr_rec = idx_r
-                        policy.curr_step = cnt_step
-
-                        # Do the rollout for a segment
-                        seg_sim = rollout(
-                            self._env,
-                            policy,
-                            eval=True,
-                            reset_kwargs=dict(
-                                init_state=seg_real.states[0, :], domain_param=dict(zip(self.dp_names, dp_value))
-                            ),
-                            stop_on_done=False,
-                            max_steps=seg_real.length,
-                        )
-                        check_act_equal(seg_real, seg_sim)
-                        # _check_domain_params(seg_sim, dp_value, self.dp_names)
-
-                        # Increase step counter for next segment
-                        cnt_step += seg_real.length
-
-                        # Concatenate states and actions of the simulated and real segments
-                        data_one_seg = np.concatenate(
-                            [seg_sim.states[: len(seg_real), :], seg_sim.actions[: len(seg_real), :]], axis=1
-                        )
-                        if self._embedding.requires_target_domain_data:
-                            # The embedding is also using target domain data (the case for DTW distance)
-                            data_one_seg_real = np.concatenate(
-                                [seg_real.states[: len(seg_real), :], seg_real.actions], axis=1
-                            )
-                            data_one_seg = np.concatenate([data_one_seg, data_one_seg_real], axis=1)
-                        data_one_seg = to.from_numpy(data_one_seg).to(dtype=to.get_default_dtype())
-                        data_one_ro.append(data_one_seg)
-
-                    # Append one simulated rollout
-                    data_sim_one_dp.append(to.cat(data_one_ro, dim=0))
-
-                # Append the segments of all target domain rollouts for the current domain parameter
-                data_sim_all.append(to.stack(data_sim_one_dp, dim=0))
+        # Simulate all domain parameter sets in parallel
+        data_sim_all = self._pool.run_map(_sbi_sim_one, list(dp_values))
 
+        if self.rollouts_real is not None:
             # Compute the features from all time series
             data_sim_all = to.stack(data_sim_all, dim=0)  # shape [batch_size, num_rollouts, len_time_series, dim_data]
             data_sim_all = self._embedding(Embedding.pack(data_sim_all))
@@ -273,28 +385,6 @@ class SimRolloutSamplerForSBI(RolloutSamplerForSBI, Serializable):
                 )
 
         else:
-            # There are no pre-recorded rollouts, e.g. during _setup_sbi() in LFI.__init__()
-            policy = self._policy
-
-            # Do the rollouts
-            data_sim_all = []
-            for dp_value in dp_values:
-                ro_sim = rollout(
-                    self._env,
-                    policy,
-                    eval=True,
-                    reset_kwargs=dict(domain_param=dict(zip(self.dp_names, dp_value))),
-                    stop_on_done=False,
-                )
-                # _check_domain_params(ro_sim, dp_value, self.dp_names)
-
-                # Concatenate states and actions of the simulated segments
-                data_one_seg = np.concatenate([ro_sim.states[:-1, :], ro_sim.actions], axis=1)
-                if self._embedding.requires_target_domain_data:
-                    data_one_seg = np.concatenate([data_one_seg, data_one_seg], axis=1)
-                data_one_seg = to.from_numpy(data_one_seg).to(dtype=to.get_default_dtype())
-                data_sim_all.append(data_one_seg)
-
             # Compute the features from all time series
             data_sim_all = to.stack(data_sim_all, dim=0)
             data_sim_all = data_sim_all.unsqueeze(1)  # equivalent to only one target domain rollout
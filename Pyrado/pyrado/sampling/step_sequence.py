@@ -864,6 +864,26 @@ def discounted_reverse_cumsum(data, gamma: float):
     return signal.lfilter([1], [1, -gamma], data[::-1], axis=0)[::-1]
 
 
+def discounted_reverse_cumsum_segments(data, gamma: float, done: np.ndarray):
+    """
+    Compute the reverse discounted cumulative sum separately for every segment of the data. A segment ends at every
+    step which is marked as done, and the sums are not propagated across the segments' borders.
+
+    :param data: input data with samples along the 0 axis (e.g. time series of concatenated rollouts)
+    :param gamma: discount factor
+    :param done: boolean ndarray, specifying for each sample whether it ends a segment
+    :return: cumulative sums for every step
+    """
+    data = np.asarray(data)
+    done = np.asarray(done, dtype=np.bool_)
+    if not done.shape[0] == data.shape[0]:
+        raise pyrado.ShapeErr(given=done, expected_match=data)
+
+    # The first index of every segment except the first one
+    seg_starts = np.flatnonzero(done[:-1]) + 1
+    return np.concatenate([discounted_reverse_cumsum(seg, gamma) for seg in np.split(data, seg_starts)], axis=0)
+
+
 def discounted_value(rollout: StepSequence, gamma: float):
     """
     Compute the discounted state values for one rollout.
@@ -872,8 +892,8 @@ def discounted_value(rollout: StepSequence, gamma: float):
     :param gamma: temporal discount factor
     :return: state values for every time step in the rollout
     """
-    rewards = [step.reward for step in rollout]
-    return discounted_reverse_cumsum(rewards, gamma)
+    rewards = to_format(rollout.rewards, "numpy")
+    return discounted_reverse_cumsum_segments(rewards, gamma, rollout.done)
 
 
 def discounted_values(rollouts: Sequence[StepSequence], gamma: float, data_format: Optional[str] = "torch"):
@@ -885,13 +905,19 @@ def discounted_values(rollouts: Sequence[StepSequence], gamma: float, data_forma
     :param data_format: data format of the given
     :return: state values for every time step in the rollouts (concatenated sequence across rollouts)
     """
+    if data_format not in ["torch", "numpy"]:
+        raise pyrado.ValueErr(given=data_format, eq_constraint="'torch' or 'numpy'")
+
+    # Process all rollouts at once, cutting the sums at the rollouts' ends as well as at every done step within them
+    rewards = np.concatenate([to_format(ro.rewards, "numpy") for ro in rollouts])
+    done = np.concatenate([ro.done for ro in rollouts])
+    done[np.cumsum([ro.length for ro in rollouts]) - 1] = True
+    values = discounted_reverse_cumsum_segments(rewards, gamma, done)
+
     if data_format == "torch":
-        # The ndarray.copy() is necessary due to (currently) unsupported negative strides
-        return to.cat([to.from_numpy(discounted_value(ro, gamma).copy()).to(to.get_default_dtype()) for ro in rollouts])
-    elif data_format == "numpy":
-        raise np.array([discounted_value(ro, gamma) for ro in rollouts])
+        return to.from_numpy(values).to(to.get_default_dtype())
     else:
-        raise pyrado.ValueErr(given=data_format, eq_constraint="'torch' or 'numpy'")
+        return values
 
 
 def gae_returns(rollout: StepSequence, gamma: float = 0.99, lamb: float = 0.95):
@@ -907,13 +933,12 @@ def gae_returns(rollout: StepSequence, gamma: float = 0.99, lamb: float = 0.95):
     :param lamb: discount factor
     :return: estimated advantage
     """
+    values = to_format(rollout.get_data_values("values"), "numpy")
 
-    def _next_value(step: Step) -> float:
-        """ Helper to return `next_value = 0` for last step """
-        if step.done:
-            return 0.0
-        return step.next_value
+    # The next value is 0 for the last step of every segment
+    next_values = np.zeros_like(values[: rollout.length])
+    next_values[: values.shape[0] - 1] = values[1 : rollout.length + 1]
+    next_values[rollout.done] = 0.0
 
-    deltas = [step.reward + gamma * _next_value(step) - step.value for step in rollout]
-    cumsum = discounted_reverse_cumsum(deltas, gamma * lamb)
-    return cumsum
+    deltas = to_format(rollout.rewards, "numpy") + gamma * next_values - values[: rollout.length]
+    return discounted_reverse_cumsum_segments(deltas, gamma * lamb, rollout.done)
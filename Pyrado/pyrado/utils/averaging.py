@@ -90,7 +90,10 @@ class RunningExpDecayingAverage:
 
 
 class RunningMemoryAverage:
-    """ Implementation of an estimator that computes the average for a memorized buffer """
+    """
+    Implementation of an estimator that computes the average for a memorized buffer. The memory is a circular buffer of
+    fixed size, and the average is updated using a running sum, thus every call has constant cost.
+    """
 
     def __init__(self, capacity: int):
         """
@@ -101,19 +104,34 @@ class RunningMemoryAverage:
         if not 1 <= capacity:
             raise pyrado.ValueErr(given=capacity, ge_constraint="1")
         self.capacity = capacity
-        self._memory = None
+        self._buffer = None
+        self._sum = None
+        self._pos = 0  # index in the buffer to write the next data point to
+        self._size = 0  # number of valid data points in the buffer
+        self._cnt_since_sum = 0  # number of running sum updates since the last recomputation
 
     @property
     def memory(self) -> [np.ndarray, to.Tensor, None]:
-        return self._memory
+        """ Get the memorized data in chronological order, i.e. the most recent data point is the last row. """
+        if self._buffer is None:
+            return None
+        if self._size < self.capacity:
+            return self._buffer[: self._size]
+        if isinstance(self._buffer, np.ndarray):
+            return np.concatenate([self._buffer[self._pos :], self._buffer[: self._pos]], axis=0)
+        return to.cat([self._buffer[self._pos :], self._buffer[: self._pos]], dim=0)
 
     def reset(self, capacity: float = None):
         """ Reset internal variables. """
         if capacity is not None:
             if not 1 <= capacity:
                 raise pyrado.ValueErr(given=capacity, ge_constraint="1")
-        self.capacity = capacity
-        self._memory = None
+            self.capacity = capacity
+        self._buffer = None
+        self._sum = None
+        self._pos = 0
+        self._size = 0
+        self._cnt_since_sum = 0
 
     def __call__(self, data: [np.ndarray, to.Tensor]) -> [np.ndarray, to.Tensor]:
         """
@@ -126,34 +144,135 @@ class RunningMemoryAverage:
             raise pyrado.ShapeErr(msg="RunningMemoryAverage only supports scalars and vectors")
 
         if isinstance(data, np.ndarray):
-            # Format new data
-            new = data.copy().reshape(1, data.size)
+            new = data.reshape(-1)
+            if self._buffer is None:
+                self._buffer = np.zeros((self.capacity, new.size), dtype=np.result_type(new.dtype, np.float64))
+                self._sum = np.zeros(new.size, dtype=self._buffer.dtype)
 
-            if self._memory is None:
-                self._memory = new
-            else:
-                self._memory = np.concatenate([self._memory, new], axis=0)
+        elif isinstance(data, to.Tensor):
+            new = data.detach().reshape(-1)
+            if self._buffer is None:
+                dtype = new.dtype if new.is_floating_point() else to.get_default_dtype()
+                self._buffer = to.zeros((self.capacity, new.numel()), dtype=dtype, device=new.device)
+                self._sum = to.zeros(new.numel(), dtype=dtype, device=new.device)
 
-            # Drop surplus
-            self._memory = self._memory[-self.capacity :]
+        else:
+            raise pyrado.TypeErr(given=data, expected_type=[np.ndarray, to.Tensor])
 
-            # Return current estimate
-            return np.mean(self._memory, axis=0)
+        if not new.shape[0] == self._buffer.shape[1]:
+            raise pyrado.ShapeErr(given=new, expected_match=self._buffer[0])
 
-        elif isinstance(data, to.Tensor):
-            # Format new data
-            new = data.clone().view(1, to.prod(to.tensor(data.size())))
+        # Replace the oldest entry, and update the running sum accordingly
+        if self._size == self.capacity:
+            self._sum -= self._buffer[self._pos]
+        self._buffer[self._pos] = new
+        self._sum += self._buffer[self._pos]
+        self._pos = (self._pos + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
 
-            if self._memory is None:
-                self._memory = new
-            else:
-                self._memory = to.cat([self._memory, new], dim=0)
+        # Recompute the sum once in a while to prevent the accumulation of floating point errors
+        self._cnt_since_sum += 1
+        if self._cnt_since_sum >= self.capacity:
+            self._sum = self._buffer[: self._size].sum(0)
+            self._cnt_since_sum = 0
 
-            # Drop surplus
-            self._memory = self._memory[-self.capacity :]
+        # Return current estimate
+        return self._sum / self._size
 
-            # Return current estimate
-            return to.mean(self._memory, dim=0)
+
+class RunningMoments:
+    """
+    Numerically stable estimator of the running mean and variance (Welford's algorithm). New data can be added in
+    batches, and the moments of multiple estimators can be merged, e.g. the ones computed by different workers, without
+    the need for the raw data.
+
+    .. seealso::
+        [1] T.F. Chan, G.H. Golub, R.J. LeVeque, "Updating Formulae and a Pairwise Algorithm for Computing Sample
+            Variances", Technical Report, 1979
+    """
+
+    def __init__(self):
+        """ Constructor """
+        self.count = 0
+        self.mean = None
+        self.sum_sq_diffs = None  # a.k.a M2
+
+    def reset(self):
+        """ Reset internal variables. """
+        self.count = 0
+        self.mean = None
+        self.sum_sq_diffs = None
+
+    def __repr__(self):
+        return (
+            f"RunningMoments ID: {id(self)}\n"
+            f"mean: {self.mean}\nss_diffs: {self.sum_sq_diffs}\ncount: {self.count}"
+        )
+
+    @property
+    def var(self) -> [np.ndarray, to.Tensor, None]:
+        """ Get the unbiased sample variance, which is zero for less than two samples. """
+        if self.count == 0:
+            return None
+        return self.sum_sq_diffs / max(self.count - 1, 1)
+
+    @property
+    def std(self) -> [np.ndarray, to.Tensor, None]:
+        """ Get the square root of the unbiased sample variance. """
+        if self.count == 0:
+            return None
+        return to.sqrt(self.var) if isinstance(self.var, to.Tensor) else np.sqrt(self.var)
+
+    def update(self, data: [np.ndarray, to.Tensor], axis: int = 0):
+        """
+        Add a batch of data.
+
+        :param data: input data
+        :param axis: axis along which the samples are stacked
+        """
+        if isinstance(data, np.ndarray):
+            count = data.shape[axis]
+            if count == 0:
+                return
+            mean = np.mean(data, axis=axis)
+            sum_sq_diffs = np.sum((data - np.expand_dims(mean, axis)) ** 2, axis=axis)
+
+        elif isinstance(data, to.Tensor):
+            count = data.shape[axis]
+            if count == 0:
+                return
+            data = data.detach()
+            mean = to.mean(data, dim=axis)
+            sum_sq_diffs = to.sum((data - mean.unsqueeze(axis)) ** 2, dim=axis)
 
         else:
             raise pyrado.TypeErr(given=data, expected_type=[np.ndarray, to.Tensor])
+
+        self._merge(count, mean, sum_sq_diffs)
+
+    def merge(self, other: "RunningMoments"):
+        """
+        Add the moments of another estimator, such that this estimator reflects the union of both data sets.
+
+        :param other: estimator to merge into this one, it is not modified
+        """
+        if not isinstance(other, RunningMoments):
+            raise pyrado.TypeErr(given=other, expected_type=RunningMoments)
+        if other.count > 0:
+            self._merge(other.count, other.mean, other.sum_sq_diffs)
+
+    def _merge(self, count: int, mean: [np.ndarray, to.Tensor], sum_sq_diffs: [np.ndarray, to.Tensor]):
+        """ Combine the current moments with the moments of another set of samples, see (2.1b) in [1]. """
+        if self.count == 0:
+            self.count = count
+            self.mean = mean.clone() if isinstance(mean, to.Tensor) else np.copy(mean)
+            self.sum_sq_diffs = sum_sq_diffs.clone() if isinstance(sum_sq_diffs, to.Tensor) else np.copy(sum_sq_diffs)
+            return
+        if isinstance(mean, to.Tensor) != isinstance(self.mean, to.Tensor):
+            raise pyrado.TypeErr(given=mean, expected_type=type(self.mean))
+
+        count_total = self.count + count
+        delta = mean - self.mean
+        self.mean = self.mean + delta * count / count_total
+        self.sum_sq_diffs = self.sum_sq_diffs + sum_sq_diffs + delta ** 2 * self.count * count / count_total
+        self.count = count_total
@@ -31,9 +31,11 @@ Only tested for 1-dim inputs, e.g. time series of rewards.
 """
 import numpy as np
 import torch as to
+from copy import deepcopy
 from typing import Union, Tuple
 
 import pyrado
+from pyrado.utils.averaging import RunningMoments
 
 
 def scale_min_max(
@@ -283,15 +285,26 @@ class RunningStandardizer:
 
     def __init__(self):
         """ Constructor """
-        self.mean = None
-        self.sum_sq_diffs = None  # a.k.a M2
-        self.iter = 0
+        self._moments = RunningMoments()
+
+    @property
+    def mean(self) -> Union[np.ndarray, to.Tensor, None]:
+        """ Get the running mean. """
+        return self._moments.mean
+
+    @property
+    def sum_sq_diffs(self) -> Union[np.ndarray, to.Tensor, None]:
+        """ Get the running sum of squared differences from the mean a.k.a. M2. """
+        return self._moments.sum_sq_diffs
+
+    @property
+    def iter(self) -> int:
+        """ Get the number of processed data batches. """
+        return self._moments.count
 
     def reset(self):
         """ Reset internal variables. """
-        self.mean = None
-        self.sum_sq_diffs = None
-        self.iter = 0
+        self._moments.reset()
 
     def __repr__(self):
         return (
@@ -299,6 +312,16 @@ class RunningStandardizer:
             f"mean: {self.mean}\nss_diffs: {self.sum_sq_diffs}\niter: {self.iter}"
         )
 
+    def merge(self, other: "RunningStandardizer"):
+        """
+        Add the statistics of another standardizer, e.g. one which was updated by a different worker.
+
+        :param other: standardizer to merge into this one, it is not modified
+        """
+        if not isinstance(other, RunningStandardizer):
+            raise pyrado.TypeErr(given=other, expected_type=RunningStandardizer)
+        self._moments.merge(other._moments)
+
     def __call__(self, data: Union[np.ndarray, to.Tensor], axis: int = 0):
         """
         Update the internal variables and standardize the input.
@@ -307,63 +330,23 @@ class RunningStandardizer:
         :param axis: axis to standardized along
         :return: standardized data
         """
+        # Process element wise (keeps dim) or average along one axis, and add the result as one sample
         if isinstance(data, np.ndarray):
-            # Process element wise (keeps dim) or average along one axis
             mean = np.mean(data, axis=axis)
-
-            self.iter += 1
-
-            # Handle first iteration separately
-            if self.iter <= 1:
-                # delta = x
-                self.mean = mean
-                self.sum_sq_diffs = mean * mean
-                return data
-            else:
-                # Update mean
-                delta_prev = mean - self.mean
-                self.mean += delta_prev / self.iter
-
-                # Update sum of squares of differences from the current mean
-                delta_curr = mean - self.mean
-                self.sum_sq_diffs += delta_prev * delta_curr
-
-                # Calculate the unbiased sample variance
-                var_sample = self.sum_sq_diffs / (self.iter - 1)
-
-                # Return normalized data
-                return (data - self.mean) / np.sqrt(var_sample)
-
+            self._moments.update(np.expand_dims(mean, 0))
         elif isinstance(data, to.Tensor):
-            # Process element wise (keeps dim) or average along one axis
             mean = to.mean(data, dim=axis).to(to.get_default_dtype())
-
-            self.iter += 1
-
-            # Handle first iteration separately
-            if self.iter <= 1:
-                # delta = x
-                self.mean = mean
-                self.sum_sq_diffs = mean * mean
-                return data
-            else:
-                # Update mean
-                delta_prev = mean - self.mean
-                self.mean += delta_prev / self.iter
-
-                # Update sum of squares of differences from the current mean
-                delta_curr = mean - self.mean
-                self.sum_sq_diffs += delta_prev * delta_curr
-
-                # Calculate the unbiased sample variance
-                var_sample = self.sum_sq_diffs / (self.iter - 1)
-
-                # Return normalized data
-                return (data - self.mean) / to.sqrt(var_sample)
-
+            self._moments.update(mean.unsqueeze(0))
         else:
             raise pyrado.TypeErr(given=data, expected_type=[np.ndarray, to.Tensor])
 
+        # Handle first iteration separately
+        if self.iter <= 1:
+            return data
+
+        # Return normalized data using the unbiased sample variance
+        return (data - self.mean) / self._moments.std
+
 
 class RunningNormalizer:
     """ Normalizes given data based on the history of observed data, such that all outputs are in range [-1, 1] """
@@ -387,6 +370,26 @@ class RunningNormalizer:
             f"bound_lo: {self.bound_lo}\nbound_up: {self.bound_up}\niter: {self.iter}"
         )
 
+    def merge(self, other: "RunningNormalizer"):
+        """
+        Add the bounds of another normalizer, e.g. one which was updated by a different worker.
+
+        :param other: normalizer to merge into this one, it is not modified
+        """
+        if not isinstance(other, RunningNormalizer):
+            raise pyrado.TypeErr(given=other, expected_type=RunningNormalizer)
+        if other.iter == 0:
+            return
+        if self.iter == 0:
+            self.bound_lo, self.bound_up = deepcopy(other.bound_lo), deepcopy(other.bound_up)
+        elif isinstance(self.bound_lo, np.ndarray):
+            self.bound_lo = np.fmin(self.bound_lo, other.bound_lo)
+            self.bound_up = np.fmax(self.bound_up, other.bound_up)
+        else:
+            self.bound_lo = to.min(self.bound_lo, other.bound_lo)
+            self.bound_up = to.max(self.bound_up, other.bound_up)
+        self.iter += other.iter
+
     def __call__(self, data: Union[np.ndarray, to.Tensor]):
         """
         Update the internal variables and normalize the input.
@@ -29,8 +29,9 @@
 import collections
 import numpy as np
 import torch as to
+from collections.abc import Mapping
 from copy import deepcopy
-from typing import Sequence, NamedTuple, Union
+from typing import Iterator, NamedTuple, Optional, Sequence, Set, Union
 
 import pyrado
 from pyrado.spaces.base import Space
@@ -136,6 +137,137 @@ class LinDSSpec(DSSpec):
         super().__init__(function=function, goal=goal, errorDynamics=errorDynamics)
 
 
+class DomainParamArray(Mapping):
+    """
+    Compact storage of an environment's domain parameters. The floating-point parameters given at construction are
+    held in one array, all other values (e.g. integers, arrays, or parameters which are added later on) in a dict.
+    The class implements the read-only `Mapping` interface, thus it can be accessed like a dict without copying.
+    Optionally, the accessed keys are recorded, which allows to find out which parameters a computation depends on.
+    """
+
+    def __init__(self, domain_param: dict):
+        """
+        Constructor
+
+        :param domain_param: initial domain parameters, the float-valued ones determine the entries of the array
+        """
+        names, values = [], []
+        self._extra = dict()
+        for name, value in domain_param.items():
+            value_float = DomainParamArray._to_float(value)
+            if value_float is None:
+                self._extra[name] = deepcopy(value)
+            else:
+                names.append(name)
+                values.append(value_float)
+        self._names = tuple(names)
+        self._index = {name: i for i, name in enumerate(names)}
+        self._values = np.array(values, dtype=np.float64)
+        self._accessed = None
+
+    @staticmethod
+    def _to_float(value) -> Optional[float]:
+        """
+        Convert a scalar floating-point value to a Python float.
+
+        :param value: domain parameter value
+        :return: the value as float, or `None` if it is not a scalar floating-point value
+        """
+        if isinstance(value, (float, np.floating)):
+            return float(value)
+        if isinstance(value, np.ndarray) and value.ndim == 0 and np.issubdtype(value.dtype, np.floating):
+            return float(value)
+        if isinstance(value, to.Tensor) and value.dim() == 0 and value.is_floating_point():
+            return float(value)
+        return None
+
+    @property
+    def names(self) -> tuple:
+        """ Get the names of the array-backed parameters, in the order of the array's entries. """
+        return self._names
+
+    @property
+    def values(self) -> np.ndarray:
+        """ Get the array of the float-valued parameters. Do not modify it, use `update()` instead. """
+        return self._values
+
+    def __getitem__(self, name: str):
+        if self._accessed is not None:
+            self._accessed.add(name)
+        if name in self._extra:
+            return self._extra[name]
+        return self._values[self._index[name]]
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self._names
+        yield from (name for name in self._extra if name not in self._index)
+
+    def __len__(self) -> int:
+        return len(self._names) + sum(1 for name in self._extra if name not in self._index)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.to_dict()})"
+
+    def to_dict(self) -> dict:
+        """
+        Create a dict with (copies of) the domain parameters, which can be modified freely.
+
+        :return: dict of the domain parameters
+        """
+        if self._accessed is not None:
+            self._accessed.update(self.keys())
+        domain_param = dict(zip(self._names, self._values.tolist()))
+        domain_param.update(deepcopy(self._extra))
+        return domain_param
+
+    def update(self, domain_param: dict) -> Set[str]:
+        """
+        Update the domain parameters.
+
+        :param domain_param: new values, unknown names are added
+        :return: names of the parameters whose value has changed
+        """
+        changed = set()
+        for name, value in domain_param.items():
+            idx = self._index.get(name)
+            value_float = None if idx is None else DomainParamArray._to_float(value)
+            if value_float is not None:
+                if name in self._extra:
+                    # The parameter was overwritten by a non-float value before
+                    del self._extra[name]
+                    changed.add(name)
+                if self._values[idx] != value_float:
+                    self._values[idx] = value_float
+                    changed.add(name)
+            elif not (name in self._extra and DomainParamArray._equal(self._extra[name], value)):
+                self._extra[name] = deepcopy(value)
+                changed.add(name)
+        return changed
+
+    @staticmethod
+    def _equal(value, other) -> bool:
+        """ Check if two parameter values are equal, supporting arrays and tensors. """
+        try:
+            return type(value) == type(other) and np.shape(value) == np.shape(other) and bool(np.all(value == other))
+        except Exception:
+            return False
+
+    def record_access(self):
+        """ Start recording the names of the accessed parameters, see `accessed`. """
+        self._accessed = set()
+
+    def accessed(self) -> Set[str]:
+        """
+        Stop recording the names of the accessed parameters.
+
+        :return: names of all parameters accessed since the call to `record_access()`
+        """
+        if self._accessed is None:
+            raise pyrado.ValueErr(msg="Call record_access() before accessed()!")
+        accessed, self._accessed = self._accessed, None
+        return accessed
+
+
 def repeat_interleave(sequence: Union[list, tuple], num_reps) -> Union[list, tuple]:
     """
     Repeat every element of the input sequence, but keep the order of the elements.
@@ -26,7 +26,10 @@
 # ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
 # POSSIBILITY OF SUCH DAMAGE.
 
+import csv
+import io
 import itertools
+import json
 import os
 import os.path as osp
 import pandas as pd
@@ -45,6 +48,8 @@ from pyrado.environment_wrappers.domain_randomization import (
 from pyrado.environment_wrappers.utils import typed_env
 from pyrado.environments.sim_base import SimEnv
 from pyrado.logger.experiment import load_dict_from_yaml
+from pyrado.logger.step import BinaryColumnPrinter, read_binary_log
+from pyrado.plotting.live_update import IncrementalLoader
 from pyrado.policies.recurrent.adn import (
     pd_linear,
     pd_cubic,
@@ -55,6 +60,7 @@ from pyrado.policies.recurrent.adn import (
 )
 from pyrado.policies.base import Policy
 from pyrado.sampling.step_sequence import StepSequence
+from pyrado.sampling.rollout_storage import RolloutArchive
 from pyrado.utils.argparser import get_argparser
 from pyrado.utils.checks import check_all_types_equal, is_iterable
 from pyrado.utils.input_output import print_cbt
@@ -300,12 +306,156 @@ def read_csv_w_replace(path: str) -> pd.DataFrame:
     :return: Pandas `DataFrame` with replaced chars in columns
     """
     df = pd.read_csv(path, index_col="iteration")
-    # Replace whitespaces in column names
+    _replace_chars_in_columns(df)
+    return df
+
+
+def read_bin_w_replace(path: str) -> pd.DataFrame:
+    """
+    Custom function to read a binary columnar log written by `BinaryColumnPrinter`. Turns white paces into underscores
+    for accessing the columns as exposed properties, just like `read_csv_w_replace()`.
+
+    :param path: path to the folder of the log
+    :return: Pandas `DataFrame` with replaced chars in columns, vector-valued entries are stored as arrays per row
+    """
+    return _binary_log_to_df(read_binary_log(path))
+
+
+def _binary_log_to_df(data: dict) -> pd.DataFrame:
+    """ Convert the columns of a binary log to a data frame like the one read from the CSV file. """
+    df = pd.DataFrame({k: list(v) if v.ndim == 2 else v for k, v in data.items()})
+    if "iteration" in df.columns:
+        df = df.set_index(df["iteration"].astype(int)).drop(columns="iteration")
+    _replace_chars_in_columns(df)
+    return df
+
+
+def has_complete_binary_progress(ex_dir: str) -> bool:
+    """
+    Check if an experiment has a binary columnar log of its progress, which contains the same columns as the CSV file.
+    This is not the case if the experiment logged values which are not numeric in the first step, since these are only
+    written to the CSV file.
+
+    :param ex_dir: experiment's parent directory
+    :return: `True` if the progress can be loaded from the binary columnar log
+    """
+    meta_file = osp.join(ex_dir, "progress_bin", BinaryColumnPrinter.meta_file)
+    if not osp.isfile(meta_file):
+        return False
+    csv_file = osp.join(ex_dir, "progress.csv")
+    if not osp.isfile(csv_file):
+        return True
+
+    with open(meta_file) as f:
+        columns_bin = json.load(f)
+    with open(csv_file, newline="") as f:
+        columns_csv = next(csv.reader(f), [])
+    return set(columns_bin) == set(columns_csv)
+
+
+def read_progress_w_replace(ex_dir: str) -> pd.DataFrame:
+    """
+    Read the progress of an experiment. The binary columnar log is used if the experiment has a complete one, since it
+    is much faster to load, otherwise the CSV file is parsed.
+
+    :param ex_dir: experiment's parent directory
+    :return: Pandas `DataFrame` with replaced chars in columns
+    """
+    if has_complete_binary_progress(ex_dir):
+        return read_bin_w_replace(osp.join(ex_dir, "progress_bin"))
+    return read_csv_w_replace(osp.join(ex_dir, "progress.csv"))
+
+
+class IncrementalCSVLoader(IncrementalLoader):
+    """
+    Loads the progress CSV file incrementally, i.e. only the rows which have been appended since the previous call are
+    parsed. The columns are named as by `read_csv_w_replace()`. An incomplete last line, i.e. a row which is currently
+    being written, is left for the next call.
+
+    Example:
+        loader = IncrementalCSVLoader()
+        df, df_new = loader.load(osp.join(ex_dir, "progress.csv"))
+    """
+
+    def __init__(self, index_col: Optional[str] = "iteration"):
+        """
+        Constructor
+
+        :param index_col: name of the column to use as index, pass `None` to use the row numbers
+        """
+        self.index_col = index_col
+        super().__init__()
+
+    def reset(self):
+        super().reset()
+        self._offset = 0
+        self._header = None
+
+    def _load_delta(self, path: str) -> Optional[pd.DataFrame]:
+        if not osp.isfile(path):
+            raise pyrado.PathErr(given=path)
+        if osp.getsize(path) < self._offset:
+            # The file has been rewritten, e.g. by restarting the experiment
+            self.reset()
+
+        with open(path, "rb") as f:
+            f.seek(self._offset)
+            chunk = f.read()
+
+        # Only consume complete lines
+        end = chunk.rfind(b"\n") + 1
+        if end == 0:
+            return None
+        chunk = chunk[:end]
+        self._offset += end
+
+        if self._header is None:
+            end_header = chunk.index(b"\n") + 1
+            self._header, chunk = chunk[:end_header], chunk[end_header:]
+        if not chunk:
+            return None
+
+        # Parse the new rows with the stored header
+        df = pd.read_csv(io.BytesIO(self._header + chunk), index_col=self.index_col)
+        _replace_chars_in_columns(df)
+        return df
+
+
+class IncrementalBinaryLoader(IncrementalLoader):
+    """
+    Loads the binary columnar log written by `BinaryColumnPrinter` incrementally, i.e. only the steps which have been
+    appended since the previous call are read. The data frames are the same as the ones from `read_bin_w_replace()`.
+    """
+
+    def reset(self):
+        super().reset()
+        self._num_steps = 0
+        self._meta_mtime = None
+
+    def _load_delta(self, path: str) -> Optional[pd.DataFrame]:
+        meta_file = osp.join(path, BinaryColumnPrinter.meta_file)
+        if not osp.isfile(meta_file):
+            raise pyrado.PathErr(given=meta_file)
+        if self._meta_mtime is not None and osp.getmtime(meta_file) != self._meta_mtime:
+            # The log has been rewritten, e.g. by restarting the experiment
+            self.reset()
+        self._meta_mtime = osp.getmtime(meta_file)
+
+        data = read_binary_log(path, first_step=self._num_steps)
+        num_new = len(next(iter(data.values()))) if data else 0
+        if num_new == 0:
+            return None
+
+        self._num_steps += num_new
+        return _binary_log_to_df(data)
+
+
+def _replace_chars_in_columns(df: pd.DataFrame):
+    """ Replace whitespaces, hyphens, and parentheses in the column names of a data frame by underscores (inplace). """
     df.columns = [c.replace(" ", "_") for c in df.columns]
     df.columns = [c.replace("-", "_") for c in df.columns]
     df.columns = [c.replace("(", "_") for c in df.columns]
     df.columns = [c.replace(")", "_") for c in df.columns]
-    return df
 
 
 def load_rollouts_from_dir(
@@ -313,6 +463,8 @@ def load_rollouts_from_dir(
 ) -> Tuple[List[StepSequence], List[str]]:
     """
     Crawl through the given directory and load all rollouts, i.e. all files that include the key.
+    Subdirectories which include the key and contain a `RolloutArchive` are opened memory-mapped instead of loaded.
+    If there are such archives, they take precedence, i.e. the rollout files in the directory are ignored.
 
     :param ex_dir: directory, e.g. and experiment folder
     :param key: word or part of a word that needs to the in the name of a file for it to be loaded
@@ -329,7 +481,15 @@ def load_rollouts_from_dir(
     rollouts = []
     names = []
     for root, dirs, files in os.walk(ex_dir):
+        for d in dirs:
+            if key in d and RolloutArchive.is_archive(osp.join(root, d)):
+                rollouts.append(list(RolloutArchive(osp.join(root, d))))
+                names.append(d)
         dirs.clear()  # prevents walk() from going into subdirectories
+        if rollouts:
+            # The archives are usually created from the rollout files, thus loading both would yield duplicates
+            print_cbt(f"Found the rollout archives {names}, the rollout files in {ex_dir} are ignored.", "y")
+            break
         for f in files:
             f_ext = f[f.rfind(".") + 1 :]
             if key in f and f_ext in file_exts:
@@ -0,0 +1,292 @@
+# Copyright (c) 2020, Fabio Muratore, Honda Research Institute Europe GmbH, and
+# Technical University of Darmstadt.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. Neither the name of Fabio Muratore, Honda Research Institute Europe GmbH,
+#    or Technical University of Darmstadt, nor the names of its contributors may
+#    be used to endorse or promote products derived from this software without
+#    specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL FABIO MURATORE, HONDA RESEARCH INSTITUTE EUROPE GMBH,
+# OR TECHNICAL UNIVERSITY OF DARMSTADT BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+# IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+"""
+Opt-in profiling of the rollout hot path. When enabled, the `step()` and `reset()` methods of all environments
+(including all wrapper layers), the `step_rew()` methods of all tasks, the `forward()` methods of all policies, and the
+sections of the rollout loop are timed with `perf_counter_ns()`. When disabled, the original methods are restored,
+thus there is no overhead.
+
+.. note::
+    Only classes which are defined (i.e. imported) at the time of enabling are instrumented.
+"""
+import functools
+import inspect
+import os
+from contextlib import nullcontext
+from time import perf_counter_ns
+from typing import Dict, Optional, Sequence
+
+import pyrado
+from pyrado.logger.step import StepLogger
+
+
+class StepProfiler:
+    """
+    Hierarchical timer which accumulates the inclusive and exclusive time per component, and the exclusive time per
+    call stack. The latter can be exported in the folded stack format used by flame graph tools.
+    """
+
+    def __init__(self):
+        """ Constructor """
+        self._enabled = False
+        self._patched = []  # list of (class, method name, original method)
+        self._stack = []  # list of [name, path, start time, time spent in children, key]
+        self._stats = {}  # name -> [number of calls, inclusive time, exclusive time]
+        self._folded = {}  # path -> exclusive time
+
+    @property
+    def enabled(self) -> bool:
+        """ Get the flag if the profiler is recording. """
+        return self._enabled
+
+    @property
+    def stats(self) -> Dict[str, dict]:
+        """ Get the number of calls, and the inclusive as well as exclusive time in nanoseconds per component. """
+        return {
+            name: dict(count=s[0], total_ns=s[1], self_ns=s[2])
+            for name, s in sorted(self._stats.items(), key=lambda item: -item[1][1])
+        }
+
+    def enable(self):
+        """ Instrument all environments, tasks, and policies, and start recording. """
+        if self._enabled:
+            return
+        from pyrado.environments.base import Env
+        from pyrado.policies.base import Policy
+        from pyrado.tasks.base import Task
+
+        for base, meth_names in [(Env, ("step", "reset")), (Task, ("step_rew",)), (Policy, ("forward",))]:
+            for cls in [base] + _all_subclasses(base):
+                for meth_name in meth_names:
+                    self._patch(cls, meth_name)
+        self._enabled = True
+
+    def disable(self):
+        """ Stop recording, and restore the original methods. The recorded data is kept. """
+        for cls, meth_name, fcn in reversed(self._patched):
+            setattr(cls, meth_name, fcn)
+        self._patched = []
+        self._stack = []
+        self._enabled = False
+
+    def reset(self):
+        """ Discard all recorded data. """
+        self._stack = []
+        self._stats = {}
+        self._folded = {}
+
+    def _patch(self, cls: type, meth_name: str):
+        """
+        Replace a method which is defined by the given class by a timed version of it. The component is named after
+        the class of the instance, such that every wrapper layer shows up separately. Calls to the same method of the
+        same instance, i.e. via `super()`, are not timed separately.
+        """
+        fcn = cls.__dict__.get(meth_name)
+        if not inspect.isfunction(fcn) or getattr(fcn, "__isabstractmethod__", False):
+            return
+
+        @functools.wraps(fcn)
+        def timed(obj, *args, **kwargs):
+            key = (id(obj), meth_name)
+            if self._stack and self._stack[-1][4] == key:
+                return fcn(obj, *args, **kwargs)
+            self.start(f"{type(obj).__name__}.{meth_name}", key)
+            try:
+                return fcn(obj, *args, **kwargs)
+            finally:
+                self.stop()
+
+        setattr(cls, meth_name, timed)
+        self._patched.append((cls, meth_name, fcn))
+
+    def section(self, name: str):
+        """
+        Get a context manager which times the enclosed code as one component. If the profiler is disabled, a reusable
+        no-op context manager is returned, thus there is (almost) no overhead.
+
+        Example:
+            with profiler.section("rollout.env_step"):
+                obs, rew, done, info = env.step(act)
+
+        :param name: name of the component, e.g. 'rollout.policy'
+        :return: context manager
+        """
+        return _Section(self, name) if self._enabled else _NO_SECTION
+
+    def start(self, name: str, key: Optional[tuple] = None):
+        """
+        Start timing a component. Every call must be followed by a call to `stop()`.
+
+        :param name: name of the component, e.g. 'rollout.policy'
+        :param key: optional identifier of the caller, used to detect nested calls of the same method
+        """
+        path = f"{self._stack[-1][1]};{name}" if self._stack else name
+        self._stack.append([name, path, perf_counter_ns(), 0, key])
+
+    def stop(self):
+        """ Stop timing the component which was started last. """
+        t_end = perf_counter_ns()
+        if not self._stack:
+            return  # the profiler was enabled while the component was running
+        name, path, t_start, child_ns, _ = self._stack.pop()
+        total_ns = t_end - t_start
+        stat = self._stats.setdefault(name, [0, 0, 0])
+        stat[0] += 1
+        stat[1] += total_ns
+        stat[2] += total_ns - child_ns
+        self._folded[path] = self._folded.get(path, 0) + total_ns - child_ns
+        if self._stack:
+            self._stack[-1][3] += total_ns
+
+    def state_dict(self) -> dict:
+        """ Get the recorded data, e.g. to send it from a worker to the main process. """
+        return dict(stats={k: list(v) for k, v in self._stats.items()}, folded=dict(self._folded))
+
+    def merge(self, state: dict):
+        """
+        Add data recorded by another profiler.
+
+        :param state: recorded data obtained from `state_dict()`
+        """
+        for name, s in state["stats"].items():
+            stat = self._stats.setdefault(name, [0, 0, 0])
+            for i in range(3):
+                stat[i] += s[i]
+        for path, ns in state["folded"].items():
+            self._folded[path] = self._folded.get(path, 0) + ns
+
+    def log(self, logger: StepLogger, names: Optional[Sequence[str]] = None, prefix: str = "prof"):
+        """
+        Add the average inclusive time per call in microseconds for every component to the given logger. Since the
+        logger's keys are fixed after the first step, the set of names should be fixed too.
+
+        :param logger: step logger to record the values with, this includes the TensorBoard printer
+        :param names: names of the components to log, pass `None` to log all recorded components
+        :param prefix: prefix of the logged keys
+        """
+        names = sorted(self._stats.keys()) if names is None else names
+        for name in names:
+            count, total_ns, _ = self._stats.get(name, [0, 0, 0])
+            logger.add_value(f"{prefix} {name} [us]", total_ns / max(count, 1) / 1e3, 3)
+
+    def save_folded(self, file: str):
+        """
+        Save the exclusive time per call stack in the folded stack format, i.e. one line 'a;b;c <microseconds>' per
+        stack, which can be read by flamegraph.pl or speedscope.
+
+        :param file: path to the file to write
+        """
+        if not os.path.isdir(os.path.dirname(os.path.abspath(file))):
+            raise pyrado.PathErr(given=os.path.dirname(file))
+        with open(file, "w") as f:
+            for path, ns in sorted(self._folded.items()):
+                f.write(f"{path} {ns // 1000}\n")
+
+
+class _Section:
+    """ Context manager timing the enclosed code, see `StepProfiler.section()` """
+
+    __slots__ = ("_profiler", "_name")
+
+    def __init__(self, profiler: StepProfiler, name: str):
+        self._profiler = profiler
+        self._name = name
+
+    def __enter__(self):
+        self._profiler.start(self._name)
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        # Also called if the enclosed code raised, thus the stack stays consistent
+        self._profiler.stop()
+        return False
+
+
+_NO_SECTION = nullcontext()
+
+
+def _all_subclasses(cls: type) -> list:
+    """ Get all (direct and indirect) subclasses of a class. """
+    subclasses = []
+    for sub in cls.__subclasses__():
+        subclasses.append(sub)
+        subclasses.extend(_all_subclasses(sub))
+    return subclasses
+
+
+def _prof_enable(G):
+    """ Enable the profiler in a worker. """
+    profiler.enable()
+
+
+def _prof_disable(G):
+    """ Disable the profiler in a worker. """
+    profiler.disable()
+
+
+def _prof_collect(G, reset: bool) -> dict:
+    """ Get the data recorded by the profiler in a worker. """
+    state = profiler.state_dict()
+    if reset:
+        profiler.reset()
+    return state
+
+
+def enable_in_pool(pool, enable: bool = True, include_main: bool = True):
+    """
+    Enable or disable the profiler in all workers of a sampler pool, and in the main process.
+
+    :param pool: sampler pool
+    :param enable: `True` to enable, `False` to disable
+    :param include_main: if `False`, the main process' profiler is left untouched, unless the pool has only one worker
+                         since then the work is done in the main process
+    """
+    if pool.num_threads > 1:
+        pool.invoke_all(_prof_enable if enable else _prof_disable)
+    if include_main or pool.num_threads == 1:
+        if enable:
+            profiler.enable()
+        else:
+            profiler.disable()
+
+
+def collect_from_pool(pool, reset: bool = True):
+    """
+    Merge the data recorded by the profilers of all workers of a sampler pool into the main process' profiler.
+
+    :param pool: sampler pool
+    :param reset: if `True`, the workers' data is discarded after collecting it
+    """
+    if pool.num_threads == 1:
+        return  # the work was done in the main process
+    for state in pool.invoke_all(_prof_collect, reset):
+        profiler.merge(state)
+
+
+# Profiler of this process
+profiler = StepProfiler()
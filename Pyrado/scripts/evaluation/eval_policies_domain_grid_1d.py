@@ -42,7 +42,7 @@ from pyrado.environment_wrappers.action_delay import ActDelayWrapper
 from pyrado.environment_wrappers.utils import typed_env
 from pyrado.environments.pysim.quanser_qube import QQubeSwingUpSim
 from pyrado.logger.experiment import setup_experiment, save_dicts_to_yaml
-from pyrado.sampling.parallel_evaluation import eval_domain_params
+from pyrado.sampling.parallel_evaluation import eval_domain_params_reduced, reduce_length, reduce_return
 from pyrado.sampling.sampler_pool import SamplerPool
 from pyrado.utils.argparser import get_argparser
 from pyrado.utils.checks import check_all_lengths_equal
@@ -210,16 +210,22 @@ if __name__ == "__main__":
         # Add the same wrappers as during training
         env = wrap_like_other_env(env, env_sim)
 
-        # Sample rollouts
-        ros = eval_domain_params(pool, env, policy, param_list, init_state)
+        # Sample rollouts, and only keep their returns and lengths
+        df_pol = eval_domain_params_reduced(
+            pool, env, policy, param_list, dict(ret=reduce_return, len=reduce_length), init_state
+        )
 
-        # Compute results metrics
-        rets = [ro.undiscounted_return() for ro in ros]
-        lengths = [float(ro.length) for ro in ros]  # int values are not numeric in pandas
-        vaired_param_values = [ro.rollout_info["domain_param"][varied_param_key] for ro in ros]
-        varied_param = {varied_param_key: vaired_param_values}
+        # Collect the results metrics
         df = df.append(
-            pd.DataFrame(dict(policy=ex_labels[i], ret=rets, len=lengths, **varied_param)), ignore_index=True
+            pd.DataFrame(
+                dict(
+                    policy=ex_labels[i],
+                    ret=df_pol["ret"],
+                    len=df_pol["len"],
+                    **{varied_param_key: df_pol[varied_param_key]},
+                )
+            ),
+            ignore_index=True,
         )
 
     metrics = dict(
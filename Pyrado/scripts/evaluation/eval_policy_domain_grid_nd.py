@@ -34,7 +34,6 @@ import datetime
 import os
 import os.path as osp
 import numpy as np
-import pandas as pd
 from prettyprinter import pprint
 
 import pyrado
@@ -44,7 +43,7 @@ from pyrado.environments.pysim.quanser_ball_balancer import QBallBalancerSim
 from pyrado.environment_wrappers.action_delay import ActDelayWrapper
 from pyrado.environment_wrappers.utils import inner_env, typed_env
 from pyrado.logger.experiment import save_dicts_to_yaml, ask_for_experiment
-from pyrado.sampling.parallel_evaluation import eval_domain_params
+from pyrado.sampling.parallel_evaluation import eval_domain_params_reduced, reduce_length, reduce_return
 from pyrado.sampling.sampler_pool import SamplerPool
 from pyrado.utils.argparser import get_argparser
 from pyrado.utils.data_types import dict_arraylike_to_float
@@ -115,22 +114,14 @@ if __name__ == "__main__":
     else:
         print_cbt("No seed was set", "y")
 
-    # Sample rollouts
-    ros = eval_domain_params(pool, env, policy, param_list, init_state)
-
-    # Compute metrics
-    lod = []
-    for ro in ros:
-        d = dict(**ro.rollout_info["domain_param"], ret=ro.undiscounted_return(), len=ro.length)
-        # Simply remove the observation noise from the domain parameters
-        try:
-            d.pop("obs_noise_mean")
-            d.pop("obs_noise_std")
-        except KeyError:
-            pass
-        lod.append(d)
-
-    df = pd.DataFrame(lod)
+    # Sample rollouts, and only keep their returns and lengths. The results are stored in a table which is continued
+    # if the evaluation of the same grid has been interrupted before.
+    table_file = osp.join(
+        ex_dir, "eval_domain_grid", f"{add_info}--rpp-{args.num_rollouts_per_config}--seed-{args.seed}.csv"
+    )
+    df = eval_domain_params_reduced(
+        pool, env, policy, param_list, dict(ret=reduce_return, len=reduce_length), init_state, save_path=table_file
+    )
     metrics = dict(
         avg_len=df["len"].mean(),
         avg_ret=df["ret"].mean(),
@@ -43,6 +43,7 @@ from pyrado.environment_wrappers.utils import typed_env
 from pyrado.environments.sim_base import SimEnv
 from pyrado.logger.experiment import ask_for_experiment
 from pyrado.plotting.distribution import (
+    PosteriorGridEvaluator,
     draw_posterior_distr_2d,
     draw_posterior_distr_pairwise,
     draw_posterior_distr_1d,
@@ -179,6 +180,9 @@ if __name__ == "__main__":
                 return_as_tensor=True,
             )
 
+    # Evaluate the posterior on the grids only once per checkpoint and condition, re-plotting loads the results
+    grid_evaluator = PosteriorGridEvaluator(cache_dir=os.path.join(ex_dir, "posterior_grids"))
+
     # Plot the posterior distribution, the true parameters / their distribution
     if len(idcs_dp) == 1:
         fig, axs = plt.subplots(figsize=(14, 7), tight_layout=True)
@@ -190,11 +194,12 @@ if __name__ == "__main__":
             idcs_dp,
             prior,
             env_real,
-            condition,
+            condition=condition,
             normalize_posterior=args.normalize,
             rescale_posterior=args.rescale,
             # x_label=None,
             # y_label=None,
+            grid_evaluator=grid_evaluator,
         )
 
     else:
@@ -232,6 +237,7 @@ if __name__ == "__main__":
                     rescale_posterior=args.rescale,
                     # x_labels=None,
                     # y_labels=None,
+                    grid_evaluator=grid_evaluator,
                 )
 
         else:
@@ -263,6 +269,7 @@ if __name__ == "__main__":
                 add_sep_colorbar=False,
                 x_label=None,
                 y_label=None,
+                grid_evaluator=grid_evaluator,
             )
 
     if args.save:
@@ -37,7 +37,7 @@ from warnings import warn
 
 from pyrado.algorithms.timeseries_prediction import TSPred
 from pyrado.utils.checks import check_all_equal
-from pyrado.utils.experiments import load_experiment, read_csv_w_replace
+from pyrado.utils.experiments import load_experiment, read_progress_w_replace
 
 
 if __name__ == "__main__":
@@ -59,7 +59,7 @@ if __name__ == "__main__":
         policies.append(policy)
         datasets.append(kwout["dataset"])
 
-        df = read_csv_w_replace(osp.join(ex_dir, "progress.csv"))
+        df = read_progress_w_replace(ex_dir)
         logged_losses.append((df.trn_loss.values, df.tst_loss.values))
 
     if not check_all_equal(datasets):
@@ -41,7 +41,7 @@ from distutils.dir_util import copy_tree
 
 import pyrado
 from pyrado.algorithms.base import Algorithm
-from pyrado.logger.step import CSVPrinter, TensorBoardPrinter
+from pyrado.logger.step import AsyncPrinter, BinaryColumnPrinter, CSVPrinter, TensorBoardPrinter
 from pyrado.utils.argparser import get_argparser
 
 
@@ -69,10 +69,14 @@ if __name__ == "__main__":
     # Update all entries that contain information about where the experiment is stored
     algo.save_dir = args.new_dir
     for printer in algo.logger.printers:
+        if isinstance(printer, AsyncPrinter):
+            printer = printer.printer
         if isinstance(printer, CSVPrinter):
             printer.file = osp.join(args.new_dir, printer.file[printer.file.rfind("/") + 1 :])
         elif isinstance(printer, TensorBoardPrinter):
             printer.dir = args.new_dir
+        elif isinstance(printer, BinaryColumnPrinter):
+            printer.dir = osp.join(args.new_dir, osp.basename(osp.normpath(printer.dir)))
 
     # Copy the complete content
     copy_tree(args.dir, args.new_dir)
@@ -30,7 +30,6 @@
 Script to visually compare policy learning progress (e.g. over different random seeds)
 """
 import numpy as np
-import os
 import os.path as osp
 import pandas as pd
 from matplotlib import pyplot as plt
@@ -38,7 +37,7 @@ from matplotlib import pyplot as plt
 import pyrado
 from pyrado.plotting.curve import draw_curve
 from pyrado.utils.argparser import get_argparser
-from pyrado.utils.experiments import read_csv_w_replace
+from pyrado.utils.experiments import read_progress_w_replace
 from pyrado.utils.order import get_immediate_subdirs, natural_sort
 
 
@@ -65,8 +64,7 @@ if __name__ == "__main__":
     fig, axs = plt.subplots(2, figsize=(12, 8))
     for idx, d in enumerate(dirs):
         # Load an experiment's data
-        file = os.path.join(d, "progress.csv")
-        data = read_csv_w_replace(file)
+        data = read_progress_w_replace(d)
 
         # Append one column per experiment
         df = pd.concat([df, pd.DataFrame({f"ex_{idx}": data.avg_return})], axis=1)
@@ -38,7 +38,7 @@ from pyrado.logger.experiment import ask_for_experiment
 from pyrado.plotting.curve import draw_curve_from_data
 from pyrado.plotting.live_update import LiveFigureManager
 from pyrado.utils.argparser import get_argparser
-from pyrado.utils.experiments import read_csv_w_replace
+from pyrado.utils.experiments import IncrementalBinaryLoader, IncrementalCSVLoader, has_complete_binary_progress
 from pyrado.utils.input_output import print_cbt
 
 
@@ -58,10 +58,12 @@ if __name__ == "__main__":
 
     # Get the experiment's directory to load from
     ex_dir = ask_for_experiment() if args.dir is None else args.dir
-    file = osp.join(ex_dir, "progress.csv")
-
-    # Create plot manager that loads the progress data from the CSV into a Pandas data frame called df
-    lfm = LiveFigureManager(file, read_csv_w_replace, args, update_interval=2)
+    # Create plot manager that loads the progress data into a Pandas data frame called df. Only the rows which are
+    # appended while the experiment is running are read on every update, preferably from the binary log.
+    if has_complete_binary_progress(ex_dir):
+        lfm = LiveFigureManager(osp.join(ex_dir, "progress_bin"), IncrementalBinaryLoader(), args, update_interval=2)
+    else:
+        lfm = LiveFigureManager(osp.join(ex_dir, "progress.csv"), IncrementalCSVLoader(), args, update_interval=2)
 
     @lfm.figure("Average StepSequence Length")
     def avg_rollout_len(fig, df, args):
@@ -57,6 +57,7 @@ from pyrado.policies.recurrent.rnn import RNNPolicy
 from pyrado.policies.feed_forward.linear import LinearPolicy
 from pyrado.policies.recurrent.two_headed_rnn import TwoHeadedGRUPolicy
 from pyrado.sampling.rollout import rollout
+from pyrado.sampling.step_sequence import StepSequence
 from pyrado.sampling.sequences import *
 from pyrado.spaces import ValueFunctionSpace, BoxSpace
 from pyrado.utils.data_types import EnvSpec
@@ -218,6 +219,39 @@ def test_svpg(ex_dir, env: SimEnv, policy, actor_hparam, vfcn_hparam, critic_hpa
     assert algo.curr_iter == algo.max_iter
 
 
+@pytest.mark.parametrize("env", ["default_bob"], ids=["bob"], indirect=True)
+def test_svpg_kernel(ex_dir, env: SimEnv):
+    particle_hparam = dict(
+        actor=dict(hidden_sizes=[8, 8], hidden_nonlin=to.tanh),
+        vfcn=dict(hidden_sizes=[8, 8], hidden_nonlin=to.tanh),
+        critic=dict(gamma=0.995, lamda=1.0, num_epoch=1, lr=1e-4, standardize_adv=False),
+    )
+    algo = SVPG(
+        ex_dir, env, particle_hparam, max_iter=1, num_particles=3, temperature=10, lr=1e-3, horizon=50, num_workers=1
+    )
+
+    # The kernel's gradient term is the repulsive force, i.e. the negative gradient of the summed RBF kernel
+    X = to.randn(algo.num_particles, 5)
+    Kxx, dx_Kxx = algo.kernel(X)
+    assert Kxx.shape == (algo.num_particles, algo.num_particles)
+    assert to.allclose(Kxx, Kxx.T)
+    assert to.allclose(to.diag(Kxx), to.ones(algo.num_particles))
+    h_sq = -to.cdist(X[:1], X[1:2]) ** 2 / (2 * to.log(Kxx[0, 1]))
+    X.requires_grad_(True)
+    K = to.exp(-to.cdist(X, X.detach()) ** 2 / (2 * h_sq))
+    K.sum().backward()
+    assert to.allclose(dx_Kxx, -X.grad, atol=1e-5)
+
+    # The batched forward pass of the particles' actors matches the one of every single actor
+    ros = [[rollout(env, e, eval=True, max_steps=10 + 5 * i)] for i, e in enumerate(algo.expl_strats)]
+    concat_ros = [StepSequence.concat(r) for r in ros]
+    for ro in concat_ros:
+        ro.torch()
+    acts = algo._evaluate_actors(algo.expl_strats, concat_ros)
+    for e, ro, act in zip(algo.expl_strats, concat_ros, acts):
+        assert to.allclose(act, e.policy.evaluate(ro), atol=1e-6)
+
+
 @pytest.mark.parametrize("env", ["default_bob", "default_qbb"], ids=["bob", "qbb"], indirect=True)
 @pytest.mark.parametrize("policy", ["linear_policy"], ids=["lin"], indirect=True)
 @pytest.mark.parametrize(
@@ -411,3 +445,43 @@ def test_soft_update(env, policy: Policy):
     # Do a second soft update to see the exponential decay
     SAC.soft_update(target, source, tau=0.8)
     assert to.allclose(target.param_values, 0.36 * to.ones_like(target.param_values))
+
+
+@pytest.mark.parametrize("requires_grad", [False, True], ids=["nograd", "grad"])
+def test_gae_multiple_rollouts(requires_grad: bool):
+    gamma, lamda = 0.98, 0.95
+    critic = GAE(FNN(input_size=2, output_size=1, hidden_sizes=[8]), gamma=gamma, lamda=lamda, standardize_adv=False)
+
+    # Rollouts of different lengths, truncated ones in the middle as well as at the end
+    ros = [
+        StepSequence(
+            rewards=np.random.randn(length),
+            observations=np.random.randn(length + 1, 2),
+            actions=np.random.randn(length, 1),
+            complete=complete,
+        )
+        for length, complete in [(5, True), (1, True), (4, False), (9, True), (3, False)]
+    ]
+    concat_ros = StepSequence.concat(ros)
+    v_pred = to.randn(concat_ros.length, 1, requires_grad=requires_grad)
+
+    adv = critic.gae(concat_ros, v_pred, requires_grad=requires_grad)
+
+    # Reference from stepping backwards through the rollouts, the value beyond the last step is zero
+    adv_ref = [None] * concat_ros.length
+    for k in reversed(range(concat_ros.length)):
+        if concat_ros.done[k] or k == concat_ros.length - 1:
+            adv_ref[k] = float(concat_ros.rewards[k]) - v_pred[k]
+        else:
+            delta = float(concat_ros.rewards[k]) + gamma * v_pred[k + 1] - v_pred[k]
+            adv_ref[k] = delta + gamma * lamda * adv_ref[k + 1]
+    adv_ref = to.stack(adv_ref)
+
+    assert adv.shape == v_pred.shape
+    assert adv.requires_grad == requires_grad
+    assert to.allclose(adv, adv_ref, atol=1e-6)
+    if requires_grad:
+        # The gradients w.r.t. the value predictions must match as well
+        grad = to.autograd.grad(adv.sum(), v_pred)[0]
+        grad_ref = to.autograd.grad(adv_ref.sum(), v_pred)[0]
+        assert to.allclose(grad, grad_ref, atol=1e-6)
@@ -26,16 +26,20 @@
 # ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
 # POSSIBILITY OF SUCH DAMAGE.
 
+import os.path as osp
 import pytest
 import torch.nn as nn
+import unittest.mock as mock
 from copy import deepcopy
 from sbi import utils
 from sbi.inference import SNPE
 
+from pyrado.algorithms.base import Algorithm
 from pyrado.algorithms.episodic.cem import CEM
 from pyrado.algorithms.episodic.power import PoWER
 from pyrado.algorithms.episodic.reps import REPS
 from pyrado.algorithms.episodic.sysid_via_episodic_rl import DomainDistrParamPolicy, SysIdViaEpisodicRL
+from pyrado.algorithms.meta.adr import ADR
 from pyrado.algorithms.meta.npdr import NPDR
 from pyrado.algorithms.meta.arpl import ARPL
 from pyrado.algorithms.meta.bayrn import BayRn
@@ -71,6 +75,7 @@ from pyrado.policies.feed_forward.fnn import FNN, FNNPolicy
 from pyrado.policies.feed_forward.linear import LinearPolicy
 from pyrado.policies.special.environment_specific import QQubeSwingUpAndBalanceCtrl
 from pyrado.sampling.rollout import rollout
+from pyrado.sampling.sampler_pool import SamplerPool
 from pyrado.sampling.sequences import *
 from pyrado.spaces import BoxSpace, ValueFunctionSpace
 from pyrado.utils.data_types import EnvSpec
@@ -104,8 +109,25 @@ def ex_dir(tmpdir):
             num_bs_reps=1000,
             studentized_ci=False,
         ),
+        dict(
+            max_iter=2,
+            alpha=0.05,
+            beta=0.01,
+            nG=2,
+            nJ=10,
+            ntau=5,
+            nc_init=1,
+            nr_init=1,
+            sequence_cand=sequence_add_init,
+            sequence_refs=sequence_const,
+            warmstart_cand=False,
+            warmstart_refs=False,
+            num_bs_reps=1000,
+            studentized_ci=False,
+            num_workers=2,
+        ),
     ],
-    ids=["casual_hparam"],
+    ids=["casual_hparam", "casual_hparam_parallel"],
 )
 def test_spota_ppo(ex_dir, env: SimEnv, spota_hparam):
     # Environment and domain randomization
@@ -139,27 +161,66 @@ def test_spota_ppo(ex_dir, env: SimEnv, spota_hparam):
     algo = SPOTA(ex_dir, env, sr_cand, sr_refs, **spota_hparam)
     algo.train()
 
+    # The evaluation workers are kept across the iterations, but are not part of the snapshot
+    assert isinstance(algo._pool, SamplerPool)
+    assert algo._pool.num_threads == algo.num_workers
+    algo.save_snapshot()
+    assert Algorithm.load_snapshot(load_dir=ex_dir)._pool is None
+
 
 @pytest.mark.longtime
 @pytest.mark.parametrize("env", ["default_qqsu"], ids=["qq"], indirect=True)
 @pytest.mark.parametrize(
-    "bayrn_hparam",
+    "bayrn_hparam, num_workers_subrtn",
     [
-        dict(
-            max_iter=2,
-            acq_fc="UCB",
-            acq_param=dict(beta=0.25),
-            acq_restarts=100,
-            acq_samples=100,
-            num_init_cand=3,
-            warmstart=True,
-            num_eval_rollouts_sim=10,
-            num_eval_rollouts_real=2,  # sim-2-sim
+        (
+            dict(
+                max_iter=2,
+                acq_fc="UCB",
+                acq_param=dict(beta=0.25),
+                acq_restarts=100,
+                acq_samples=100,
+                num_init_cand=3,
+                warmstart=True,
+                num_eval_rollouts_sim=10,
+                num_eval_rollouts_real=2,  # sim-2-sim
+            ),
+            1,
+        ),
+        (
+            dict(
+                max_iter=2,
+                acq_fc="EI",
+                acq_restarts=100,
+                acq_samples=100,
+                num_init_cand=2,
+                warmstart=True,
+                num_eval_rollouts_sim=10,
+                num_eval_rollouts_real=2,  # sim-2-sim
+                batch_size=2,
+                num_workers_trn=2,
+            ),
+            1,
+        ),
+        (
+            dict(
+                max_iter=2,
+                acq_fc="EI",
+                acq_restarts=100,
+                acq_samples=100,
+                num_init_cand=2,
+                warmstart=True,
+                num_eval_rollouts_sim=10,
+                num_eval_rollouts_real=2,  # sim-2-sim
+                batch_size=2,
+                num_workers_trn=2,
+            ),
+            2,
         ),
     ],
-    ids=["casual_hparam"],
+    ids=["casual_hparam", "batch_hparam", "batch_hparam_parallel_subrtn"],
 )
-def test_bayrn_power(ex_dir, env: SimEnv, bayrn_hparam):
+def test_bayrn_power(ex_dir, env: SimEnv, bayrn_hparam, num_workers_subrtn):
     # Environments and domain randomization
     env_real = deepcopy(env)
     env_sim = DomainRandWrapperLive(env, create_zero_var_randomizer(env))
@@ -177,7 +238,7 @@ def test_bayrn_power(ex_dir, env: SimEnv, bayrn_hparam):
         num_init_states_per_domain=1,
         num_is_samples=20,
         expl_std_init=1.0,
-        num_workers=1,
+        num_workers=num_workers_subrtn,
     )
     subrtn = PoWER(ex_dir, env_sim, policy, **subrtn_hparam)
 
@@ -192,6 +253,10 @@ def test_bayrn_power(ex_dir, env: SimEnv, bayrn_hparam):
     algo = BayRn(ex_dir, env_sim, env_real, subrtn, ddp_space, **bayrn_hparam)
     algo.train()
     assert algo.curr_iter == algo.max_iter
+    if bayrn_hparam.get("num_workers_trn", 1) > 1:
+        # The concurrently trained candidates log to separate files
+        assert osp.isfile(osp.join(ex_dir, "init_0_subrtn", "progress.csv"))
+        assert osp.isfile(osp.join(ex_dir, "init_1_subrtn", "progress.csv"))
 
 
 @pytest.mark.parametrize("env", ["default_omo"], ids=["omo"], indirect=True)
@@ -242,6 +307,47 @@ def test_arpl(ex_dir, env: SimEnv):
     algo.train(snapshot_mode="best")
 
 
+@pytest.mark.parametrize("env", ["default_bob"], ids=["bob"], indirect=True)
+@pytest.mark.parametrize("batch_particles", [False, True], ids=["sequential", "batched"])
+def test_adr_subrtn_updates(ex_dir, env: SimEnv, batch_particles: bool):
+    policy = FNNPolicy(env.spec, hidden_sizes=[8], hidden_nonlin=to.tanh)
+    vfcn = FNNPolicy(EnvSpec(env.obs_space, ValueFunctionSpace), hidden_sizes=[8], hidden_nonlin=to.tanh)
+    critic = GAE(vfcn, gamma=0.99, lamda=0.95, num_epoch=1, batch_size=50, lr=1e-3)
+    subrtn = PPO(ex_dir, env, policy, critic, max_iter=1, min_steps=50, num_workers=1)
+    particle_hparam = dict(
+        actor=dict(hidden_sizes=[8], hidden_nonlin=to.tanh),
+        vfcn=dict(hidden_sizes=[8], hidden_nonlin=to.tanh),
+        critic=dict(gamma=0.99, lamda=0.95, num_epoch=1, lr=1e-3, standardize_adv=False),
+    )
+    num_particles, num_steps, num_trajs = 2, 2, 1
+    algo = ADR(
+        ex_dir,
+        env,
+        subrtn,
+        max_iter=1,
+        svpg_particle_hparam=particle_hparam,
+        num_svpg_particles=num_particles,
+        num_discriminator_epoch=1,
+        batch_size=32,
+        svpg_evaluation_steps=num_steps,
+        num_workers=1,
+        num_trajs_per_config=num_trajs,
+        randomized_params=["g"],
+        batch_particles=batch_particles,
+    )
+
+    with mock.patch.object(subrtn, "update") as update:
+        algo.step(snapshot_mode="no")
+
+    # By default, the subroutine is updated once per particle, otherwise once with the trajectories of all particles
+    if batch_particles:
+        assert update.call_count == 1
+        assert len(update.call_args_list[0][0][0]) == num_particles * num_steps * num_trajs
+    else:
+        assert update.call_count == num_particles
+        assert all(len(args[0]) == num_steps * num_trajs for args, _ in update.call_args_list)
+
+
 @pytest.mark.longtime
 @pytest.mark.parametrize("env, num_eval_rollouts", [("default_bob", 5)], ids=["bob"], indirect=["env"])
 def test_sysidasrl_reps(ex_dir, env: SimEnv, num_eval_rollouts):
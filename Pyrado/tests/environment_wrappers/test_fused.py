@@ -0,0 +1,102 @@
+# Copyright (c) 2020, Fabio Muratore, Honda Research Institute Europe GmbH, and
+# Technical University of Darmstadt.
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 3. Neither the name of Fabio Muratore, Honda Research Institute Europe GmbH,
+#    or Technical University of Darmstadt, nor the names of its contributors may
+#    be used to endorse or promote products derived from this software without
+#    specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL FABIO MURATORE, HONDA RESEARCH INSTITUTE EUROPE GMBH,
+# OR TECHNICAL UNIVERSITY OF DARMSTADT BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+# PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS;
+# OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+# IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+
+import numpy as np
+import pytest
+
+from pyrado.domain_randomization.default_randomizers import create_default_randomizer
+from pyrado.environment_wrappers.action_delay import ActDelayWrapper
+from pyrado.environment_wrappers.action_normalization import ActNormWrapper
+from pyrado.environment_wrappers.domain_randomization import DomainRandWrapperLive
+from pyrado.environment_wrappers.fused import FusedWrapperStack
+from pyrado.environment_wrappers.observation_noise import GaussianObsNoiseWrapper
+from pyrado.environment_wrappers.observation_normalization import ObsNormWrapper
+from pyrado.environment_wrappers.observation_partial import ObsPartialWrapper
+from pyrado.environments.pysim.quanser_qube import QQubeSwingUpSim
+from pyrado.policies.special.dummy import DummyPolicy
+from pyrado.sampling.rollout import rollout
+from pyrado.spaces.box import BoxSpace
+from tests.environment_wrappers.mock_env import MockEnv
+
+
+@pytest.mark.wrapper
+@pytest.mark.parametrize("partial", [False, True], ids=["fully_fused", "partially_fused"])
+def test_fused_equals_nested(partial: bool):
+    env = QQubeSwingUpSim(dt=1 / 100.0, max_steps=50)
+    env = GaussianObsNoiseWrapper(env, noise_std=0.01 * np.ones(env.obs_space.shape))
+    env = ActDelayWrapper(env, delay=3)
+    env = DomainRandWrapperLive(env, create_default_randomizer(env))
+    env = ActNormWrapper(env)
+    if partial:
+        # The observation filter is not supported, thus the chain is only fused down to this wrapper
+        env = ObsPartialWrapper(env, idcs=["theta_dot"], keep_selected=False)
+    env = GaussianObsNoiseWrapper(
+        env, noise_std=0.02 * np.ones(env.obs_space.shape), noise_mean=0.1 * np.ones(env.obs_space.shape)
+    )
+    env = ObsNormWrapper(
+        env, explicit_lb=dict(theta_dot=-20.0, alpha_dot=-20.0), explicit_ub=dict(theta_dot=20.0, alpha_dot=20.0)
+    )
+    env_fused = FusedWrapperStack(env)
+    assert len(env_fused.fused_envs) == 0  # not built yet
+    policy = DummyPolicy(env.spec)
+
+    for seed in range(3):
+        ro_nested = rollout(env, policy, eval=True, seed=seed)
+        ro_fused = rollout(env_fused, policy, eval=True, seed=seed)
+        assert len(ro_nested) == len(ro_fused)
+        assert np.all(ro_nested.observations == ro_fused.observations)
+        assert np.all(ro_nested.actions == ro_fused.actions)
+        assert np.all(ro_nested.rewards == ro_fused.rewards)
+
+    assert len(env_fused.fused_envs) == (2 if partial else 6)
+
+
+@pytest.mark.wrapper
+def test_fused_act_delay():
+    mockenv = MockEnv(act_space=BoxSpace(-1, 1, shape=(2,)))
+    wenv = FusedWrapperStack(ActDelayWrapper(mockenv, delay=2))
+
+    # Reset to initialize buffer
+    wenv.reset()
+
+    wenv.step(np.array([0, 1]))
+    assert mockenv.last_act == [0, 0]
+    wenv.step(np.array([2, 4]))
+    assert mockenv.last_act == [0, 0]
+    wenv.step(np.array([1, 2]))
+    assert mockenv.last_act == [0, 1]
+
+    # Changing the domain parameters hands the delayed actions back to the wrapper, resetting applies the new delay
+    wenv.domain_param = dict(act_delay=1)
+    wenv.step(np.array([2, 3]))
+    assert mockenv.last_act == [2, 4]
+    wenv.reset()
+    wenv.step(np.array([5, 6]))
+    assert mockenv.last_act == [0, 0]
+    wenv.step(np.array([7, 8]))
+    assert mockenv.last_act == [5, 6]
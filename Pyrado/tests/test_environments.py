@@ -29,10 +29,12 @@
 import pytest
 import numpy as np
 import torch as to
+from copy import deepcopy
 
 from pyrado.environments.real_base import RealEnv
 from pyrado.environments.sim_base import SimEnv
 from pyrado.environments.pysim.quanser_ball_balancer import QBallBalancerSim, QBallBalancerKin
+from pyrado.environments.pysim.vectorized import VecSimEnv
 from pyrado.policies.special.dummy import DummyPolicy
 from pyrado.sampling.rollout import rollout
 from pyrado.utils.data_types import RenderMode
@@ -301,6 +303,109 @@ def test_reset(env):
     assert obs2 == pytest.approx(obs1)
 
 
+@pytest.mark.parametrize(
+    "env",
+    [
+        "default_bob",
+        "default_omo",
+        "default_pend",
+        "default_qqst",
+        "default_qqsu",
+        "default_qcpst",
+        "default_qcpsu",
+    ],
+    indirect=True,
+)
+@pytest.mark.parametrize("num_envs", [1, 4], ids=["1env", "4envs"])
+def test_vec_sim_env(env, num_envs):
+    env.max_steps = 200
+    vec_env = VecSimEnv(env, num_envs)
+    envs = [deepcopy(env) for _ in range(num_envs)]
+    for e in envs:
+        e.max_steps = 200
+
+    init_states = np.stack([env.init_space.sample_uniform() for _ in range(num_envs)])
+    obs = vec_env.reset(init_states=init_states)
+    assert obs.shape == (num_envs, env.obs_space.flat_dim)
+    for i, e in enumerate(envs):
+        assert np.all(e.reset(init_state=init_states[i]) == obs[i])
+
+    # Step the batch and the single instances with the same actions, the results must be identical
+    done = np.zeros(num_envs, dtype=np.bool_)
+    while not done.all():
+        acts = np.stack([e.act_space.sample_uniform() for e in envs])
+        obs, rews, dones, _ = vec_env.step(acts)
+        for i, e in enumerate(envs):
+            if not done[i]:
+                obs_i, rew_i, done[i], _ = e.step(acts[i])
+                assert np.all(obs_i == obs[i])
+                assert rew_i == rews[i]
+        assert np.all(done == dones)
+
+
+@pytest.mark.parametrize("env", ["default_qcpsu"], indirect=True)
+def test_domain_param_array(env):
+    # The getter returns a copy, the view does not
+    dp = env.domain_param
+    dp["l_rail"] = 42.0
+    assert env.domain_param["l_rail"] != 42.0
+    assert env.domain_param_view["l_rail"] == env.domain_param["l_rail"]
+    assert set(env.domain_param_view.keys()) == set(env.get_nominal_domain_param().keys())
+
+    # Setting the same or parameters which do not affect the spaces does not rebuild them
+    obs_space = env.obs_space
+    env.domain_param = env.domain_param
+    assert env.obs_space is obs_space
+    env.domain_param = dict(l_pole=0.2, act_delay=2, obs_noise_std=np.ones(3))
+    assert env.obs_space is obs_space
+    assert env.domain_param["act_delay"] == 2 and isinstance(env.domain_param["act_delay"], int)
+    assert env.domain_param_view["l_pole"] == pytest.approx(0.2)
+    assert env.J_pole == pytest.approx(0.2 ** 2 * env.domain_param["m_pole"] / 3.0)
+
+    # Changing a parameter the spaces depend on rebuilds them
+    env.domain_param = dict(l_rail=2.0)
+    assert env.obs_space is not obs_space
+    assert env.obs_space.bound_up[0] == pytest.approx(1.0)
+
+
+@pytest.mark.parametrize(
+    "env",
+    [
+        "default_bob",
+        "default_pend",
+        "default_qbb",
+        "default_qqsu",
+        "default_qcpst",
+        "default_qcpsu",
+    ],
+    indirect=True,
+)
+def test_sim_kernel(env):
+    env.max_steps = 200
+    env_kernel = deepcopy(env)
+    env_kernel.use_kernel = True
+    assert env_kernel.use_kernel
+
+    init_state = env.init_space.sample_uniform()
+    obs = env.reset(init_state=init_state)
+    assert np.all(env_kernel.reset(init_state=init_state) == obs)
+
+    # The compiled dynamics must yield the same trajectory up to the floating-point precision
+    done = False
+    while not done:
+        act = env.act_space.sample_uniform()
+        obs, rew, done, _ = env.step(act.copy())
+        obs_kernel, rew_kernel, done_kernel, _ = env_kernel.step(act.copy())
+        assert obs_kernel == pytest.approx(obs, rel=1e-6, abs=1e-8)
+        assert rew_kernel == pytest.approx(rew, rel=1e-6, abs=1e-8)
+        assert done_kernel == done
+
+    # Domain parameter changes are passed to the kernel
+    kernel_param = env_kernel._kernel_param.copy()
+    env_kernel.domain_param = dict(g=1.0)
+    assert not np.allclose(env_kernel._kernel_param, kernel_param)
+
+
 @pytest.mark.visualization
 @pytest.mark.parametrize(
     "env",
@@ -26,6 +26,7 @@
 # ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
 # POSSIBILITY OF SUCH DAMAGE.
 
+import os
 import pytest
 import numpy as np
 import pandas as pd
@@ -40,7 +41,7 @@ from pyrado.sampling.sbi_embeddings import Embedding
 from pyrado.environments.sim_base import SimEnv
 from pyrado.plotting.categorical import draw_categorical
 from pyrado.plotting.curve import draw_curve_from_data, draw_dts
-from pyrado.plotting.distribution import draw_posterior_distr_pairwise
+from pyrado.plotting.distribution import PosteriorGridEvaluator, draw_posterior_distr_pairwise
 from pyrado.plotting.rollout_based import (
     plot_observations_actions_rewards,
     plot_observations,
@@ -250,7 +251,7 @@ def test_rollout_based(env, policy):
 )
 @pytest.mark.parametrize("layout", ["inside", "outside"], ids=["inside", "outside"])
 @pytest.mark.parametrize("x_labels, y_labels, prob_labels", [(None, None, None), ("", "", "")], ids=["None", "default"])
-def test_pair_plot(env: SimEnv, policy: Policy, layout: str, x_labels, y_labels, prob_labels):
+def test_pair_plot(env: SimEnv, policy: Policy, layout: str, x_labels, y_labels, prob_labels, tmpdir):
     def _simulator(dp: to.Tensor) -> to.Tensor:
         """ The most simple interface of a simulation to sbi, using `env` and `policy` from outer scope """
         ro = rollout(env, policy, eval=True, reset_kwargs=dict(domain_param=dict(m=dp[0], k=dp[1], d=dp[2])))
@@ -295,6 +296,7 @@ def test_pair_plot(env: SimEnv, policy: Policy, layout: str, x_labels, y_labels,
         num_rows, num_cols = len(dp_mapping) + 1, len(dp_mapping) + 1
 
     _, axs = plt.subplots(num_rows, num_cols, figsize=(14, 14), tight_layout=True)
+    grid_evaluator = PosteriorGridEvaluator(chunk_size=1000, cache_dir=tmpdir)
     fig = draw_posterior_distr_pairwise(
         axs,
         posterior,
@@ -310,6 +312,15 @@ def test_pair_plot(env: SimEnv, policy: Policy, layout: str, x_labels, y_labels,
         x_labels=x_labels,
         y_labels=y_labels,
         prob_labels=prob_labels,
+        grid_evaluator=grid_evaluator,
     )
 
     assert fig is not None
+
+    # Every pair of dimensions has been evaluated once, and the evaluations are loaded from disk when re-plotting
+    assert len(os.listdir(tmpdir)) == len(dp_mapping) * (len(dp_mapping) - 1) // 2
+    grid = condition.view(1, -1).repeat(2500, 1)
+    grid[:, 0] = to.linspace(0.5, 1.5, 2500)
+    log_prob = grid_evaluator.log_prob(posterior, grid, data_real[0], False)
+    assert to.allclose(log_prob, posterior.log_prob(grid, data_real[0], norm_posterior=False), atol=1e-5)
+    assert to.equal(PosteriorGridEvaluator(cache_dir=tmpdir).log_prob(posterior, grid, data_real[0], False), log_prob)
@@ -39,6 +39,7 @@ from pyrado.spaces.box import InfBoxSpace
 from pyrado.policies.base import Policy
 from pyrado.policies.special.dual_rfb import DualRBFLinearPolicy
 from pyrado.policies.recurrent.base import default_unpack_hidden, default_pack_hidden
+from pyrado.policies.feed_forward.fnn import FNNPolicy, batched_fnn_forward
 from pyrado.policies.feed_forward.linear import LinearPolicy
 from pyrado.policies.features import *
 from pyrado.policies.recurrent.two_headed_rnn import TwoHeadedRNNPolicyBase
@@ -663,6 +664,59 @@ def test_script_feedforward(env, policy):
     to.testing.assert_allclose(act_reg, act_script)
 
 
+@pytest.mark.parametrize("env", ["default_bob"], ids=["bob"], indirect=True)
+def test_batched_fnn_forward(env):
+    policies = [FNNPolicy(env.spec, hidden_sizes=[16, 16], hidden_nonlin=to.tanh) for _ in range(3)]
+    obs = [to.randn(n, env.obs_space.flat_dim) for n in [4, 7, 1]]
+
+    # Every network gets its own parameters and its own number of inputs
+    acts = batched_fnn_forward([p.net for p in policies], obs)
+    for p, o, a in zip(policies, obs, acts):
+        assert a.shape == (o.shape[0], env.act_space.flat_dim)
+        assert to.allclose(a, p.net(o), atol=1e-6)
+
+    # The gradient reaches every network's parameters
+    to.stack([a.sum() for a in acts]).sum().backward()
+    assert all(p.net.output_layer.weight.grad is not None for p in policies)
+
+    # Networks with different architectures can not be batched
+    policies.append(FNNPolicy(env.spec, hidden_sizes=[8], hidden_nonlin=to.tanh))
+    assert batched_fnn_forward([p.net for p in policies], obs + [obs[0]]) is None
+
+
+@pytest.mark.parametrize("env", ["default_bob", "default_qbb"], ids=["bob", "qbb"], indirect=True)
+@pytest.mark.parametrize(
+    "policy",
+    ["idle_policy", "time_policy", "linear_policy", "fnn_policy"],
+    ids=["idle", "time", "lin", "fnn"],
+    indirect=True,
+)
+def test_compile_inference(env, policy):
+    inference = policy.compile_inference()
+    if not isinstance(policy, (LinearPolicy, FNNPolicy)):
+        # Only stateless policies with parameters support it
+        assert inference is None
+        return
+
+    # Compare results
+    obs = policy.env_spec.obs_space.sample_uniform()
+    with to.no_grad():
+        act_reg = policy(to.from_numpy(obs).to(to.get_default_dtype())).numpy()
+    act_inf = inference(obs)
+    assert isinstance(act_inf, np.ndarray)
+    assert act_inf.shape == act_reg.shape
+    assert np.allclose(act_inf, act_reg, atol=1e-5)
+
+    # The inference function does not follow the changes of the parameters
+    policy.param_values = policy.param_values + 1
+    assert np.allclose(inference(obs), act_inf)
+
+    # The rollout can be done with the inference function in place of the policy
+    ro = rollout(env, policy, eval=True, max_steps=10, inference=policy.compile_inference())
+    ro_reg = rollout(env, policy, eval=True, max_steps=10, reset_kwargs=dict(init_state=ro.states[0]))
+    assert np.allclose(ro.actions, ro_reg.actions, atol=1e-4)
+
+
 @pytest.mark.recurrent_policy
 @pytest.mark.parametrize(
     "env",
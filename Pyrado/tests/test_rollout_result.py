@@ -33,17 +33,22 @@ import pytest
 import numpy as np
 import torch as to
 import itertools
+import os.path as osp
 import pickle
+import random
 from scipy import signal
 from typing import NamedTuple
 
+import pyrado
 from pyrado.algorithms.episodic.sysid_via_episodic_rl import SysIdViaEpisodicRL
 from pyrado.algorithms.utils import ReplayMemory
 from pyrado.policies.special.dummy import DummyPolicy
+from pyrado.sampling.rollout_storage import RolloutArchive
 from pyrado.sampling.step_sequence import StepSequence
 from pyrado.sampling.data_format import to_format
-from pyrado.sampling.step_sequence import discounted_value, gae_returns
+from pyrado.sampling.step_sequence import discounted_value, discounted_reverse_cumsum_segments, gae_returns
 from pyrado.sampling.rollout import rollout
+from pyrado.utils.experiments import load_rollouts_from_dir
 
 
 rewards = [
@@ -361,6 +366,21 @@ def test_advantage_calculation(env, policy):
     assert (gae1 == gae2).all()
 
 
+@pytest.mark.parametrize("gamma", [0.0, 0.9, 1.0], ids=["0", "0.9", "1"])
+def test_discounted_reverse_cumsum_segments(gamma):
+    data = np.random.randn(10)
+    done = np.zeros(10, dtype=np.bool_)
+    done[[2, 3, 9]] = True
+
+    cumsum = discounted_reverse_cumsum_segments(data, gamma, done)
+
+    # Compare to the step-wise computation
+    cumsum_loop = np.empty_like(data)
+    for k in reversed(range(len(data))):
+        cumsum_loop[k] = data[k] if done[k] else data[k] + gamma * cumsum_loop[k + 1]
+    assert np.allclose(cumsum, cumsum_loop)
+
+
 @pytest.mark.parametrize(
     "capacity",
     [
@@ -392,6 +412,53 @@ def test_replay_memory(capacity):
     assert all(rm.memory.observations[-1] == ro2.observations[-2])  # -2 since one was truncated
 
 
+@pytest.mark.parametrize("capacity", [3, 7, 50], ids=["3", "7", "50"])
+def test_replay_memory_sample(capacity):
+    rm = ReplayMemory(capacity)
+
+    # Push more steps than the capacity to wrap around the circular buffers
+    for k in range(5):
+        rews = np.arange(len(rewards), dtype=np.float64) + k * len(rewards)  # unique values to identify the steps
+        ro = StepSequence(rewards=rews, observations=observations, states=states, actions=actions, hidden=hidden)
+        rm.push([ro])
+    assert len(rm) == min(capacity, 5 * len(rewards))
+
+    steps, next_steps = rm.sample(batch_size=2)
+    assert isinstance(steps.observations, to.Tensor) and isinstance(next_steps.actions, to.Tensor)
+    assert steps.length == next_steps.length == 2
+
+    # The next steps must be the chronological successors in the memory
+    mem = rm.memory
+    for rew, next_obs in zip(steps.rewards, next_steps.observations):
+        idx = int(np.flatnonzero(mem.rewards == rew.item())[0])
+        assert idx < len(rm) - 1
+        assert to.all(next_obs == to.from_numpy(mem.observations[idx + 1]).float())
+
+
+def test_replay_memory_nested_data():
+    rm = ReplayMemory(8)
+    hid_nt = [DummyNT(*it) for it in hidden]
+    ro = StepSequence(
+        rewards=rewards, observations=observations, actions=actions, policy_infos=policy_infos, hidden=hid_nt
+    )
+    rm.push(ro, truncate_last=False)
+
+    # The nested data fields are not dropped
+    mem = rm.memory
+    assert isinstance(mem.hidden, DummyNT)
+    assert np.all(mem.hidden.part2 == np.stack([h[1] for h in hidden]))
+    assert np.all(mem.policy_infos["mean"] == np.stack([pi["mean"] for pi in policy_infos]))
+
+    # The samples only depend on numpy's random number generator
+    np.random.seed(0)
+    steps, next_steps = rm.sample(batch_size=3)
+    np.random.seed(0)
+    random.seed(1)
+    steps_rep, _ = rm.sample(batch_size=3)
+    assert isinstance(next_steps.hidden, DummyNT) and isinstance(next_steps.hidden.part1, to.Tensor)
+    assert to.all(steps.rewards == steps_rep.rewards)
+
+
 # A dummy namedtuple for testing
 class DummyNT(NamedTuple):
     part1: to.Tensor
@@ -482,3 +549,70 @@ def test_process(data_format):
 
     assert isinstance(ro_proc, StepSequence)
     assert ro_proc.length == ro.length
+
+
+@pytest.mark.parametrize("data_format", ["numpy", "torch"])
+def test_rollout_archive(data_format, tmpdir):
+    hid_nt = [DummyNT(*it) for it in hidden]
+    ros = [
+        StepSequence(
+            rewards=np.array(rewards) + k,
+            observations=observations,
+            states=states,
+            actions=actions,
+            policy_infos=policy_infos,
+            hidden=hid_nt,
+            rollout_info=dict(k=k),
+            data_format=data_format,
+        )
+        for k in range(3)
+    ]
+
+    archive = RolloutArchive(osp.join(tmpdir, "rollouts"))
+    archive.append(ros[:2])
+
+    # Reopen the archive and append to it
+    archive = RolloutArchive(osp.join(tmpdir, "rollouts"))
+    archive.append(ros[2])
+    assert RolloutArchive.is_archive(archive.archive_dir)
+    assert len(archive) == 3
+    assert archive.column("rewards").shape == (3 * len(rewards),)
+    assert archive.column("observations").shape == (3 * len(observations), 3)
+
+    for ro, ro_loaded in zip(ros, archive):
+        assert ro_loaded.data_format == data_format
+        assert ro_loaded.rollout_info == ro.rollout_info
+        assert ro_loaded.length == ro.length
+        assert np.all(ro_loaded.done == ro.done)
+        assert np.all(to_format(ro_loaded.rewards, "numpy") == to_format(ro.rewards, "numpy"))
+        assert np.all(to_format(ro_loaded.observations, "numpy") == to_format(ro.observations, "numpy"))
+        assert np.all(
+            to_format(ro_loaded.policy_infos["mean"], "numpy") == to_format(ro.policy_infos["mean"], "numpy")
+        )
+        assert isinstance(ro_loaded.hidden, DummyNT)
+        assert np.all(to_format(ro_loaded.hidden.part2, "numpy") == to_format(ro.hidden.part2, "numpy"))
+
+
+def test_rollout_archive_keys_and_precedence(tmpdir):
+    ros = [
+        StepSequence(
+            rewards=np.array(rewards) + k,
+            observations=observations,
+            actions=actions,
+            env_infos=[{"a/b": float(i)} for i in range(len(rewards))],
+            data_format="numpy",
+        )
+        for k in range(2)
+    ]
+
+    # Keys containing a path separator must not be interpreted as subdirectories
+    archive = RolloutArchive(osp.join(tmpdir, "rollouts"))
+    archive.append(ros)
+    assert np.all(archive[1].env_infos["a/b"] == np.arange(len(rewards)))
+
+    # The archive takes precedence over the rollout files in the same directory
+    for i, ro in enumerate(ros):
+        pyrado.save(ro, f"rollout_{i}", "pkl", str(tmpdir))
+    ros_loaded, names = load_rollouts_from_dir(str(tmpdir), key="rollout")
+    assert names == ["rollouts"]
+    assert len(ros_loaded) == len(ros)
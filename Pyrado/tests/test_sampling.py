@@ -26,27 +26,46 @@
 # ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
 # POSSIBILITY OF SUCH DAMAGE.
 
+import multiprocessing as mp
+import os
 import random
 import time
+from collections import OrderedDict
 
 import pyrado
 import pytest
 from pyrado.domain_randomization.default_randomizers import create_default_randomizer
+from pyrado.environment_wrappers.action_normalization import ActNormWrapper
 from pyrado.environment_wrappers.domain_randomization import DomainRandWrapperLive
+from pyrado.environment_wrappers.observation_noise import GaussianObsNoiseWrapper
 from pyrado.environments.sim_base import SimEnv
 from pyrado.policies.base import Policy
 from pyrado.policies.features import *
 from pyrado.sampling.bootstrapping import bootstrap_ci
 from pyrado.sampling.cvar_sampler import select_cvar
 from pyrado.sampling.data_format import to_format
+from pyrado.domain_randomization.utils import param_grid
 from pyrado.sampling.hyper_sphere import sample_from_hyper_sphere_surface
+from pyrado.sampling.parallel_evaluation import (
+    eval_domain_params,
+    eval_domain_params_reduced,
+    reduce_final_state,
+    reduce_return,
+)
 from pyrado.sampling.parallel_rollout_sampler import ParallelRolloutSampler
 from pyrado.sampling.parameter_exploration_sampler import ParameterExplorationSampler, ParameterSamplingResult
-from pyrado.sampling.rollout import rollout
+from pyrado.environments.pysim.vectorized import VecSimEnv
+from pyrado.logger.step import StepLogger
+from pyrado.sampling.rollout import batched_rollout, rollout
+from pyrado.sampling.rollout_cache import RolloutCache
 from pyrado.sampling.sampler_pool import *
+from pyrado.sampling.sbi_embeddings import LastStepEmbedding
+from pyrado.sampling.sbi_rollout_sampler import SimRolloutSamplerForSBI
 from pyrado.sampling.sequences import *
 from pyrado.sampling.step_sequence import StepSequence
+from pyrado.spaces.singular import SingularStateSpace
 from pyrado.utils.data_types import RenderMode
+from pyrado.utils.profiling import collect_from_pool, enable_in_pool, profiler
 from torch.distributions.multivariate_normal import MultivariateNormal
 
 from tests.conftest import m_needs_bullet, m_needs_cuda
@@ -68,6 +87,83 @@ def test_sampler_pool(arg):
     assert result == list(map(lambda x: x * 2, arg))
 
 
+@pytest.mark.parametrize("num_threads", [1, 3])
+@pytest.mark.parametrize("adaptive_chunks", [False, True], ids=["single", "adaptive"])
+@pytest.mark.parametrize("with_costs", [False, True], ids=["nocosts", "costs"])
+def test_sampler_pool_run_map(num_threads, adaptive_chunks, with_costs):
+    arglist = list(range(20))
+    expected_costs = [random.random() for _ in arglist] if with_costs else None
+
+    pool = SamplerPool(num_threads)
+    result = pool.run_map(
+        _cb_test_maphandler, arglist, adaptive_chunks=adaptive_chunks, expected_costs=expected_costs
+    )
+    pool.stop()
+
+    # The results must be in the order of the arguments regardless of the scheduling
+    assert result == [2 * arg for arg in arglist]
+    assert len(pool.utilization_stats) == num_threads
+    assert sum(stats["num_items"] for stats in pool.utilization_stats) == len(arglist)
+    assert all(0 <= stats["utilization"] <= 1 for stats in pool.utilization_stats)
+
+
+def _cb_test_maphandler(G, arg):
+    time.sleep(0.01)
+    return 2 * arg
+
+
+@pytest.mark.parametrize("data_format", ["numpy", "torch"])
+def test_sampler_pool_shared_memory(data_format):
+    pool = SamplerPool(2, shared_memory=True)
+    result = pool.run_map(_cb_test_rollouthandler, [(k, data_format) for k in range(4)])
+    pool.stop()
+
+    for k, ro in enumerate(result):
+        assert isinstance(ro, StepSequence)
+        assert ro.data_format == data_format
+        assert ro.length == 5 + k
+        assert ro.rollout_info["k"] == k
+        assert np.all(to_format(ro.rewards, "numpy") == k)
+        assert to_format(ro.observations, "numpy").shape == (6 + k, 3)
+        assert ro.done[-1] and not ro.done[0]
+
+
+def test_sampler_pool_shared_memory_containers():
+    pool = SamplerPool(2, shared_memory=True)
+    result = pool.run_map(_cb_test_containerhandler, list(range(6)))
+
+    # The dict types survive the round trip
+    for k, res in enumerate(result):
+        assert isinstance(res, OrderedDict)
+        assert list(res.keys()) == ["b", "a"]
+        assert isinstance(res["a"], to.Tensor) and to.all(res["a"] == k)
+        assert isinstance(res["b"], np.ndarray) and np.all(res["b"] == k)
+
+    # Tensors without numpy equivalent are rejected
+    with pytest.raises(RuntimeError, match="shared memory"):
+        pool.run_map(_cb_test_bfloat16handler, list(range(2)))
+    pool.stop()
+
+
+def _cb_test_containerhandler(G, arg):
+    return OrderedDict([("b", np.full(3, arg)), ("a", to.full((2,), float(arg)))])
+
+
+def _cb_test_bfloat16handler(G, arg):
+    return to.zeros(2, dtype=to.bfloat16)
+
+
+def _cb_test_rollouthandler(G, arg):
+    k, data_format = arg
+    return StepSequence(
+        rewards=np.full(5 + k, k, dtype=np.float64),
+        observations=np.random.randn(6 + k, 3),
+        actions=np.random.randn(5 + k, 2).astype(np.float32),
+        rollout_info=dict(k=k),
+        data_format=data_format,
+    )
+
+
 def _cb_test_eachhandler(G, arg):
     time.sleep(random.randint(1, 5))
     return arg * 2
@@ -78,6 +174,29 @@ def _cb_test_collecthandler(G):
     return nsample, nsample
 
 
+def test_sampler_pool_forked_process():
+    pool = SamplerPool(2)
+    ctx = mp.get_context("fork")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_cb_test_use_inherited_pool, args=(pool, queue))
+    proc.start()
+    assert queue.get(timeout=10) == "rejected"
+    proc.join()
+
+    # The forked process must not have stopped the workers
+    assert pool.invoke_all(_cb_test_maphandler, 1) == [2, 2]
+    pool.stop()
+
+
+def _cb_test_use_inherited_pool(pool, queue):
+    try:
+        pool.invoke_all(_cb_test_maphandler, 1)
+        queue.put("used")
+    except RuntimeError:
+        queue.put("rejected")
+    pool.stop()
+
+
 @pytest.mark.parametrize("num_threads", [1, 2, 4])
 @pytest.mark.parametrize("min_samples", [10, 20, 40])
 def test_sampler_collect(num_threads: int, min_samples: int):
@@ -236,6 +355,160 @@ def test_rollout_wo_policy(env: SimEnv):
     assert len(ro) <= env.max_steps
 
 
+@pytest.mark.parametrize(
+    "env", ["default_bob", "default_qqsu", "default_qcpst"], ids=["bob", "qqsu", "qcpst"], indirect=True
+)
+@pytest.mark.parametrize("policy", ["linear_policy", "fnn_policy"], ids=["lin", "fnn"], indirect=True)
+def test_batched_rollout(env: SimEnv, policy: Policy):
+    num_envs = 3
+    env.max_steps = 200
+    init_states = np.stack([env.init_space.sample_uniform() for _ in range(num_envs)])
+    ros = batched_rollout(VecSimEnv(env, num_envs), policy, eval=True, reset_kwargs=dict(init_states=init_states))
+    assert len(ros) == num_envs
+
+    for i, ro_b in enumerate(ros):
+        assert isinstance(ro_b, StepSequence)
+        # Evaluating the policy on a batch leads to numerical differences in the order of the float precision
+        ro = rollout(env, policy, eval=True, reset_kwargs=dict(init_state=init_states[i]))
+        assert ro_b.length == ro.length
+        assert ro_b.observations == pytest.approx(ro.observations, abs=1e-4)
+        assert ro_b.rewards == pytest.approx(ro.rewards, abs=1e-4)
+        assert ro_b.time == pytest.approx(ro.time)
+
+
+@pytest.mark.parametrize(
+    "env", ["default_bob", "default_qqsu", "default_qcpst"], ids=["bob", "qqsu", "qcpst"], indirect=True
+)
+@pytest.mark.parametrize("policy", ["linear_policy", "fnn_policy"], ids=["lin", "fnn"], indirect=True)
+def test_rollout_preallocated(env: SimEnv, policy: Policy):
+    env.max_steps = 200
+    init_state = env.init_space.sample_uniform()
+    ro = rollout(env, policy, eval=True, reset_kwargs=dict(init_state=init_state))
+    ro_pre = rollout(env, policy, eval=True, reset_kwargs=dict(init_state=init_state), preallocate=True)
+
+    assert ro_pre.length == ro.length
+    assert np.allclose(ro_pre.observations, ro.observations)
+    assert np.allclose(ro_pre.states, ro.states)
+    assert np.allclose(ro_pre.actions, ro.actions)
+    assert np.allclose(ro_pre.rewards, ro.rewards)
+    assert np.allclose(ro_pre.time, ro.time)
+    assert np.all(ro_pre.done == ro.done)
+
+
+def _rollout_in_worker(G, env, policy):
+    return rollout(env, policy, eval=True, max_steps=20)
+
+
+@pytest.mark.parametrize("env", ["default_bob"], ids=["bob"], indirect=True)
+@pytest.mark.parametrize("policy", ["linear_policy"], ids=["lin"], indirect=True)
+def test_step_profiler(env: SimEnv, policy: Policy, tmpdir):
+    env = ActNormWrapper(env)
+    pool = SamplerPool(2)
+    enable_in_pool(pool)
+    try:
+        rollout(env, policy, eval=True, max_steps=20)
+        pool.invoke_all(_rollout_in_worker, env, policy)
+        collect_from_pool(pool)
+    finally:
+        enable_in_pool(pool, enable=False)
+        pool.stop()
+
+    # One rollout in the main process and one per worker
+    stats = profiler.stats
+    assert stats["rollout.env_step"]["count"] == 3 * 20
+    assert stats["ActNormWrapper.step"]["count"] == 3 * 20
+    assert stats[f"{type(policy).__name__}.forward"]["count"] >= 3 * 20
+    assert all(s["self_ns"] <= s["total_ns"] for s in stats.values())
+
+    # The methods are restored after disabling
+    assert not hasattr(ActNormWrapper.step, "__wrapped__")
+
+    profiler.save_folded(str(tmpdir.join("rollout.folded")))
+    with open(str(tmpdir.join("rollout.folded"))) as f:
+        assert any(line.startswith("rollout.env_step;ActNormWrapper.step") for line in f)
+    profiler.reset()
+
+
+def test_step_profiler_section():
+    profiler.enable()
+    try:
+        with pytest.raises(ValueError):
+            with profiler.section("outer"):
+                with profiler.section("inner"):
+                    raise ValueError
+    finally:
+        profiler.disable()
+
+    # The sections are closed even if the enclosed code raised
+    assert profiler.stats["outer"]["count"] == 1
+    assert profiler.stats["inner"]["count"] == 1
+    assert profiler.stats["outer"]["self_ns"] <= profiler.stats["outer"]["total_ns"]
+    profiler.reset()
+
+
+@pytest.mark.parametrize("env", ["default_bob"], ids=["bob"], indirect=True)
+@pytest.mark.parametrize("policy", ["linear_policy"], ids=["lin"], indirect=True)
+@pytest.mark.parametrize("num_workers", [1, 2], ids=["1worker", "2workers"])
+def test_parallel_rollout_sampler_profile(env: SimEnv, policy: Policy, num_workers: int):
+    sampler = ParallelRolloutSampler(env, policy, num_workers, min_rollouts=2, profile=True)
+    logger = StepLogger()
+    sampler._logger = logger  # usually, the logger is the one of the algorithm holding the sampler
+    try:
+        # With multiple workers, the methods of the main process are not instrumented
+        assert hasattr(type(policy).forward, "__wrapped__") == (num_workers == 1)
+
+        sampler.sample()
+        assert logger._current_values["sampler prof rollout.env_step [us]"] > 0
+        assert not profiler.stats  # the recorded data is reset after logging
+    finally:
+        sampler.close()
+
+    # The methods are restored after closing the sampler
+    assert not hasattr(type(policy).forward, "__wrapped__")
+    assert not profiler.enabled
+
+
+@pytest.mark.parametrize("env", ["default_bob"], ids=["bob"], indirect=True)
+@pytest.mark.parametrize("policy", ["linear_policy"], ids=["lin"], indirect=True)
+def test_rollout_cache(env: SimEnv, policy: Policy, tmpdir):
+    cache = RolloutCache(max_size=2, cache_dir=str(tmpdir))
+    init_state = env.init_space.sample_uniform()
+
+    ro = rollout(env, policy, eval=True, reset_kwargs=dict(init_state=init_state), cache=cache)
+    ro_cached = rollout(env, policy, eval=True, reset_kwargs=dict(init_state=init_state), cache=cache)
+    assert cache.num_misses == 1 and cache.num_hits == 1
+    assert ro_cached is not ro
+    assert np.all(ro_cached.observations == ro.observations)
+
+    # On a hit, the environment is reset but not stepped
+    assert np.allclose(env.state, init_state)
+
+    # A random initial state can not be cached without a seed
+    rollout(env, policy, eval=True, cache=cache)
+    assert len(cache) == 1
+
+    # Neither can the rollouts of an environment with noise
+    env_noisy = GaussianObsNoiseWrapper(env, noise_std=0.1 * np.ones(env.obs_space.shape))
+    rollout(env_noisy, policy, eval=True, reset_kwargs=dict(init_state=init_state), cache=cache)
+    assert len(cache) == 1
+
+    # Changing the policy changes the key
+    param_values = policy.param_values
+    policy.param_values = param_values + 1.0
+    rollout(env, policy, eval=True, reset_kwargs=dict(init_state=init_state), cache=cache)
+    assert cache.num_misses == 2
+
+    # The on-disk tier serves a new cache
+    policy.param_values = param_values
+    cache_disk = RolloutCache(cache_dir=str(tmpdir))
+    ro_disk = rollout(env, policy, eval=True, reset_kwargs=dict(init_state=init_state), cache=cache_disk)
+    assert cache_disk.num_hits == 1
+    assert np.all(ro_disk.rewards == ro.rewards)
+
+    # No temporary files are left behind
+    assert not [f for f in os.listdir(str(tmpdir)) if not f.endswith(".pkl")]
+
+
 @pytest.mark.parametrize(
     "mean, cov",
     [
@@ -311,6 +584,46 @@ def test_boostrap_methods(sample, seed):
     assert ci_up != ci_bs_up
 
 
+@pytest.mark.parametrize(
+    "data",
+    [np.random.normal(10, 1, (40,)), np.random.normal((1, 7, 13), (1, 1, 1), (40, 3))],
+    ids=["1dim-data", "3dim-data"],
+)
+@pytest.mark.parametrize("stat_fcn", [np.mean, np.median], ids=["mean", "median"])
+def test_bootstrapping_chunks(data, stat_fcn):
+    kwargs = dict(num_reps=1000, alpha=0.05, ci_sides=2, studentized=True, seed=0)
+    m, ci_lo, ci_up = bootstrap_ci(data, stat_fcn, **kwargs)
+    assert np.all(m >= ci_lo)
+    assert np.all(m <= ci_up)
+
+    # The result only depends on the seed and the chunk size, not on the number of workers
+    m_c, ci_lo_c, ci_up_c = bootstrap_ci(data, stat_fcn, chunk_size=64, **kwargs)
+    m_p, ci_lo_p, ci_up_p = bootstrap_ci(data, stat_fcn, chunk_size=64, num_workers=2, **kwargs)
+    assert m_c == pytest.approx(m)
+    assert ci_lo_p == pytest.approx(ci_lo_c)
+    assert ci_up_p == pytest.approx(ci_up_c)
+
+    # Different chunks yield different replications, but the intervals should roughly agree
+    assert ci_lo_c == pytest.approx(ci_lo, rel=0.1)
+    assert ci_up_c == pytest.approx(ci_up, rel=0.1)
+
+    # With the default chunk size, the result does not depend on the number of workers either
+    _, ci_lo_d, ci_up_d = bootstrap_ci(data, stat_fcn, num_workers=2, **kwargs)
+    assert ci_lo_d == pytest.approx(ci_lo)
+    assert ci_up_d == pytest.approx(ci_up)
+
+
+def test_bootstrapping_studentized_offset():
+    # The studentized interval must not suffer from a large offset of the data
+    data = np.random.normal(10, 1, (40,))
+    offset = 1e9
+    kwargs = dict(num_reps=1000, alpha=0.05, ci_sides=2, studentized=True, seed=0)
+    _, ci_lo, ci_up = bootstrap_ci(data, np.mean, **kwargs)
+    _, ci_lo_off, ci_up_off = bootstrap_ci(data + offset, np.mean, **kwargs)
+    assert ci_lo_off - offset == pytest.approx(ci_lo, abs=1e-3)
+    assert ci_up_off - offset == pytest.approx(ci_up, abs=1e-3)
+
+
 @pytest.mark.parametrize(
     "data",
     [np.random.normal(10, 1, (40,)), np.random.normal((1, 7, 13), (1, 1, 1), (40, 3))],
@@ -471,6 +784,66 @@ def test_parallel_rollout_sampler(env: SimEnv, policy: Policy, num_workers: int)
     assert len(ros) >= min_rollouts
 
 
+@pytest.mark.parametrize("env", ["default_bob"], ids=["bob"], indirect=True)
+@pytest.mark.parametrize("policy", ["linear_policy", "fnn_policy"], ids=["lin", "fnn"], indirect=True)
+@pytest.mark.parametrize("num_workers", [1, 2], ids=["1worker", "2workers"])
+@pytest.mark.parametrize("compile_policy", [False, True], ids=["eager", "compiled"])
+def test_parallel_rollout_sampler_policy_update(env: SimEnv, policy: Policy, num_workers: int, compile_policy: bool):
+    sampler = ParallelRolloutSampler(
+        env, policy, num_workers, min_rollouts=2 * num_workers, compile_policy=compile_policy
+    )
+
+    # The workers have to pick up the parameters changed after the construction
+    policy.param_values = to.zeros_like(policy.param_values)
+    for ro in sampler.sample(eval=True):
+        assert np.allclose(to_format(ro.actions, "numpy"), 0.0)
+
+    policy.param_values = to.ones_like(policy.param_values)
+    for ro in sampler.sample(eval=True):
+        assert not np.allclose(to_format(ro.actions, "numpy"), 0.0)
+
+
+@pytest.mark.parametrize("env", ["default_bob"], ids=["bob"], indirect=True)
+@pytest.mark.parametrize("policy", ["linear_policy"], ids=["lin"], indirect=True)
+@pytest.mark.parametrize("num_workers", [1, 2], ids=["1worker", "2workers"])
+def test_parallel_rollout_sampler_log_utilization(env: SimEnv, policy: Policy, num_workers: int):
+    sampler = ParallelRolloutSampler(env, policy, num_workers, min_rollouts=2 * num_workers, log_utilization=True)
+    logger = StepLogger()
+    sampler._logger = logger  # usually, the logger is the one of the algorithm holding the sampler
+
+    sampler.sample()
+    assert logger._current_values["sampler max num items"] >= 2
+    assert 0 <= logger._current_values["sampler min util"] <= logger._current_values["sampler avg util"] <= 1
+
+    # A standalone sampler does not have a logger, thus it skips logging
+    sampler = ParallelRolloutSampler(env, policy, num_workers, min_rollouts=2 * num_workers, log_utilization=True)
+    assert len(sampler.sample()) >= 2 * num_workers
+    assert sampler._logger is None
+    assert len(sampler.pool.utilization_stats) == num_workers
+
+
+@pytest.mark.parametrize("env", ["default_bob"], ids=["bob"], indirect=True)
+@pytest.mark.parametrize("policy", ["linear_policy"], ids=["lin"], indirect=True)
+@pytest.mark.parametrize("num_workers", [1, 2], ids=["1worker", "2workers"])
+def test_sbi_rollout_sampler_policy_update(env: SimEnv, policy: Policy, num_workers: int):
+    # Fix the initial state such that the simulations are deterministic
+    env.init_space = SingularStateSpace(env.init_space.sample_uniform())
+    embedding = LastStepEmbedding(env.spec, SimRolloutSamplerForSBI.get_dim_data(env.spec))
+    sampler = SimRolloutSamplerForSBI(env, policy, {0: "m_ball"}, embedding, num_segments=1, num_workers=num_workers)
+    dp_values = to.tensor([[0.5], [0.6], [0.7], [0.8]])
+
+    # The workers have to pick up the parameters changed between the calls
+    policy.param_values = to.zeros_like(policy.param_values)
+    data_zeros = sampler(dp_values)
+    policy.param_values = to.ones_like(policy.param_values)
+    data_ones = sampler(dp_values)
+    assert not to.allclose(data_zeros, data_ones)
+    policy.param_values = to.zeros_like(policy.param_values)
+    assert to.allclose(sampler(dp_values), data_zeros)
+
+    sampler.stop()
+
+
 @m_needs_cuda
 @pytest.mark.skip
 @pytest.mark.wrapper
@@ -534,3 +907,42 @@ def test_sequential_equals_parallel(env: SimEnv, policy: Policy, num_simulations
     for ro_s in ros_sequential:
         # The parallel rollouts are not necessarily in the same order as the sequential ones, thus compare to all
         assert any([ro_s.observations == pytest.approx(ro_p.observations) for ro_p in ros_parallel])
+
+
+@pytest.mark.parametrize("env", ["default_pend"], indirect=True)
+@pytest.mark.parametrize("policy", ["idle_policy"], ids=["idle"], indirect=True)
+@pytest.mark.parametrize("num_workers", [1, 2], ids=["1worker", "2workers"])
+def test_eval_domain_params_reduced(env: SimEnv, policy: Policy, num_workers: int, tmpdir):
+    env.max_steps = 50
+    params = param_grid(dict(m_pole=np.linspace(0.8, 1.2, 4), d_pole=np.array([0.0, 0.1])))
+    init_state = np.array([0.3, 0.0])
+    pool = SamplerPool(num_workers)
+    ros = eval_domain_params(pool, env, policy, params, init_state)
+
+    reducers = dict(ret=reduce_return, state=reduce_final_state)
+    save_path = str(tmpdir.join("grid.csv"))
+    df = eval_domain_params_reduced(pool, env, policy, params, reducers, init_state, save_path=save_path, chunk_size=3)
+    assert "idx" not in df.columns
+    assert np.allclose(df["m_pole"], [p["m_pole"] for p in params])
+    assert np.allclose(df["l_pole"], env.domain_param["l_pole"])  # not varied, but still recorded
+    assert np.allclose(df["ret"], [ro.undiscounted_return() for ro in ros])
+    assert np.allclose(df[["state_0", "state_1"]].values, [ro.states[-1] for ro in ros])
+
+    # Simulate an interrupted evaluation by dropping the last results and leaving an incomplete line behind, only the
+    # missing results are evaluated again
+    with open(save_path) as f:
+        lines = f.readlines()
+    with open(save_path, "w") as f:
+        f.writelines(lines[:4] + [lines[4][:5]])
+    df_resumed = eval_domain_params_reduced(pool, env, policy, params, reducers, init_state, save_path=save_path)
+    assert list(df_resumed.columns) == list(df.columns)
+    assert np.allclose(df_resumed.values, df.values)
+    with open(save_path) as f:
+        assert len(f.readlines()) == len(params) + 1
+
+    # A table from a different grid or with different reducers is rejected
+    with pytest.raises(pyrado.ValueErr):
+        eval_domain_params_reduced(pool, env, policy, params[::-1], reducers, init_state, save_path=save_path)
+    with pytest.raises(pyrado.ValueErr):
+        eval_domain_params_reduced(pool, env, policy, params, dict(ret=reduce_return), init_state, save_path=save_path)
+    pool.stop()
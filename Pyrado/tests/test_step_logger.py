@@ -27,12 +27,23 @@
 # POSSIBILITY OF SUCH DAMAGE.
 
 import csv
+import multiprocessing as mp
+import numpy as np
+import os.path as osp
 import pickle
 import pytest
 import unittest.mock as mock
 
 import pyrado
 import pyrado.logger.step as uut
+from pyrado.utils.experiments import (
+    IncrementalBinaryLoader,
+    IncrementalCSVLoader,
+    has_complete_binary_progress,
+    read_bin_w_replace,
+    read_csv_w_replace,
+    read_progress_w_replace,
+)
 
 
 def test_first_step():
@@ -217,3 +228,156 @@ def test_tb_logger_serializer(tmpdir):
 
     assert len(logger_reser.printers) == 1
     assert isinstance(logger_reser.printers[0], uut.TensorBoardPrinter)
+
+
+def test_async_printer(tmpdir):
+    outfile = tmpdir / "testout.csv"
+
+    # Create csv logger which writes in the background
+    ap = uut.AsyncPrinter(uut.CSVPrinter(outfile, flush_intvl=5), max_queue_size=2)
+    logger = uut.StepLogger()
+    logger.printers.append(ap)
+
+    # Log more steps than fit into the queue
+    for i in range(10):
+        logger.add_value("Value1", i)
+        logger.add_value("Value2", [i, 2 * i])
+        logger.record_step()
+
+    # Wait for all steps to be written, then serialize / deserialize
+    logger.flush()
+    logger_reser = pickle.loads(pickle.dumps(logger, pickle.HIGHEST_PROTOCOL))
+    logger_reser.add_value("Value1", 100)
+    logger_reser.add_value("Value2", [100, 200])
+    logger_reser.record_step()
+    logger_reser.flush()
+
+    with outfile.open() as outfilehandle:
+        rows = list(csv.DictReader(outfilehandle))
+
+    assert len(rows) == 11
+    assert [row["Value1"] for row in rows] == [str(i) for i in range(10)] + ["100"]
+    assert rows[3]["Value2"] == "[3, 6]"
+
+    ap.close()
+    logger_reser.printers[0].close()
+
+
+def _log_in_child(logger: uut.StepLogger):
+    """ Pickle the logger and log a step in a forked process. """
+    pickle.dumps(logger)
+    logger.add_value("Value1", -1)
+    logger.record_step()
+    logger.flush()
+
+
+def test_async_printer_fork(tmpdir):
+    ap = uut.AsyncPrinter(uut.CSVPrinter(tmpdir / "testout.csv"), max_queue_size=2)
+    logger = uut.StepLogger()
+    logger.printers.append(ap)
+    for i in range(10):
+        logger.add_value("Value1", i)
+        logger.record_step()
+
+    # The child inherits the queue but not the background thread, it must neither block on pickling nor on flushing
+    proc = mp.get_context("fork").Process(target=_log_in_child, args=(logger,))
+    proc.start()
+    proc.join(timeout=30)
+    if proc.is_alive():
+        proc.terminate()
+    assert proc.exitcode == 0
+
+    ap.close()
+
+
+def test_binary_column_printer(tmpdir):
+    outdir = str(tmpdir / "progress_bin")
+
+    # Create binary logger
+    bp = uut.BinaryColumnPrinter(outdir, flush_intvl=3)
+    logger = uut.StepLogger()
+    logger.printers.append(bp)
+
+    # Log some values, the string is not numeric in the first step and thus not stored
+    for i in range(5):
+        logger.add_value("Value1", i)
+        logger.add_value("Value2", np.array([i, 2 * i]))
+        logger.add_value("Value3", "" if i == 2 else 0.5)
+        logger.add_value("Name", "dummy")
+        logger.record_step()
+
+    # Serialize / deserialize
+    logger_reser = pickle.loads(pickle.dumps(logger, pickle.HIGHEST_PROTOCOL))
+    logger_reser.add_value("Value1", 100)
+    logger_reser.add_value("Value2", np.array([100, 200]))
+    logger_reser.record_step()
+    logger_reser.flush()
+
+    data = uut.read_binary_log(outdir)
+    assert list(data.keys()) == ["Value1", "Value2", "Value3"]
+    assert np.all(data["Value1"] == [0, 1, 2, 3, 4, 100])
+    assert data["Value2"].shape == (6, 2)
+    assert np.all(data["Value2"][:, 1] == [0, 2, 4, 6, 8, 200])
+    assert np.isnan(data["Value3"][2]) and data["Value3"][0] == 0.5
+
+    # A partially written step is discarded
+    with open(osp.join(outdir, "col0.bin"), "ab") as f:
+        f.write(np.zeros(1).tobytes())
+    assert len(uut.read_binary_log(outdir)["Value1"]) == 6
+
+
+@pytest.mark.parametrize("name", [0.5, "dummy"], ids=["numeric", "non-numeric"])
+def test_read_progress_fallback(tmpdir, name):
+    logger = uut.StepLogger()
+    logger.printers.append(uut.CSVPrinter(str(tmpdir / "progress.csv")))
+    logger.printers.append(uut.BinaryColumnPrinter(str(tmpdir / "progress_bin"), flush_intvl=1))
+    for i in range(3):
+        logger.add_value("iteration", i)
+        logger.add_value("avg return", 2.0 * i)
+        logger.add_value("name", name)
+        logger.record_step()
+
+    # The binary log is only used if it contains all columns of the CSV file
+    assert has_complete_binary_progress(str(tmpdir)) == isinstance(name, float)
+    df = read_progress_w_replace(str(tmpdir))
+    assert list(df.columns) == ["avg_return", "name"]
+    assert np.allclose(df.avg_return, [0.0, 2.0, 4.0])
+
+
+@pytest.mark.parametrize("binary", [False, True], ids=["csv", "binary"])
+def test_incremental_loader(tmpdir, binary):
+    if binary:
+        path = str(tmpdir / "progress_bin")
+        printer = uut.BinaryColumnPrinter(path, flush_intvl=1)
+        loader = IncrementalBinaryLoader()
+    else:
+        path = str(tmpdir / "progress.csv")
+        printer = uut.CSVPrinter(path)
+        loader = IncrementalCSVLoader()
+    logger = uut.StepLogger()
+    logger.printers.append(printer)
+
+    def _log(iterations):
+        for i in iterations:
+            logger.add_value("iteration", i)
+            logger.add_value("avg return", 2.0 * i)
+            logger.record_step()
+
+    # The first load of a freshly built loader reads the file from the beginning
+    _log(range(3))
+    assert loader.data is None
+    df, df_new = loader.load(path)
+    assert len(df) == 3 and len(df_new) == 3
+
+    # Nothing new
+    _, df_new = loader.load(path)
+    assert df_new is None
+
+    # Only the appended rows are new, the columns are named as by read_csv_w_replace
+    _log(range(3, 5))
+    df, df_new = loader.load(path)
+    assert list(df_new.index) == [3, 4]
+    assert list(df.index) == list(range(5))
+    assert list(df.avg_return) == [2.0 * i for i in range(5)]
+    df_full = read_bin_w_replace(path) if binary else read_csv_w_replace(path)
+    assert list(df_full.avg_return) == list(df.avg_return)
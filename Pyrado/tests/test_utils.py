@@ -47,7 +47,7 @@ from pyrado.policies.special.dummy import DummyPolicy
 from pyrado.sampling.rollout import rollout
 from pyrado.sampling.step_sequence import StepSequence
 from pyrado.utils.optimizers import GSS
-from pyrado.utils.averaging import RunningExpDecayingAverage, RunningMemoryAverage
+from pyrado.utils.averaging import RunningExpDecayingAverage, RunningMemoryAverage, RunningMoments
 from pyrado.utils.data_processing import RunningStandardizer, Standardizer, scale_min_max, MinMaxScaler
 from pyrado.utils.data_processing import RunningNormalizer, normalize
 from pyrado.logger.iteration import IterationTracker
@@ -356,6 +356,31 @@ def test_running_mem_average(data_seq, capacity):
     assert rma.capacity == 5 and rma.memory is None
 
 
+@pytest.mark.parametrize(
+    "data_seq",
+    [
+        [5 * np.random.rand(25, 3), 0.1 * np.random.rand(1, 3), 20 * np.random.rand(70, 3) + 1e6],
+        [5 * to.rand(25, 3, dtype=to.float64), 0.1 * to.rand(1, 3, dtype=to.float64), 20 * to.rand(70, 3) + 1e6],
+    ],
+    ids=["np", "to"],
+)
+def test_running_moments(data_seq):
+    # Every batch is processed by a different estimator, e.g. on different workers, and merged afterwards
+    rm = RunningMoments()
+    for data in data_seq:
+        rm_worker = RunningMoments()
+        rm_worker.update(data)
+        rm.merge(rm_worker)
+
+    data_all = np.concatenate([np.asarray(data, dtype=np.float64) for data in data_seq], axis=0)
+    assert rm.count == data_all.shape[0]
+    assert np.asarray(rm.mean) == pytest.approx(np.mean(data_all, axis=0))
+    assert np.asarray(rm.var) == pytest.approx(np.var(data_all, axis=0, ddof=1), rel=1e-6)
+
+    rm.reset()
+    assert rm.count == 0 and rm.mean is None and rm.var is None
+
+
 @pytest.mark.parametrize(
     "data_seq",
     [